@@ -5,12 +5,11 @@ Requirements: API Key ID, API Secret
 """
 
 import time
-import requests
 import base64
-from functools import lru_cache
 
-from cryptography.hazmat.primitives import hashes, serialization
-from cryptography.hazmat.primitives.asymmetric import padding
+import metrics
+
+# cryptography is imported on the first signature, processes that never sign (data.py, backtests) skip it
 
 # enter your api key id here
 key_id = "<your_api_id>"
@@ -22,18 +21,33 @@ key_b64 = "<your_api_secret>"
 def get_id():
     return key_id
 
-@lru_cache(maxsize=1)
-def _load_private_key():
-    der_bytes = base64.b64decode(key_b64)
-    return serialization.load_der_private_key(der_bytes, password=None)
+_private_key = None
+
+# loads the private key once
+def load_private_key():
+    global _private_key
+    if _private_key is None:
+        from cryptography.hazmat.primitives import serialization
+
+        der_bytes = base64.b64decode(key_b64)
+        _private_key = serialization.load_der_private_key(der_bytes, password=None)
+    return _private_key
+
+# uses an already loaded private key instead of key_b64 (e.g. a throwaway key for benchmarks)
+def use_private_key(pk):
+    global _private_key
+    _private_key = pk
 
 # gets key from key secret
 def get_key(timestamp_ms: str, method: str, path: str) -> str:
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import padding
+
     method = method.upper()
     path_no_q = path.split("?", 1)[0]
     message = f"{timestamp_ms}{method}{path_no_q}".encode("utf-8")
 
-    pk = _load_private_key()
+    pk = load_private_key()
     sig_bytes = pk.sign(
         message,
         padding.PSS(
@@ -44,21 +58,39 @@ def get_key(timestamp_ms: str, method: str, path: str) -> str:
     )
     return base64.b64encode(sig_bytes).decode("utf-8")
 
-# returns cash balance in cents
-def get_balance():
-    balance_url = "https://api.elections.kalshi.com/trade-api/v2/portfolio/balance"
-
+# signed headers for one request
+def auth_headers(method, path):
     ts = str(int(time.time() * 1e3))
-
-    headers = {
+    with metrics.timer("sign"):
+        signature = get_key(ts, method, path)
+    return {
         "KALSHI-ACCESS-KEY": key_id,
-        "KALSHI-ACCESS-SIGNATURE": get_key(ts, "GET", "/trade-api/v2/portfolio/balance"),
+        "KALSHI-ACCESS-SIGNATURE": signature,
         "KALSHI-ACCESS-TIMESTAMP": ts,
     }
 
-    response = (requests.get(balance_url, headers=headers))
+# returns cash balance in cents
+def get_balance():
+    import http_client
+
+    balance_url = "https://api.elections.kalshi.com/trade-api/v2/portfolio/balance"
+
+    response = http_client.shared.get(balance_url, signed=True, priority=http_client.ACCOUNT)
 
     data = response.json()
     balance = data.get('balance')
 
-    return balance
\ No newline at end of file
+    return balance
+
+# returns {ticker: contracts held} from the portfolio, NO contracts are negative
+def get_positions(ticker=None, base_url="https://api.elections.kalshi.com"):
+    import http_client
+
+    positions_url = f"{base_url}/trade-api/v2/portfolio/positions"
+    params = {"ticker": ticker} if ticker else None
+
+    response = http_client.shared.get(positions_url, params=params, signed=True, priority=http_client.ACCOUNT)
+    response.raise_for_status()
+
+    data = response.json()
+    return {p['ticker']: p['position'] for p in data.get('market_positions') or []}
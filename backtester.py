@@ -1,169 +1,367 @@
 """
 Backtesting script for detector.py
 
-Use data.py to log markets into a csv file
+Use data.py to log markets into a csv file (or a binary tape, see tape.py)
 Use the csv to backtest the algorithm
 
-"""
+The csv is parsed once into NumPy column arrays. The alpha/beta state machine
+only visits the rows where its state can change (jumps and stalled prices),
+so a replay costs O(jumps) Python steps instead of O(rows).
 
-import numpy as np
-import pandas as pd
+Recordings with row times and volume (tapes, csv files logged with a volume column) get
+their deltas recomputed against the market lookback seconds before each row, the way the
+live detector picks its reference (params["lag_mode"]), so irregularly sampled data
+replays the live semantics.
+"""
 
-# Edit these two parameters for your backtest
-file = input("Input csv file: ")
-duration = 60  # calibration duration in seconds
+import argparse
 
-df = pd.read_csv(file)
-row = 0
+import numpy as np
 
-# Fetches the market at the next timestamp
-def fetch_market():
-    global row
-    parameters = df.iloc[row]
-    row += 1
+import journal
+from params import DEFAULT_PARAMS
+from calibration import OnlineCalibrator, thresholds_from_deltas
+from model import SpikeModel
+
+COLUMNS = ("yes_ask", "yes_bid", "yes_spread", "delta_vol", "delta_spread", "delta_price")
+
+# One record per jump (delta_price >= price_high), after the alpha/beta update
+JUMP_DTYPE = np.dtype([
+    ("row", np.int64),
+    ("delta_price", np.int64),
+    ("delta_vol", np.int64),
+    ("delta_spread", np.int64),
+    ("alpha", np.float64),
+    ("beta", np.float64),
+    ("mu", np.float64),
+])
+
+# One record per fake spike signal (mu above threshold and the spike stalled)
+SIGNAL_DTYPE = np.dtype([
+    ("row", np.int64),
+    ("mu", np.float64),
+])
+
+# One record per simulated NO trade
+TRADE_DTYPE = np.dtype([
+    ("row", np.int64),
+    ("exit_row", np.int64),
+    ("entry", np.int64),
+    ("exit", np.int64),
+    ("pnl", np.int64),
+])
+
+# Loads a csv logged by data.py into one NumPy array per column (plus volume if it was logged)
+# Tapes (a .tape segment or a directory of one ticker's segments) also load the recorded NO side
+# (pass ticker to load_tape for a directory holding several tickers' segments)
+def load_market(file):
+    if not file.endswith(".csv"):
+        return load_tape(file)
+
+    import pandas as pd
+
+    df = pd.read_csv(file)
+
+    market = {"ts": df["ts"].to_numpy(dtype=str)}
+    for column in COLUMNS + ("volume",):
+        if column in df:
+            market[column] = df[column].to_numpy(dtype=np.int64)
+
+    return market
+
+def load_tape(path, ticker=None):
+    from tape import read_tape
+
+    records = read_tape(path, ticker)
+
+    market = {"ts": (records["ts"] * 1000).astype("datetime64[ms]").astype(str)}
+    for column in COLUMNS + ("no_bid", "no_ask", "volume"):
+        market[column] = records[column].astype(np.int64)
+
+    return market
+
+# Volume per row: the recorded one, or for csv files logged without volume a rebuild from delta_vol
+# (the change over lookback rows) as a running sum per lag slot; volume never falls, so negative deltas count as 0
+# Shared by the replays (replay.py, feed.py replay) so a recording gives them the same volume series
+def market_volume(market, lookback=10):
+    if "volume" in market and (market["volume"] >= 0).all():
+        return market["volume"]
+
+    delta_vol = np.maximum(market["delta_vol"], 0)
+    volume = np.zeros(len(delta_vol), dtype=np.int64)
+    for slot in range(lookback):
+        volume[slot::lookback] = np.cumsum(delta_vol[slot::lookback])
+    return volume
+
+# Seconds since the epoch of the row timestamps
+def row_times(market):
+    return market["ts"].astype("datetime64[ms]").astype(np.int64) / 1000
+
+# Market with delta_vol, delta_spread and delta_price recomputed against the market lookback seconds
+# before each row, from the snapshots a live MarketHistory would hold (see scheduler.delta_reference)
+# Rows whose reference is before the recording keep their recorded deltas, as do markets without row
+# times or volume and "count" mode (the recorded deltas already count rows)
+def lag_deltas(market, params=DEFAULT_PARAMS):
+    from scheduler import count_lag, history_capacity
+
+    if count_lag(params) or "ts" not in market or "volume" not in market or (market["volume"] < 0).any():
+        return market
+
+    t = row_times(market)
+    n = len(t)
+    rows = np.arange(n)
+    target = t - params["lookback"]
+    lo = np.maximum(rows - history_capacity(params), 0)
+    hi = rows - 1
+    valid = (rows > 0) & (target >= t[0])
+
+    # the snapshots just before and after the target, inside the history of the row
+    after = np.searchsorted(t, target, side="right")
+    older = np.clip(after - 1, lo, np.maximum(hi, 0))
+    newer = np.clip(after, lo, np.maximum(hi, 0))
+
+    if params["lag_mode"] == "interpolate":
+        span = t[newer] - t[older]
+        weight = np.where(span > 0, (target - t[older]) / np.where(span > 0, span, 1), 0.0)
+        weight = np.clip(weight, 0.0, 1.0)
+        reference = lambda values: values[older] + weight * (values[newer] - values[older])
+    else:
+        # nearest, the newer one on a tie
+        nearest = np.where(np.abs(t[newer] - target) <= np.abs(t[older] - target), newer, older)
+        reference = lambda values: values[nearest]
+
+    yes_spread = market["yes_ask"] - market["yes_bid"]
+    yes_bid_dollars = market["yes_bid"] / 100
+    deltas = {
+        "delta_vol": market["volume"] - np.rint(reference(market["volume"])).astype(np.int64),
+        "delta_spread": yes_spread - np.rint(reference(yes_spread)).astype(np.int64),
+        # in dollars like market.add_deltas, so interpolated references round the same way
+        "delta_price": np.rint(100 * (yes_bid_dollars - reference(yes_bid_dollars))).astype(np.int64),
+    }
 
-    return parameters
+    lagged = dict(market)
+    for column, values in deltas.items():
+        lagged[column] = np.where(valid, values, market[column])
+    return lagged
 
 # Calibrate parameter thresholds of the bot
 # EX: a "large" delta_vol differs by market, so you need to define what is "large"
-def calibrate():
-    delta_vols = []
-    delta_prices = []
-    delta_spreads = []
+# In online calibration modes the thresholds are per-row arrays (see online_thresholds)
+def calibrate(market, params=DEFAULT_PARAMS):
+    if params["calibration_mode"] != "batch":
+        return online_thresholds(market, params)
 
-    # Collects parameter values over duration (assuming time interval is 1 second)
-    for i in range(duration):
-        curr_market = fetch_market()
-
-        delta_vols.append(curr_market['delta_vol'])
-        delta_prices.append(curr_market['delta_price'])
-        delta_spreads.append(curr_market['delta_spread'])
-
-    # Convert lists into np arrays for analysis
-    delta_vols = np.array(delta_vols)
-    delta_prices = np.array(delta_prices)
-    delta_spreads = np.abs(np.array(delta_spreads))
-
-    # Computes percentiles of parameters to determine how much change is "large" or "small"
-    # Modify percentiles to determine conservativeness of bot
-    # default values ensure bot works in extreme markets (such as when vol = 0 for long times)
-
-    # Compute vol thresholds with all vol that is not 0 (cuz 0 is no evidence)
-    delta_vols_nonzero = delta_vols[delta_vols > 0]
-    if len(delta_vols_nonzero) == 0:
-        vol_low, vol_high = 1, 5
-    else:
-        vol_low = max(1, int(np.percentile(delta_vols_nonzero, 25)))
-        vol_high = max(vol_low + 1, int(np.percentile(delta_vols_nonzero, 75)))
-
-    # Compute spread thresholds with all spread that is not 0 (cuz 0 is no evidence)
-    delta_spreads_nonzero = delta_spreads[delta_spreads > 0]
-    if len(delta_spreads_nonzero) == 0:
-        spread_thresh = 2  # spread thresh is by default 2 if there is no spread activity
-    else:
-        spread_thresh = int(np.percentile(delta_spreads_nonzero, 80))
-        spread_thresh = max(1, spread_thresh)
+    duration = params["duration"]
 
-    price_high = max(2, int(np.percentile(delta_prices, 95)))
-
-    thresholds = {
-        "vol_low": vol_low,
-        "vol_high": vol_high,
+    # Collects parameter values over duration (assuming time interval is 1 second)
+    if len(market["delta_price"]) < duration:
+        raise ValueError(f"need at least {duration} rows to calibrate")
+
+    return thresholds_from_deltas(market["delta_vol"][:duration], market["delta_price"][:duration],
+                                  market["delta_spread"][:duration], params)
+
+# Replays the live OnlineCalibrator over the csv
+# Row r gets the thresholds the live loop would use on that tick (from the deltas of rows before r)
+def online_thresholds(market, params=DEFAULT_PARAMS):
+    calibrator = OnlineCalibrator(params)
+    delta_vols = market["delta_vol"].tolist()
+    delta_prices = market["delta_price"].tolist()
+    delta_spreads = market["delta_spread"].tolist()
+    n = len(delta_prices)
+
+    names = ("vol_low", "vol_high", "spread_thresh", "price_high")
+    thresholds = {name: np.zeros(n, dtype=np.int64) for name in names}
+
+    current = None
+    for row in range(n):
+        if current is not None:
+            for name in names:
+                thresholds[name][row] = current[name]
+        calibrator.update(delta_vols[row], delta_prices[row], delta_spreads[row])
+        current = calibrator.thresholds()
 
-        "spread_thresh": spread_thresh,
+    return thresholds
 
-        "price_high": price_high,
-    }
+# First row the detector trades on
+def start_row(params=DEFAULT_PARAMS):
+    if params["calibration_mode"] == "batch":
+        return params["duration"]
+    return params["min_samples"]
+
+# Runs the spike detector over the rows after calibration
+# thresholds may be scalars or per-row arrays (online calibration)
+# The evidence updates run on a one-market SpikeModel (see model.py), like the live detector
+# Returns (jumps, signals) as record arrays (see JUMP_DTYPE and SIGNAL_DTYPE)
+def detect(market, thresholds, params=DEFAULT_PARAMS):
+    mu_entry = params["mu_entry"]
+    cooldown = params["cooldown"]
+    start = start_row(params)
+
+    model = SpikeModel(1, params)
+    one = np.ones(1, dtype=bool)
+
+    delta_price = market["delta_price"]
+    delta_vol = market["delta_vol"]
+    delta_spread = market["delta_spread"]
+    n = len(delta_price)
+
+    per_row = np.ndim(thresholds["price_high"]) > 0
+    if not per_row:
+        model.set_thresholds(thresholds)
+    price_highs = np.broadcast_to(thresholds["price_high"], n)
+
+    # Rows where the YES price jumped, the only rows that update alpha/beta
+    jump_rows = np.flatnonzero(delta_price[start:] >= price_highs[start:]) + start
+
+    # First row at or after each row where the price stalled (n if none)
+    next_stall = np.where(delta_price <= 0, np.arange(n), n)
+    next_stall = np.append(np.minimum.accumulate(next_stall[::-1])[::-1], n)
+
+    jumps = []
+    signals = []
+
+    row = start # first row a signal can fire on
+    last = start - 1 # last row whose tick decay has been applied
+    k = 0
+
+    while True:
+        # jumps inside a cooldown are never read
+        while k < len(jump_rows) and jump_rows[k] < row:
+            k += 1
+        next_jump = jump_rows[k] if k < len(jump_rows) else n
+
+        # Fake spike confidence reached, bet on the first stalled row before the next jump
+        mu = model.mu[0]
+        if mu > mu_entry:
+            stall = next_stall[min(row, n)]
+            if stall < next_jump:
+                signals.append((stall, mu))
 
-    return thresholds
+                # Reset alpha and beta values
+                model.reset(one)
+
+                # spike cooldown, skip rows
+                row = stall + 1 + cooldown
+                last = row - 1
+                continue
+
+        if next_jump >= n:
+            break
+
+        i = next_jump
+        if per_row:
+            model.set_thresholds({name: thresholds[name][i] for name in thresholds})
+
+        # Very slow decay of evidence over time, then the jump evidence
+        model.decay(i - last)
+        model.observe_jump(delta_price[i:i + 1], delta_vol[i:i + 1], delta_spread[i:i + 1], one)
+
+        jumps.append((i, delta_price[i], delta_vol[i], delta_spread[i], model.alpha[0], model.beta[0], model.mu[0]))
+
+        row = i
+        last = i
+        k += 1
+
+    return np.array(jumps, dtype=JUMP_DTYPE), np.array(signals, dtype=SIGNAL_DTYPE)
+
+# Simulates the live NO trade for every signal, using the same checks as detector.py
+# Uses the recorded NO side from tapes, otherwise implies it from the YES book:
+# no_bid = 100 - yes_ask, no_ask = 100 - yes_bid
+# Returns a record array (see TRADE_DTYPE) with one row per signal that passed the checks
+def simulate_trades(market, signals, params=DEFAULT_PARAMS):
+    no_bid = market["no_bid"] if "no_bid" in market else 100 - market["yes_ask"]
+    no_ask = market["no_ask"] if "no_ask" in market else 100 - market["yes_bid"]
+    n = len(no_bid)
+    lookback = params["lookback"]
+
+    trades = []
+    for row in signals["row"]:
+        entry = no_ask[row]
+        spread = entry - no_bid[row]
+        pre_spike_no = no_bid[max(0, row - lookback):row].max() if row > 0 else no_bid[row]
+
+        if not (0 <= no_bid[row] <= 100 and 0 <= entry <= 100) or entry < no_bid[row]:
+            continue
+        if spread > params["max_spread"]:
+            continue
+        if pre_spike_no - entry <= params["fee_buffer"]:
+            continue
+
+        # exit on the first tick that reaches the pre-spike level or the stop, else at the timeout
+        stop_level = max(1, entry - params["stop_loss"])
+        window = no_bid[row + 1:min(n, row + 1 + params["max_timeout"])]
+        hits = np.flatnonzero((window >= pre_spike_no) | (window <= stop_level))
+        if len(hits):
+            exit_row = row + 1 + hits[0]
+        elif len(window):
+            exit_row = row + len(window)
+        else:
+            exit_row = row
+
+        trades.append((row, exit_row, entry, no_bid[exit_row], no_bid[exit_row] - entry))
+
+    return np.array(trades, dtype=TRADE_DTYPE)
+
+# Prints jumps and signals in row order
+def print_results(market, jumps, signals):
+    ts = market["ts"]
+    events = sorted([(j["row"], 0, j) for j in jumps] + [(s["row"], 1, s) for s in signals], key=lambda e: e[:2])
+
+    for row, kind, record in events:
+        if kind == 0:
+            print("JUMP",
+                  "ts", ts[row],
+                  "dp", record["delta_price"],
+                  "dv", record["delta_vol"],
+                  "ds", record["delta_spread"],
+                  "alpha", record["alpha"], "beta", record["beta"])
+            print("mu", record["mu"])
+        else:
+            print("fake spike predicted, and spike stalled. buy no shares to bet against it!")
+            print(ts[row])
+
+# Writes jumps, signals and simulated trades to the journal (see journal.py), ts is the row's market time
+def journal_results(market, jumps, signals, trades, ticker=None):
+    ts = market["ts"]
+
+    for j in jumps:
+        journal.record("jump", ticker=ticker, ts=ts[j["row"]], delta_price=j["delta_price"], delta_vol=j["delta_vol"],
+                       delta_spread=j["delta_spread"], alpha=j["alpha"], beta=j["beta"], mu=j["mu"])
+
+    for s in signals:
+        journal.record("signal", ticker=ticker, ts=ts[s["row"]], mu=s["mu"])
+
+    for t in trades:
+        journal.record("exit", ticker=ticker, entry=t["entry"], exit=t["exit"], net=t["pnl"])
 
-# Runs the main spike detector algorithm till end_hour:end_minute
-def detect():
-    alpha = 1 # evidence that move is a fake spike
-    beta = 2 # evidence that move is a real repricing
-    decay = 0.9 # old evidence loses 10% weight each jump
+def main():
+    parser = argparse.ArgumentParser(description="Backtest the detector on a csv logged by data.py or a tape")
+    parser.add_argument("file", nargs="?", help="prompted when omitted")
+    parser.add_argument("--journal", metavar="DIR", help="also write jumps, signals and trades to a journal in DIR")
+    args = parser.parse_args()
 
-    # Bayesian confidence that the current market move is a “fake spike”
-    mu = alpha / (alpha + beta)
+    file = args.file or input("Input csv file (or tape): ")
+    market = lag_deltas(load_market(file))
 
     print("Calibrating model...")
     # Calibrate model first
-    thresholds = calibrate()
-    print(thresholds)
+    thresholds = calibrate(market)
+    print({name: np.atleast_1d(value)[-1].item() for name, value in thresholds.items()})
     print("Calibration success!")
 
     print("Trading commencing...")
+    jumps, signals = detect(market, thresholds)
+    print_results(market, jumps, signals)
 
-    # Alpha/beta updates, run until end of csv
-    global row
-    while row < len(df):
-        # compares current market to market 10 seconds ago
-        curr_market = fetch_market()
-
-        alpha = max(1.0, alpha * 0.99)  # Very slow decay of evidence over time
-        beta = max(2.0, beta * 0.99)
-
-        # If the YES price moved up by at least "jump" threshold,
-        # classify whether the move looks like a fake spike (alpha) or a real repricing (beta)
-        if curr_market['delta_price'] >= thresholds['price_high']:
-            # Deprioritize old evidence
-            alpha = max(1.0, alpha * decay)
-            beta  = max(2.0, beta * decay)
-
-            if curr_market["delta_vol"] == 0:
-                # only blame "fake spike" if liquidity actually pulls
-                if curr_market["delta_spread"] >= thresholds["spread_thresh"]:
-                    alpha += 1
-                # if spread tightens with no prints, treat it as tiny beta
-                elif curr_market["delta_spread"] <= -thresholds["spread_thresh"]:
-                    beta += 0.25
-                # otherwise no evidence
-
-            # Low volume on a jump suggests a hype spike -> alpha++
-            elif curr_market['delta_vol'] <= thresholds['vol_low']:
-                alpha += 1
-            # High volume on a jump suggests broad participation -> beta++
-            elif curr_market['delta_vol'] >= thresholds["vol_high"]:
-                beta += 1 + min(3, curr_market["delta_vol"] / thresholds["vol_high"])
-
-            # Spread tightening during the jump suggests healthy liquidity -> beta++
-            if curr_market['delta_spread'] <= -thresholds['spread_thresh'] and curr_market['delta_vol'] >= thresholds["vol_high"]:
-                beta += 1
-            # Spread widening during the jump suggests makers pulled liquidity -> alpha++
-            elif curr_market['delta_spread'] >= thresholds['spread_thresh']:
-                alpha += 1
-
+    trades = simulate_trades(market, signals)
+    print(f"Signals: {len(signals)}, simulated trades: {len(trades)}, net: {trades['pnl'].sum()} cents")
 
-            print("JUMP",
-                  "ts", curr_market["ts"],
-                  "dp", curr_market["delta_price"],
-                  "dv", curr_market["delta_vol"],
-                  "ds", curr_market["delta_spread"],
-                  "alpha", alpha, "beta", beta)
-
-            mu = alpha / (alpha + beta)
-            print("mu", mu)
-
-        if mu > 0.7:
-            # Check if the price is starting to drop. If so, bet
-            if curr_market['delta_price'] <= 0:
-                print("fake spike predicted, and spike stalled. buy no shares to bet against it!")
-                date = curr_market['ts']
-                print(date)
-
-                # Reset alpha and beta values
-                alpha = 1
-                beta = 2
-
-                mu = alpha / (alpha + beta)
-
-                # spike cooldown, skip 15 lines in csv
-                row += 15
-
-def main():
-    detect()
+    if args.journal:
+        journal.open_journal(args.journal, name="backtest", echo=False)
+        journal_results(market, jumps, signals, trades, ticker=file)
+        journal.flush()
 
     print('Program ended.')
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
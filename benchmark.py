@@ -0,0 +1,359 @@
+"""
+Benchmark suite for the hot paths
+
+Runs offline and measures:
+- backtest    rows/s of load + calibrate + detect + simulate on a csv, and on larger synth.py markets
+- calibrate   thresholds_from_deltas on the warm-up window, online calibration rows/s
+- update      one alpha/beta step: model.update_evidence and SpikeModel.update (1 and 1000 markets)
+- market      fetch_market / fetch_markets against canned JSON (requests runs, no network)
+- sign        api_info.get_key signatures/s with a throwaway RSA key
+- startup     ms from launch to exit of `python <entry point> --help` (every import of the CLI)
+
+Each case is timed several times and the median is kept. Results are written as JSON;
+--compare flags every result more than --tolerance worse than a saved baseline, and an
+entry point slower to start than its STARTUP_BUDGET_MS fails the run (processes are
+launched on a schedule right at game start).
+
+    python benchmark.py --out bench.json
+    python benchmark.py --compare bench.json --tolerance 0.15
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from params import DEFAULT_PARAMS
+
+SAMPLE = "cba_game_sample.csv"
+
+# Median seconds per call of fn over repeat runs of number calls (after one warm-up call)
+def measure(fn, repeat=5, number=1):
+    fn()
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        runs.append((time.perf_counter() - start) / number)
+    return statistics.median(runs)
+
+def result(value, unit, better="higher"):
+    return {"value": value, "unit": unit, "better": better}
+
+def _backtest(market, params=DEFAULT_PARAMS):
+    import backtester
+
+    thresholds = backtester.calibrate(market, params)
+    _, signals = backtester.detect(market, thresholds, params)
+    backtester.simulate_trades(market, signals, params)
+
+def bench_backtest(sample, rows, repeat):
+    import backtester
+    from synth import generate_market
+
+    results = {}
+    if sample:
+        market = backtester.load_market(sample)
+        n = len(market["delta_price"])
+        results["backtest.load_csv"] = result(n / measure(lambda: backtester.load_market(sample), repeat), "rows/s")
+        results["backtest.sample"] = result(n / measure(lambda: _backtest(market), repeat), "rows/s")
+        for mode in ("window", "p2"):
+            params = dict(DEFAULT_PARAMS, calibration_mode=mode)
+            results[f"backtest.sample_{mode}"] = result(n / measure(lambda: _backtest(market, params), repeat), "rows/s")
+
+    for n in rows:
+        market, _ = generate_market(n)
+        results[f"backtest.synthetic_{n}"] = result(n / measure(lambda: _backtest(market), repeat), "rows/s")
+
+    return results
+
+def bench_calibrate(sample, repeat):
+    import backtester
+    from calibration import thresholds_from_deltas
+    from synth import generate_market
+
+    market = backtester.load_market(sample) if sample else generate_market(7200)[0]
+    duration = DEFAULT_PARAMS["duration"]
+    vols, prices, spreads = (market[name][:duration] for name in ("delta_vol", "delta_price", "delta_spread"))
+    n = len(market["delta_price"])
+
+    results = {"calibrate.batch": result(measure(lambda: thresholds_from_deltas(vols, prices, spreads), repeat, 200) * 1e6,
+                                         "us", "lower")}
+    for mode in ("window", "p2"):
+        params = dict(DEFAULT_PARAMS, calibration_mode=mode)
+        seconds = measure(lambda: backtester.online_thresholds(market, params), repeat)
+        results[f"calibrate.{mode}"] = result(n / seconds, "rows/s")
+
+    return results
+
+def bench_update(repeat):
+    from model import update_evidence
+    from model import SpikeModel
+
+    thresholds = {"vol_low": 2, "vol_high": 10, "spread_thresh": 1, "price_high": 3}
+    quiet = {"delta_price": 0, "delta_vol": 4, "delta_spread": 0}
+    jump = {"delta_price": 5, "delta_vol": 1, "delta_spread": 1}
+
+    results = {}
+    for name, tick in (("quiet", quiet), ("jump", jump)):
+        seconds = measure(lambda: update_evidence(1.5, 2.5, tick, thresholds), repeat, 10000)
+        results[f"update.scalar_{name}"] = result(seconds * 1e6, "us", "lower")
+
+    for n in (1, 1000):
+        model = SpikeModel(n)
+        model.set_thresholds(thresholds)
+        rng = np.random.default_rng(0)
+        dp = rng.integers(-3, 6, size=n)
+        dv = rng.integers(0, 12, size=n)
+        ds = rng.integers(-2, 3, size=n)
+
+        def step():
+            model.update(dp, dv, ds)
+            model.entries(dp)
+
+        results[f"update.model_{n}"] = result(measure(step, repeat, 1000) * 1e6, "us", "lower")
+
+    return results
+
+def canned_market(ticker, yes_bid=28, volume=1200):
+    # same shape as a Kalshi /markets response entry (fields the bot ignores included, they cost parse time)
+    return {
+        "ticker": ticker, "event_ticker": ticker.rsplit("-", 1)[0], "market_type": "binary",
+        "title": "Will the home team win?", "subtitle": "", "yes_sub_title": "Home", "no_sub_title": "Away",
+        "open_time": "2026-01-15T01:00:00Z", "close_time": "2026-01-15T06:00:00Z",
+        "expiration_time": "2026-01-22T06:00:00Z", "status": "active", "response_price_units": "usd_cent",
+        "yes_bid": yes_bid, "yes_ask": yes_bid + 1, "no_bid": 99 - yes_bid, "no_ask": 100 - yes_bid,
+        "yes_bid_dollars": f"{yes_bid / 100:.4f}", "yes_ask_dollars": f"{(yes_bid + 1) / 100:.4f}",
+        "no_bid_dollars": f"{(99 - yes_bid) / 100:.4f}", "no_ask_dollars": f"{(100 - yes_bid) / 100:.4f}",
+        "last_price": yes_bid, "previous_yes_bid": yes_bid, "previous_yes_ask": yes_bid + 1,
+        "previous_price": yes_bid, "volume": volume, "volume_24h": volume, "liquidity": 512300,
+        "open_interest": 8400, "result": "", "can_close_early": True, "notional_value": 100,
+        "tick_size": 1, "rules_primary": "If the home team wins, the market resolves to Yes.",
+    }
+
+class _CannedAdapter:
+    """
+    requests transport adapter that answers every request with the same bytes.
+    """
+
+    def __init__(self, body):
+        self.body = body
+
+    def send(self, request, **kwargs):
+        import requests
+
+        response = requests.Response()
+        response.status_code = 200
+        response._content = self.body
+        response.headers["Content-Type"] = "application/json"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+def bench_market(repeat):
+    import market as market_api
+    import metrics
+
+    prefix = "http://canned.invalid/"
+    saved_url = market_api.BASE_URL
+    market_api.BASE_URL = prefix + "trade-api/v2"
+
+    # time the client itself, not the exchange rate limit
+    saved_limiter = market_api.client.limiter
+    market_api.client.limiter = None
+
+    prev = canned_market("KXB-1", yes_bid=25, volume=1100)
+    market_api.add_deltas(prev)
+    prevs = {f"KXB-{i}": prev for i in range(100)}
+
+    results = {}
+    try:
+        market_api.session.mount(prefix, _CannedAdapter(json.dumps({"market": canned_market("KXB-1")}).encode()))
+        seconds = measure(lambda: market_api.fetch_market("KXB-1", prev), repeat, 500)
+        results["market.fetch_one"] = result(seconds * 1e6, "us", "lower")
+
+        body = json.dumps({"markets": [canned_market(ticker) for ticker in prevs], "cursor": ""}).encode()
+        market_api.session.mount(prefix, _CannedAdapter(body))
+        seconds = measure(lambda: market_api.fetch_markets(list(prevs), prevs), repeat, 50)
+        results["market.fetch_bulk_100"] = result(100 / seconds, "markets/s")
+
+        raw = json.dumps({"market": canned_market("KXB-1")})
+        seconds = measure(lambda: market_api.add_deltas(json.loads(raw)["market"], prev), repeat, 5000)
+        results["market.parse_deltas"] = result(seconds * 1e6, "us", "lower")
+    finally:
+        market_api.session.adapters.pop(prefix, None)
+        market_api.BASE_URL = saved_url
+        market_api.client.limiter = saved_limiter
+        metrics.registry.reset()
+
+    return results
+
+def bench_sign(repeat):
+    import api_info as api
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    saved = api._private_key
+    api.use_private_key(rsa.generate_private_key(public_exponent=65537, key_size=2048))
+    try:
+        path = "/trade-api/v2/portfolio/orders"
+        seconds = measure(lambda: api.get_key(str(int(time.time() * 1e3)), "POST", path), repeat, 50)
+    finally:
+        api.use_private_key(saved)
+
+    return {"sign.get_key": result(1 / seconds, "signatures/s")}
+
+# Startup budget in ms of each entry point (`python <script> --help`), the bare interpreter for reference
+STARTUP_BUDGET_MS = {
+    "python": 100,
+    "data": 250,
+    "detector": 400,
+    "runner": 450,
+    "scanner": 450,
+    "backtester": 300,
+    "replay": 350,
+    "sweep": 300,
+    "catalog": 300,
+}
+
+# Fastest of repeat launches, a busy machine only ever makes a launch slower
+def bench_startup(repeat):
+    directory = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    for name in STARTUP_BUDGET_MS:
+        command = [sys.executable, "-c", "pass"] if name == "python" else [sys.executable, f"{name}.py", "--help"]
+        runs = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run(command, cwd=directory, stdout=subprocess.DEVNULL, check=True)
+            runs.append(time.perf_counter() - start)
+        results[f"startup.{name}"] = result(min(runs) * 1000, "ms", "lower")
+    return results
+
+# Entry points over their startup budget: rows (name, ms, budget ms)
+def over_budget(document):
+    rows = []
+    for name, budget in STARTUP_BUDGET_MS.items():
+        r = document["results"].get(f"startup.{name}")
+        if r is not None and r["value"] > budget:
+            rows.append((name, r["value"], budget))
+    return rows
+
+CASES = ("backtest", "calibrate", "update", "market", "sign", "startup")
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+# Runs the selected cases and returns the JSON document
+def run(cases=CASES, sample=SAMPLE, rows=(100_000, 1_000_000), repeat=5):
+    # the sample csv ships next to this file
+    if sample and not os.path.exists(sample):
+        bundled = os.path.join(os.path.dirname(os.path.abspath(__file__)), sample)
+        sample = bundled if os.path.exists(bundled) else None
+
+    results = {}
+    for case in cases:
+        start = time.perf_counter()
+        if case == "backtest":
+            results.update(bench_backtest(sample, rows, repeat))
+        elif case == "calibrate":
+            results.update(bench_calibrate(sample, repeat))
+        elif case == "update":
+            results.update(bench_update(repeat))
+        elif case == "market":
+            results.update(bench_market(repeat))
+        elif case == "sign":
+            results.update(bench_sign(repeat))
+        elif case == "startup":
+            results.update(bench_startup(repeat))
+        print(f"{case}: {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    return {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "platform": platform.platform(),
+            "sample": sample,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+# Compares results with a baseline document
+# Returns rows (name, baseline, current, change, regressed); change > 0 is an improvement
+def compare(current, baseline, tolerance=0.2):
+    rows = []
+    for name, now in current["results"].items():
+        before = baseline["results"].get(name)
+        if before is None or not before["value"]:
+            continue
+        change = now["value"] / before["value"] - 1
+        if now["better"] == "lower":
+            change = before["value"] / now["value"] - 1 if now["value"] else float("inf")
+        rows.append((name, before["value"], now["value"], change, change < -tolerance))
+    return rows
+
+def print_results(document):
+    for name, r in document["results"].items():
+        print(f"{name:<28} {r['value']:>14.2f} {r['unit']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the detector, backtester, market and signing hot paths")
+    parser.add_argument("--cases", nargs="+", choices=CASES, default=list(CASES))
+    parser.add_argument("--sample", default=SAMPLE, help="csv or tape benchmarked as recorded")
+    parser.add_argument("--rows", type=int, nargs="*", default=[100_000, 1_000_000], help="synthetic market sizes")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per case (the median is kept)")
+    parser.add_argument("--out", help="write the results JSON here")
+    parser.add_argument("--compare", metavar="BASELINE", help="results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="relative slowdown flagged as a regression")
+    args = parser.parse_args()
+
+    document = run(args.cases, args.sample, args.rows, args.repeat)
+    print_results(document)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(document, f, indent=2)
+        print(f"Wrote {len(document['results'])} results to {args.out}")
+
+    slow = over_budget(document)
+    for name, ms, budget in slow:
+        print(f"STARTUP OVER BUDGET: {name} {ms:.0f} ms > {budget} ms")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+        rows = compare(document, baseline, args.tolerance)
+        print(f"\nAgainst {args.compare} (commit {baseline['meta'].get('commit')}), tolerance {args.tolerance:.0%}:")
+        for name, before, now, change, regressed in rows:
+            flag = "  REGRESSION" if regressed else ""
+            print(f"{name:<28} {before:>14.2f} -> {now:>14.2f}  {change:+.1%}{flag}")
+
+        regressions = sum(row[4] for row in rows)
+        if regressions:
+            print(f"{regressions} regression(s)")
+            sys.exit(1)
+        print("No regressions")
+
+    if slow:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,39 @@
 """
 Helper file that orders bets on Kalshi.
 
-DO NOT EDIT
+Orders go through one OrderClient: a keep-alive session (connections opened ahead of
+time by warm()) and submit() for non-blocking orders. Its requests share the rate limiter
+of http_client.py, where orders are served before market data and are never retried. Responses are recorded in the
+journal (see journal.py), whose writer thread keeps printing and disk off the order path.
+
+Benchmark signing + submission against a local stub exchange:
+    python bet.py --orders 200
 """
 
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
 import requests
+
 import api_info as api
-import time
-from datetime import datetime
+import http_client
+import journal
+import metrics
 
 BASE_URL = "https://api.elections.kalshi.com"
 
 path = "/trade-api/v2/portfolio/orders"
 url = BASE_URL + path
 
-# places one bet on Kalshi
-def place_bet(ticker, action, side, price=None):
+# cheap unauthenticated endpoint used to open connections before the first order
+WARM_PATH = "/trade-api/v2/exchange/status"
+
+# builds the order json
+def order_payload(ticker, action, side, price=None):
     if side == "no":
         side_key = "no_price"
     else:
@@ -43,51 +61,177 @@ def place_bet(ticker, action, side, price=None):
         payload[side_key] = price
         payload["time_in_force"] = "immediate_or_cancel"
 
-    ts = str(int(time.time() * 1e3))
-
-    headers = {
-        "KALSHI-ACCESS-KEY": api.get_id(),
-        "KALSHI-ACCESS-SIGNATURE": api.get_key(ts, "POST", path),
-        "KALSHI-ACCESS-TIMESTAMP": ts,
-        "Content-Type": "application/json"
-    }
-
-    response = requests.post(url, json=payload, headers=headers, timeout=10)
+    return payload
+
+class OrderClient:
+    """
+    Keep-alive order client.
+
+    :param base_url: exchange root, e.g. a local stub for testing
+    :param pool_size: connections kept open (and pre-warmed)
+    :param workers: threads used by submit()
+    :param log: journal each response
+    :param limiter: http_client.RateLimiter, shared with market data by default (None: no limit)
+    """
+
+    def __init__(self, base_url=BASE_URL, pool_size=4, workers=4, log=True, limiter=http_client.limiter):
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.log = log
+
+        self.http = http_client.HttpClient(limiter, pool_size=pool_size, timeout=10)
+        self.session = self.http.session
+
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+
+    # Loads the signing key and opens pool_size connections so the first order skips TLS setup
+    def warm(self):
+        try:
+            api.load_private_key()
+        except ValueError as e:
+            journal.record("info", f"WARNING: could not load the signing key from api_info.py: {e}")
+
+        def touch():
+            try:
+                self.http.get(self.base_url + WARM_PATH, priority=http_client.ACCOUNT, timeout=5, retries=0)
+            except requests.RequestException:
+                pass
+
+        threads = [threading.Thread(target=touch) for _ in range(self.pool_size)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    # Places one bet and waits for the response
+    def place(self, ticker, action, side, price=None):
+        body = json.dumps(order_payload(ticker, action, side, price))
+
+        # latency includes signing and any wait for the write limit
+        start = time.perf_counter()
+        response = self.http.post(self.base_url + path, data=body)
+        latency = time.perf_counter() - start
+        metrics.observe("order", latency, ticker)
+        latency_ms = latency * 1000
+
+        if self.log:
+            log_bet_attempt(response.status_code, response.json(), price, latency_ms)
+        return response
+
+    # Places one bet without waiting, returns a Future of the response
+    def submit(self, ticker, action, side, price=None):
+        return self._executor.submit(self.place, ticker, action, side, price)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.http.close()
+
+client = OrderClient()
 
-    log_bet_attempt(response, price)
-    return response
+# places one bet on Kalshi
+def place_bet(ticker, action, side, price=None):
+    return client.place(ticker, action, side, price)
 
-def log_bet_attempt(response, price):
-    # Log response details into a file
-    data = response.json()
+# places one bet on Kalshi without waiting, returns a Future of the response
+def submit_bet(ticker, action, side, price=None):
+    return client.submit(ticker, action, side, price)
 
+# Journals one order response (see journal.py), the message matches the old console log
+def log_bet_attempt(status_code, data, price, latency_ms=None):
     if not "order" in data:
-        print("----BET ATTEMPT START----")
-        print(f"> Status code: {response.status_code}")
-        print(f"> Message: {response.json()['error']['message']}")
-        print("> ERROR: BET NOT PROCESSED")
-        print("----BET ATTEMPT END----")
+        message = "\n".join([
+            "----BET ATTEMPT START----",
+            f"> Status code: {status_code}",
+            f"> Message: {data['error']['message']}",
+            "> ERROR: BET NOT PROCESSED",
+            "----BET ATTEMPT END----",
+        ])
+        journal.record("order", message, price=price, status_code=status_code, latency_ms=latency_ms,
+                       error=data['error']['message'])
         return
 
-    print("----BET ATTEMPT START----")
-    print(f"> Status code: {response.status_code}")
-    print(f"> Side: {data['order']['side']}")
-    print(f"> Action: {data['order']['action']}")
-    print(f"> Status: {data['order']['status']}")
-    print(f"> Price: {price}")
-    print("----BET ATTEMPT END----")
+    order = data['order']
+    message = "\n".join([
+        "----BET ATTEMPT START----",
+        f"> Status code: {status_code}",
+        f"> Side: {order['side']}",
+        f"> Action: {order['action']}",
+        f"> Status: {order['status']}",
+        f"> Price: {price}",
+        "----BET ATTEMPT END----",
+    ])
+    journal.record("order", message, ticker=order.get('ticker'), action=order['action'], side=order['side'],
+                   price=price, status=order['status'], status_code=status_code, latency_ms=latency_ms)
+
+class _StubExchange(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    wbufsize = 1 << 16  # headers and body in one send, avoids delayed-ACK stalls
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, body):
+        body = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._reply({"exchange_active": True})
+
+    def do_POST(self):
+        order = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        order["status"] = "canceled"
+        self._reply({"order": order})
+
+# Times signing, a fresh-connection post (the old place_bet) and the pooled client
+def benchmark(orders=200):
+    import numpy as np
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    # throwaway key unless real credentials are set
+    if api.key_b64.startswith("<"):
+        api.use_private_key(rsa.generate_private_key(public_exponent=65537, key_size=2048))
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubExchange)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    stub_url = f"http://127.0.0.1:{server.server_port}"
+
+    def timed(fn):
+        times = []
+        for _ in range(orders):
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+        return np.array(times) * 1000
+
+    def fresh():
+        headers = api.auth_headers("POST", path)
+        requests.post(stub_url + path, json=order_payload("BENCH", "buy", "no", 50), headers=headers, timeout=10).json()
+
+    bench_client = OrderClient(stub_url, log=False, limiter=None)
+    bench_client.warm()
+
+    results = {
+        "sign": timed(lambda: api.auth_headers("POST", path)),
+        "fresh connection": timed(fresh),
+        "pooled client": timed(lambda: bench_client.place("BENCH", "buy", "no", 50)),
+    }
 
-    if data['order']['status'] == "canceled":
-        return
+    bench_client.close()
+    server.shutdown()
+
+    for name, times in results.items():
+        print(f"{name:>16}: p50 {np.percentile(times, 50):.2f} ms, p99 {np.percentile(times, 99):.2f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark order signing and submission against a local stub")
+    parser.add_argument("--orders", type=int, default=200)
+    args = parser.parse_args()
+
+    benchmark(args.orders)
 
-    with open("trade_log.txt", "a") as file:
-        file.write("-----------------------------------\n")
-        file.write(f"--------{datetime.now().replace(microsecond=0)}--------\n")
-        file.write(f"Status code: {response.status_code}\n")
-
-        if "order" in data:
-            file.write(f"Ticker: {data['order']['ticker']}\n")
-            file.write(f"Side: {data['order']['side']}\n")
-            file.write(f"Action: {data['order']['action']}\n")
-            file.write(f"Status: {data['order']['status']}\n")
-            file.write(f"Price: {price}\n")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
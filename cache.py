@@ -0,0 +1,136 @@
+"""
+Warm-state cache for the live detector
+
+Saves each ticker's thresholds, alpha/beta/mu and recent history to a small json
+file so a restarted detector can resume trading in seconds instead of recalibrating.
+Thresholds are also saved per series (ticker prefix, e.g. KXCBAGAME) so a new game
+in the same series can start from the last game's thresholds.
+
+Open positions (see positions.py) are kept next to them and never expire or get evicted.
+
+Layout: <directory>/<series>/<ticker>.json, <directory>/<series>/_series.json and
+<directory>/<series>/<ticker>.positions.json
+"""
+
+import json
+import os
+import time
+
+SERIES_FILE = "_series.json"
+POSITIONS_SUFFIX = ".positions.json"
+
+# Series of a ticker, e.g. KXCBAGAME-26JAN15NINSHA-NIN -> KXCBAGAME
+def series_of(ticker):
+    return ticker.split("-", 1)[0]
+
+# Seconds the newest saved snapshot may be behind now and still be restored: the lookback plus the
+# ticks between two saves (the state is saved every cache_every ticks and on shutdown)
+def restore_gap(params):
+    return params["lookback"] + params["cache_every"]
+
+class StateCache:
+    """
+    :param directory: cache root
+    :param max_age: seconds after which a saved ticker state is ignored
+    :param series_max_age: seconds after which saved series thresholds are ignored
+    :param max_entries: ticker files kept, least recently saved are evicted first
+    """
+
+    def __init__(self, directory, max_age=600, series_max_age=86400, max_entries=500):
+        self.directory = directory
+        self.max_age = max_age
+        self.series_max_age = series_max_age
+        self.max_entries = max_entries
+
+    def _path(self, ticker):
+        return os.path.join(self.directory, series_of(ticker), f"{ticker}.json")
+
+    def _series_path(self, series):
+        return os.path.join(self.directory, series, SERIES_FILE)
+
+    def _positions_path(self, ticker):
+        return os.path.join(self.directory, series_of(ticker), f"{ticker}{POSITIONS_SUFFIX}")
+
+    # Saved state of ticker, or None if missing, unreadable or older than max_age
+    def load(self, ticker):
+        return self._read(self._path(ticker), self.max_age)
+
+    # Last thresholds saved by any ticker of the series, or None
+    def load_series_thresholds(self, series):
+        state = self._read(self._series_path(series), self.series_max_age)
+        return state["thresholds"] if state else None
+
+    # Saves a ticker's state; history is a MarketHistory (oldest first in the file)
+    def save(self, ticker, thresholds, alpha, beta, history=None):
+        thresholds = {name: int(value) for name, value in thresholds.items()} if thresholds else None
+        state = {
+            "ticker": ticker,
+            "saved_at": time.time(),
+            "thresholds": thresholds,
+            "alpha": float(alpha),
+            "beta": float(beta),
+            "mu": float(alpha / (alpha + beta)),
+            "history": [history.snapshot(lag) for lag in range(len(history) - 1, -1, -1)] if history else [],
+        }
+
+        self._write(self._path(ticker), state)
+        if thresholds:
+            self._write(self._series_path(series_of(ticker)), {"saved_at": state["saved_at"], "thresholds": thresholds})
+
+    # Open positions of ticker saved by save_positions (list of dicts), [] if none
+    def load_positions(self, ticker):
+        state = self._read(self._positions_path(ticker), float("inf"))
+        return state["positions"] if state else []
+
+    def save_positions(self, ticker, positions):
+        self._write(self._positions_path(ticker), {"saved_at": time.time(), "positions": positions})
+
+    # Refills history from a saved state if its newest snapshot is younger than max_gap seconds
+    # Returns True if the history was restored
+    def restore_history(self, state, history, max_gap):
+        snapshots = state.get("history") or []
+        if not snapshots or time.time() - snapshots[-1]["ts"] > max_gap:
+            return False
+
+        history.clear()
+        for snapshot in snapshots[-history.capacity:]:
+            history.push(snapshot, snapshot["ts"])
+
+        return True
+
+    # Removes ticker files older than max_age, and the least recently saved beyond max_entries
+    def evict(self):
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".json") and name != SERIES_FILE and not name.endswith(POSITIONS_SUFFIX):
+                    path = os.path.join(root, name)
+                    entries.append((os.path.getmtime(path), path))
+
+        entries.sort(reverse=True)
+        now = time.time()
+        for i, (mtime, path) in enumerate(entries):
+            if i >= self.max_entries or now - mtime > self.max_age:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _read(self, path, max_age):
+        try:
+            with open(path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if time.time() - state.get("saved_at", 0) > max_age:
+            return None
+        return state
+
+    # Writes atomically so a crash mid-save never leaves a broken file
+    def _write(self, path, state):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
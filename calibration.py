@@ -0,0 +1,208 @@
+"""
+Threshold calibration shared by detector.py and backtester.py
+
+thresholds_from_deltas() is the batch rule (percentiles of the warm-up deltas).
+OnlineCalibrator keeps the same percentiles up to date tick by tick, so trading can
+start after params["min_samples"] ticks and thresholds follow regime changes:
+    "window" - exact percentiles over the last params["calibration_window"] ticks
+    "p2"     - P² streaming estimates over the whole session, constant memory
+"""
+
+import numpy as np
+
+from params import DEFAULT_PARAMS
+
+# Computes percentiles of parameters to determine how much change is "large" or "small"
+# Modify percentiles in params.py to determine conservativeness of bot
+# default values ensure bot works in extreme markets (such as when vol = 0 for long times)
+def thresholds_from_deltas(delta_vols, delta_prices, delta_spreads, params=DEFAULT_PARAMS):
+    delta_vols = np.asarray(delta_vols)
+    delta_prices = np.asarray(delta_prices)
+    delta_spreads = np.abs(np.asarray(delta_spreads))
+
+    # Compute vol thresholds with all vol that is not 0 (cuz 0 is no evidence)
+    delta_vols_nonzero = delta_vols[delta_vols > 0]
+    if len(delta_vols_nonzero) == 0:
+        vol_low, vol_high = 1, 5
+    else:
+        vol_low = max(1, int(np.percentile(delta_vols_nonzero, params["vol_low_pct"])))
+        vol_high = max(vol_low + 1, int(np.percentile(delta_vols_nonzero, params["vol_high_pct"])))
+
+    # Compute spread thresholds with all spread that is not 0 (cuz 0 is no evidence)
+    delta_spreads_nonzero = delta_spreads[delta_spreads > 0]
+    if len(delta_spreads_nonzero) == 0:
+        spread_thresh = 2  # spread thresh is by default 2 if there is no spread activity
+    else:
+        spread_thresh = int(np.percentile(delta_spreads_nonzero, params["spread_pct"]))
+        spread_thresh = max(1, spread_thresh)
+
+    price_high = max(2, int(np.percentile(delta_prices, params["price_pct"])))
+
+    thresholds = {
+        "vol_low": vol_low,
+        "vol_high": vol_high,
+        "spread_thresh": spread_thresh,
+        "price_high": price_high,
+    }
+
+    return thresholds
+
+class P2Quantile:
+    """
+    P² streaming quantile estimate (Jain & Chlamtac, 1985), five markers of state.
+    Exact (linear interpolation, like np.percentile) until five values are seen.
+
+    :param pct: percentile, 0-100
+    """
+
+    def __init__(self, pct):
+        p = pct / 100
+        self.p = p
+        self.count = 0
+        self.heights = []
+        self.positions = [0, 1, 2, 3, 4]
+        self.desired = [0, 2 * p, 4 * p, 2 + 2 * p, 4]
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x):
+        q = self.heights
+        self.count += 1
+
+        if self.count <= 5:
+            q.append(x)
+            q.sort()
+            return
+
+        n = self.positions
+
+        # find the cell x falls in, extending the extremes if needed
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        # move the middle markers toward their desired positions
+        for i in range(1, 4):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                height = self._parabolic(i, d)
+                if not q[i - 1] < height < q[i + 1]:
+                    height = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = height
+                n[i] += d
+
+    def _parabolic(self, i, d):
+        q = self.heights
+        n = self.positions
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def value(self):
+        if self.count == 0:
+            raise ValueError("no values")
+        if self.count <= 5:
+            return float(np.percentile(self.heights, self.p * 100))
+        return self.heights[2]
+
+class OnlineCalibrator:
+    """
+    Streaming version of the warm-up calibration.
+    Feed it every tick's deltas with update(); thresholds() is refreshed every
+    params["calibration_refresh"] ticks.
+
+    :param params: uses calibration_mode ("window" or "p2"), min_samples,
+                   calibration_window, calibration_refresh and the percentiles
+    """
+
+    def __init__(self, params=DEFAULT_PARAMS):
+        self.params = params
+        self.mode = params["calibration_mode"]
+        self.min_samples = params["min_samples"]
+        self.refresh = params["calibration_refresh"]
+        self.count = 0
+
+        self._thresholds = None
+        self._stale = 0  # updates since thresholds were computed
+
+        if self.mode == "window":
+            size = params["calibration_window"]
+            self._vols = np.zeros(size, dtype=np.int64)
+            self._prices = np.zeros(size, dtype=np.int64)
+            self._spreads = np.zeros(size, dtype=np.int64)
+        elif self.mode == "p2":
+            self._vol_low = P2Quantile(params["vol_low_pct"])
+            self._vol_high = P2Quantile(params["vol_high_pct"])
+            self._spread = P2Quantile(params["spread_pct"])
+            self._price = P2Quantile(params["price_pct"])
+        else:
+            raise ValueError(f"unknown online calibration mode {self.mode!r}")
+
+    # Enough ticks seen to trade
+    @property
+    def ready(self):
+        return self.count >= self.min_samples
+
+    def update(self, delta_vol, delta_price, delta_spread):
+        if self.mode == "window":
+            slot = self.count % len(self._vols)
+            self._vols[slot] = delta_vol
+            self._prices[slot] = delta_price
+            self._spreads[slot] = delta_spread
+        else:
+            if delta_vol > 0:
+                self._vol_low.add(delta_vol)
+                self._vol_high.add(delta_vol)
+            if delta_spread != 0:
+                self._spread.add(abs(delta_spread))
+            self._price.add(delta_price)
+
+        self.count += 1
+        self._stale += 1
+
+    # Current thresholds (same keys as calibrate()), None before the first update
+    def thresholds(self):
+        if self.count == 0:
+            return None
+        if self._thresholds is None or self._stale >= self.refresh:
+            self._thresholds = self._compute()
+            self._stale = 0
+        return self._thresholds
+
+    def _compute(self):
+        if self.mode == "window":
+            filled = min(self.count, len(self._vols))
+            return thresholds_from_deltas(self._vols[:filled], self._prices[:filled], self._spreads[:filled], self.params)
+
+        if self._vol_low.count == 0:
+            vol_low, vol_high = 1, 5
+        else:
+            vol_low = max(1, int(self._vol_low.value()))
+            vol_high = max(vol_low + 1, int(self._vol_high.value()))
+
+        if self._spread.count == 0:
+            spread_thresh = 2
+        else:
+            spread_thresh = max(1, int(self._spread.value()))
+
+        price_high = max(2, int(self._price.value()))
+
+        return {
+            "vol_low": vol_low,
+            "vol_high": vol_high,
+            "spread_thresh": spread_thresh,
+            "price_high": price_high,
+        }
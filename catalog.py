@@ -0,0 +1,381 @@
+"""
+Dataset catalog for backtesting
+
+Indexes a directory of recordings (csv files logged by data.py and tape segments, see
+tape.py) by ticker, series, date and row count. Each recording is parsed once into one
+.npy file per column under the cache directory; later loads memory-map those arrays
+instead of parsing the csv again.
+
+A cached recording is reused while its file size and mtime are unchanged. When they
+change the file is hashed, and only parsed again if its content changed. Cached arrays
+are kept under a disk budget, the least recently loaded recordings are evicted first
+(their index entry stays, the arrays are rebuilt on the next load). csv files without the
+data.py header (synth.py's <ticker>.labels.csv, notes) are not recordings and are skipped;
+a recording that fails to parse is remembered and only tried again once it changes.
+
+The date of a recording is the date in its ticker (KXCBAGAME-26JAN15NINSHA-NIN -> 2026-01-15),
+or the date of its first row when the ticker has none.
+
+Index a directory, list and backtest a query (all KXCBAGAME January games):
+    python catalog.py index recordings
+    python catalog.py list recordings --series KXCBAGAME --since 2026-01-01 --until 2026-01-31
+    python catalog.py backtest recordings --series KXCBAGAME --since 2026-01-01 --until 2026-01-31 --param mu_entry=0.6
+"""
+
+import argparse
+import fnmatch
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from cache import series_of
+
+INDEX_FILE = "index.json"
+TAPE_SUFFIXES = (".tape", ".tape.gz", ".tape.bz2", ".tape.xz")
+LABELS_SUFFIX = ".labels.csv"  # spike labels written next to synth.py markets, not a recording
+
+MONTHS = {month: i + 1 for i, month in enumerate(
+    ("JAN", "FEB", "MAR", "APR", "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC"))}
+TICKER_DATE = re.compile(r"-(\d{2})(" + "|".join(MONTHS) + r")(\d{2})")
+
+# "YYYY-MM-DD" from the event date in a ticker, None if it has none
+def ticker_date(ticker):
+    match = TICKER_DATE.search(ticker)
+    if match is None:
+        return None
+    year, month, day = match.groups()
+    return f"20{year}-{MONTHS[month]:02d}-{day}"
+
+# Recordings under directory: {key: source}, a source being one csv file or the segments of one ticker's tape
+def find_sources(directory, skip=None):
+    sources = {}
+    tapes = {}
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if skip is None or os.path.abspath(os.path.join(root, d)) != skip)
+        for name in sorted(files):
+            path = os.path.abspath(os.path.join(root, name))
+            if name.endswith(".csv"):
+                if name.endswith(LABELS_SUFFIX) or not _has_header(path):
+                    continue
+                ticker = name[:-len(".csv")]
+                sources[path] = {"path": path, "ticker": ticker, "format": "csv", "files": [path]}
+            elif name.endswith(TAPE_SUFFIXES):
+                ticker = name.split(".", 1)[0]
+                tapes.setdefault((os.path.abspath(root), ticker), []).append(path)
+
+    for (root, ticker), paths in tapes.items():
+        key = os.path.join(root, f"{ticker}.tape")
+        sources[key] = {"path": root, "ticker": ticker, "format": "tape", "files": paths}
+
+    return sources
+
+# Whether a csv file starts with the header of a data.py recording (ts and the backtester columns)
+def _has_header(path):
+    from backtester import COLUMNS
+
+    try:
+        with open(path, newline="") as f:
+            header = f.readline().strip().split(",")
+    except (OSError, UnicodeDecodeError):
+        return False
+    return {"ts", *COLUMNS} <= set(header)
+
+# (size, mtime) of every file of a source
+def _stat(files):
+    return [[os.path.getsize(path), os.path.getmtime(path)] for path in files]
+
+def _hash(files):
+    digest = hashlib.sha1()
+    for path in files:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+# Column arrays of a source, parsed like backtester.load_market
+def parse_source(source):
+    import backtester
+
+    if source["format"] == "csv":
+        return backtester.load_market(source["path"])
+    return backtester.load_tape(source["path"], source["ticker"])
+
+# Parses a source into <directory>/<column>.npy files, runs in the worker processes
+# Returns the index fields learned from the data
+def _build(source, directory):
+    market = parse_source(source)
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+    size = 0
+    for column, values in market.items():
+        path = os.path.join(directory, f"{column}.npy")
+        np.save(path, values)
+        size += os.path.getsize(path)
+
+    rows = len(market["delta_price"])
+    first = str(market["ts"][0])[:10] if rows else None
+    return {"rows": rows, "date": ticker_date(source["ticker"]) or first, "bytes": size, "hash": _hash(source["files"])}
+
+# Column arrays of a cached recording, memory-mapped read-only
+def load_arrays(directory):
+    return {name[:-len(".npy")]: np.load(os.path.join(directory, name), mmap_mode="r")
+            for name in os.listdir(directory) if name.endswith(".npy")}
+
+class Catalog:
+    """
+    Index and parsed-array cache of the recordings under a directory.
+
+    :param directory: recordings (csv files and tapes, searched recursively)
+    :param cache_dir: where the index and the arrays are kept
+    :param max_bytes: disk budget of the cached arrays
+    :param workers: processes parsing and backtesting recordings (default: all cores)
+    """
+
+    def __init__(self, directory, cache_dir=".catalog_cache", max_bytes=1 << 30, workers=None):
+        self.directory = os.path.abspath(directory)
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self.entries = self._read_index()  # key -> source plus stat, hash, rows, date, bytes, cached, used
+
+    def _read_index(self):
+        try:
+            with open(os.path.join(self.cache_dir, INDEX_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    # Writes atomically so a crash mid-save never leaves a broken index
+    def _write_index(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = os.path.join(self.cache_dir, INDEX_FILE)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp, path)
+
+    # Whether a recording's path is under the directory
+    def _inside(self, path):
+        return path == self.directory or path.startswith(self.directory + os.sep)
+
+    def _arrays_dir(self, key):
+        return os.path.join(self.cache_dir, "arrays", hashlib.sha1(key.encode("utf-8")).hexdigest()[:16])
+
+    # Whether the files of key are unchanged since they were parsed, refreshes the stat of touched but unchanged files
+    def _unchanged(self, key):
+        entry = self.entries[key]
+        if "hash" not in entry and "error" not in entry:
+            return False
+
+        try:
+            stat = _stat(entry["files"])
+        except OSError:
+            return False
+        if stat == entry["stat"]:
+            return True
+        # a recording that failed to parse is only tried again once its size or mtime changes
+        if "hash" not in entry or _hash(entry["files"]) != entry["hash"]:
+            return False
+
+        entry["stat"] = stat
+        return True
+
+    # Whether the cached arrays of key can be loaded as they are
+    def _fresh(self, key):
+        return self.entries[key].get("cached", False) and self._unchanged(key)
+
+    # Indexes the recordings under the directory and parses the new or changed ones
+    # (evicted recordings keep their index entry and are parsed again when loaded,
+    # recordings that failed to parse keep theirs too and are skipped until they change)
+    # Entries of removed files are dropped. Returns the number of recordings parsed
+    def refresh(self):
+        sources = find_sources(self.directory, skip=self.cache_dir)
+
+        for key in [key for key, entry in self.entries.items()
+                    if self._inside(entry["path"]) and key not in sources]:
+            shutil.rmtree(self._arrays_dir(key), ignore_errors=True)
+            del self.entries[key]
+
+        stale = []
+        for key, source in sources.items():
+            if key in self.entries and self.entries[key]["files"] == source["files"] and self._unchanged(key):
+                continue
+            self.entries[key] = dict(source, cached=False)
+            stale.append(key)
+
+        self._parse(stale)
+        self.evict()
+        self._write_index()
+        return len(stale)
+
+    # Parses keys on the process pool and records what was learned in the index
+    def _parse(self, keys):
+        if not keys:
+            return
+
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            futures = {key: pool.submit(_build, self.entries[key], self._arrays_dir(key)) for key in keys}
+            for key, future in futures.items():
+                entry = self.entries[key]
+                try:
+                    entry.update(future.result(), stat=_stat(entry["files"]), cached=True, used=time.time())
+                except Exception as e:
+                    print(f"WARNING: could not parse {entry['path']}: {e}")
+                    entry.update(error=str(e), stat=_stat(entry["files"]), cached=False)
+
+    # Index entries matching every given filter, sorted by date and ticker
+    # pattern: fnmatch pattern on the ticker, since/until: "YYYY-MM-DD" inclusive
+    def query(self, series=None, pattern=None, since=None, until=None, min_rows=0, fmt=None):
+        matches = []
+        for key, entry in self.entries.items():
+            if not self._inside(entry["path"]) or "error" in entry:
+                continue
+            if series is not None and series_of(entry["ticker"]) != series:
+                continue
+            if pattern is not None and not fnmatch.fnmatch(entry["ticker"], pattern):
+                continue
+            if since is not None and (entry.get("date") or "") < since:
+                continue
+            if until is not None and (entry.get("date") or "9999") > until:
+                continue
+            if entry.get("rows", 0) < min_rows or (fmt is not None and entry["format"] != fmt):
+                continue
+            matches.append(key)
+
+        return sorted(matches, key=lambda key: (self.entries[key].get("date") or "", self.entries[key]["ticker"]))
+
+    # Makes sure the arrays of keys are cached (parsing the missing ones) and marks them as used
+    # Returns the keys that could be parsed (recordings that failed to are left out)
+    def prepare(self, keys):
+        self._parse([key for key in keys if not self._fresh(key) and "error" not in self.entries[key]])
+        keys = [key for key in keys if "error" not in self.entries[key]]
+
+        now = time.time()
+        for key in keys:
+            self.entries[key]["used"] = now
+        self.evict(keep=set(keys))
+        self._write_index()
+        return keys
+
+    # Column arrays of one recording (see backtester.load_market), memory-mapped from the cache
+    def load(self, key):
+        self.prepare([key])
+        return load_arrays(self._arrays_dir(key))
+
+    # Removes the arrays of the least recently used recordings until the cache fits max_bytes
+    # Recordings in keep are never removed
+    def evict(self, keep=()):
+        cached = sorted((entry.get("used", 0), key) for key, entry in self.entries.items() if entry.get("cached"))
+        total = sum(self.entries[key]["bytes"] for _, key in cached)
+
+        for _, key in cached:
+            if total <= self.max_bytes:
+                break
+            if key in keep:
+                continue
+            shutil.rmtree(self._arrays_dir(key), ignore_errors=True)
+            self.entries[key]["cached"] = False
+            total -= self.entries[key]["bytes"]
+
+        return total
+
+    # Backtests every recording of keys on the process pool with params overrides
+    # Returns one results row per recording (ticker, date, rows, signals, trades, wins, pnl)
+    def backtest(self, keys, config=None):
+        config = config or {}
+        keys = self.prepare(keys)
+        directories = [self._arrays_dir(key) for key in keys]
+
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            results = list(pool.map(_backtest, directories, [config] * len(directories)))
+
+        rows = []
+        for key, result in zip(keys, results):
+            entry = self.entries[key]
+            rows.append(dict({"ticker": entry["ticker"], "date": entry.get("date"), "rows": entry["rows"]}, **result))
+        return rows
+
+# Backtests one cached recording, runs in the worker processes
+def _backtest(directory, config):
+    from sweep import run_config
+
+    row = run_config(config, [load_arrays(directory)])
+    return {name: row[name] for name in ("signals", "trades", "wins", "pnl")}
+
+def _print_entries(catalog, keys):
+    for key in keys:
+        entry = catalog.entries[key]
+        state = "cached" if entry.get("cached") else "evicted"
+        print(f"{entry.get('date') or '-':10}  {entry['ticker']:40}  {entry['format']:4}  {entry['rows']:>9} rows  {state}")
+    print(f"{len(keys)} recordings, {sum(catalog.entries[key]['rows'] for key in keys)} rows")
+
+def main():
+    from sweep import _cast
+
+    parser = argparse.ArgumentParser(description="Index, cache and batch backtest a directory of recordings")
+    parser.add_argument("--cache-dir", default=".catalog_cache")
+    parser.add_argument("--max-bytes", type=int, default=1 << 30, help="disk budget of the parsed-array cache")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("index", help="index the recordings and parse the new or changed ones").add_argument("directory")
+
+    for name, help in (("list", "print the recordings matching a query"),
+                       ("backtest", "backtest the recordings matching a query in parallel")):
+        command = commands.add_parser(name, help=help)
+        command.add_argument("directory")
+        command.add_argument("--series", help="e.g. KXCBAGAME")
+        command.add_argument("--pattern", help="ticker pattern, e.g. '*NIN'")
+        command.add_argument("--since", help="first date, YYYY-MM-DD")
+        command.add_argument("--until", help="last date, YYYY-MM-DD")
+        command.add_argument("--min-rows", type=int, default=0)
+        command.add_argument("--format", choices=("csv", "tape"))
+        if name == "backtest":
+            command.add_argument("--param", action="append", default=[], metavar="NAME=VALUE",
+                                 help="override a value of params.py")
+            command.add_argument("--out", help="write the per-recording results table (csv)")
+
+    args = parser.parse_args()
+
+    catalog = Catalog(args.directory, args.cache_dir, args.max_bytes, args.workers)
+    start = time.perf_counter()
+    parsed = catalog.refresh()
+    print(f"Indexed {len(catalog.query())} recordings ({parsed} parsed) in {time.perf_counter() - start:.1f}s")
+
+    if args.command == "index":
+        return
+
+    keys = catalog.query(args.series, args.pattern, args.since, args.until, args.min_rows, args.format)
+    if args.command == "list":
+        _print_entries(catalog, keys)
+        return
+
+    config = {}
+    for item in args.param:
+        name, value = item.split("=", 1)
+        config[name] = _cast(name, value)
+
+    start = time.perf_counter()
+    rows = catalog.backtest(keys, config)
+    seconds = time.perf_counter() - start
+
+    import pandas as pd
+
+    results = pd.DataFrame(rows, columns=["ticker", "date", "rows", "signals", "trades", "wins", "pnl"])
+    if args.out:
+        results.to_csv(args.out, index=False)
+    print(results.to_string(index=False))
+
+    total = results[["rows", "signals", "trades", "wins", "pnl"]].sum()
+    print(f"{len(results)} recordings, {total['rows']} rows in {seconds:.1f}s: signals {total['signals']}, "
+          f"trades {total['trades']} ({total['wins']} won), net {total['pnl']} cents")
+
+if __name__ == "__main__":
+    main()
@@ -4,15 +4,66 @@ Market Logger for backtesting
 This script logs a list of Kalshi market tickers ~every second and appends
 timestamped market parameters to a CSV file for every ticker
 
+By default all tickers are fetched in one bulk /markets request per tick.
+With bulk=False tickers are polled concurrently on a thread pool over one
+keep-alive session. Every row is stamped with the time its own response arrived
+
+Deltas compare each snapshot with the market lookback seconds before its arrival (see
+scheduler.add_lagged_deltas), rows are stamped to the millisecond, and csv rows also keep
+the volume so the backtester can recompute deltas on the same time window
+
+With fmt="tape" every raw snapshot field (both sides of the book, volume, request and
+response times) is recorded into binary tape segments instead (see tape.py)
+
 """
 
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from market import fetch_market
-from detector import fetch_past_markets
+import requests
+
+import market
+from market import fetch_market, fetch_markets, fetch_past_markets, fetch_past_markets_bulk
 import csv
 import time
-
-def log_markets(markets, start_hour, start_minute, end_hour, end_minute):
+from params import DEFAULT_PARAMS
+from scheduler import add_lagged_deltas, history_capacity
+
+CSV_COLUMNS = ["ts", "yes_ask", "yes_bid", "yes_spread", "delta_vol", "delta_spread", "delta_price", "volume"]
+
+# Fetches one ticker and stamps it with the times its request was sent and its response arrived
+# Deltas are taken against the history lookback seconds before the arrival, the time the row is stamped with
+# A request that failed after its retries gives no market (the ticker skips this tick)
+def poll_market(ticker, history):
+    sent = time.time()
+    try:
+        curr = fetch_market(ticker)
+    except requests.RequestException as e:
+        print(f"WARNING: {ticker} request failed ({e})")
+        return None, sent, datetime.now()
+    arrived = datetime.now()
+    return add_lagged_deltas(curr, history, DEFAULT_PARAMS, time.monotonic()), sent, arrived
+
+# Fetches every ticker in bulk and stamps them with the times the request was sent and the response arrived
+def poll_markets(markets, history):
+    sent = time.time()
+    try:
+        snapshot = fetch_markets(markets)
+    except requests.RequestException as e:
+        print(f"WARNING: bulk request failed, skipping this tick ({e})")
+        snapshot = {}
+    arrived = datetime.now()
+    clock = time.monotonic()
+    for ticker, curr in snapshot.items():
+        add_lagged_deltas(curr, history[ticker], DEFAULT_PARAMS, clock)
+    return [(snapshot.get(ticker), sent, arrived) for ticker in markets]
+
+# bulk: fetch all tickers in one /markets request per tick instead of one request per ticker
+# workers: number of polling threads when bulk is False (default: one per ticker)
+# fmt: "csv" (one <ticker>.csv each) or "tape" (binary segments in tape_dir, rotated at max_bytes,
+#      closed segments compressed with compress = None/"gzip"/"bz2"/"lzma")
+def log_markets(markets, start_hour, start_minute, end_hour, end_minute, bulk=True, workers=None,
+                fmt="csv", tape_dir="tapes", max_bytes=64 << 20, compress=None):
     # Wait until start time
     print("Waiting until start time...")
     while True:
@@ -23,22 +74,49 @@ def log_markets(markets, start_hour, start_minute, end_hour, end_minute):
 
     print("Logging beginning!")
 
-    history = {}
+    workers = workers or max(1, len(markets))
+    market.set_pool_size(workers)
+    pool = ThreadPoolExecutor(max_workers=workers)
+
+    # initial snapshot of past 10 markets, for every ticker at once
+    from history import MarketHistory
+
+    lookback = DEFAULT_PARAMS["lookback"]
+    if bulk:
+        history = fetch_past_markets_bulk(markets, lookback, history_capacity())
+    else:
+        history = dict(zip(markets, pool.map(
+            lambda ticker: fetch_past_markets(ticker, lookback, MarketHistory(history_capacity())), markets)))
+    columns = {}
     writers = {}
     files = {}
 
+    ticks = 0
+    missed = 0 # ticks that took longer than 1 second
+    next_tick = time.monotonic() # ticks start on a fixed 1 second grid, so sleeps don't drift
+
+    if fmt == "tape":
+        from tape import TapeWriter
+
     for ticker in markets:
-        # initial snapshot of past 10 markets
-        history[ticker] = fetch_past_markets(ticker, 10)
+        if fmt == "tape":
+            writers[ticker] = TapeWriter(tape_dir, ticker, max_bytes, compress)
+            files[ticker] = writers[ticker]
+            continue
 
-        f = open(f"{ticker}.csv", "a", newline="")
+        f = open(f"{ticker}.csv", "a+", newline="")
         files[ticker] = f
         w = csv.writer(f)
         writers[ticker] = w
 
-        # write header if file is empty
+        # write header if file is empty, else keep the columns of the file (older logs have no volume)
         if f.tell() == 0:
-            w.writerow(["ts", "yes_ask", "yes_bid", "yes_spread", "delta_vol", "delta_spread", "delta_price"])
+            columns[ticker] = CSV_COLUMNS
+            w.writerow(CSV_COLUMNS)
+        else:
+            f.seek(0)
+            columns[ticker] = next(csv.reader(f))
+            f.seek(0, 2)
 
     while True:
         now = datetime.now()
@@ -47,22 +125,33 @@ def log_markets(markets, start_hour, start_minute, end_hour, end_minute):
         if now.hour == end_hour and now.minute >= end_minute:
             break
 
-        loop_start = time.time()
+        loop_start = time.monotonic()
 
-        for ticker in markets:
-            curr = fetch_market(ticker, history[ticker][0])  # compare curr markets to 10 second ago markets
-            history[ticker].pop(0)
-            history[ticker].append(curr)
+        # compare curr markets to 10 second ago markets, all tickers in flight at once
+        if bulk:
+            results = poll_markets(markets, history)
+        else:
+            futures = [pool.submit(poll_market, ticker, history[ticker]) for ticker in markets]
+            results = [future.result() for future in futures]
 
-            row = [
-                now.replace(microsecond=0).isoformat(),
-                curr["yes_ask"],
-                curr["yes_bid"],
-                curr["yes_spread"],
-                curr["delta_vol"],
-                curr["delta_spread"],
-                curr["delta_price"]
-            ]
+        for ticker, (curr, sent, arrived) in zip(markets, results):
+            if curr is None:
+                print(f"WARNING: {ticker} missing from this tick")
+                continue
+
+            history[ticker].push(curr, arrived.timestamp())
+
+            # still filling the 10 second history
+            if "delta_vol" not in curr:
+                continue
+
+            if fmt == "tape":
+                writers[ticker].write(curr, arrived.timestamp(), sent)
+                writers[ticker].flush()
+                continue
+
+            row = dict(curr, ts=arrived.isoformat(timespec="milliseconds"))
+            row = [row[column] for column in columns[ticker]]
 
             writers[ticker].writerow(row)
             files[ticker].flush()
@@ -70,31 +159,66 @@ def log_markets(markets, start_hour, start_minute, end_hour, end_minute):
             print(f"{ticker} {row}")
 
         # sleep to maintain stable cadence
-        elapsed = time.time() - loop_start
-        time.sleep(max(0.0, 1.0 - elapsed))
-
+        elapsed = time.monotonic() - loop_start
+        ticks += 1
+        next_tick += 1.0
+        if elapsed > 1.0:
+            missed += 1
+            print(f"WARNING: tick took {elapsed:.2f}s, missed its deadline")
+            next_tick = time.monotonic()
+        time.sleep(max(0.0, next_tick - time.monotonic()))
+
+    pool.shutdown()
     for f in files.values():
         f.close()
 
+    print(f"{missed} of {ticks} ticks missed their 1 second deadline")
+
+# "HH:MM" -> (hour, minute)
+def parse_clock(value):
+    hour, minute = (int(part) for part in value.split(":"))
+    return hour, minute
+
 def main():
+    parser = argparse.ArgumentParser(description="Log markets to csv or tape, prompts for anything not given")
+    parser.add_argument("tickers", nargs="*", help="market tickers or scanner.py --out .txt files")
+    parser.add_argument("--start", type=parse_clock, help="start time HH:MM")
+    parser.add_argument("--until", type=parse_clock, help="end time HH:MM")
+    parser.add_argument("--format", choices=("csv", "tape"), dest="fmt")
+    args = parser.parse_args()
+
     print("Welcome to the market logger program!")
 
-    all_markets = []
+    all_markets = list(args.tickers)
+    if not all_markets:
+        file = ""
+        while file != "e":
+            file = input("Enter market ticker or scanner .txt file (input \"e\" to exit): ")
+            all_markets.append(file)
+
+        all_markets.remove("e")
 
-    file = ""
-    while file != "e":
-        file = input("Enter market ticker (input \"e\" to exit): ")
-        all_markets.append(file)
+    # a .txt file written by scanner.py --out stands for its tickers
+    if any(entry.endswith(".txt") for entry in all_markets):
+        from scanner import read_tickers
+        all_markets = [ticker for entry in all_markets
+                       for ticker in (read_tickers(entry) if entry.endswith(".txt") else [entry])]
 
-    all_markets.remove("e")
+    if args.start:
+        start_hour, start_minute = args.start
+    else:
+        start_hour = int(input("Enter start hour: "))
+        start_minute = int(input("Enter start minute: "))
 
-    start_hour = int(input("Enter start hour: "))
-    start_minute = int(input("Enter start minute: "))
+    if args.until:
+        end_hour, end_minute = args.until
+    else:
+        end_hour = int(input("Enter end hour: "))
+        end_minute = int(input("Enter end minute: "))
 
-    end_hour = int(input("Enter end hour: "))
-    end_minute = int(input("Enter end minute: "))
+    fmt = args.fmt or input("Record format (csv/tape): ").strip().lower() or "csv"
 
-    log_markets(all_markets, start_hour, start_minute, end_hour, end_minute)
+    log_markets(all_markets, start_hour, start_minute, end_hour, end_minute, fmt=fmt)
 
 if __name__ == "__main__":
     main()
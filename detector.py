@@ -1,32 +1,61 @@
-from market import fetch_market
+from market import fetch_market, fetch_past_markets
 from datetime import datetime
-from bet import place_bet
-import numpy as np
+from bet import client as order_client
+from params import DEFAULT_PARAMS
+from history import MarketHistory
+from calibration import OnlineCalibrator, thresholds_from_deltas
+from model import SpikeModel, update_evidence
+from cache import StateCache, restore_gap, series_of
+from positions import PositionManager
+from scheduler import (EvidenceClock, PollScheduler, RequestBudget, add_lagged_deltas, history_capacity,
+                       pre_spike_level)
+import http_client
+import journal
+import metrics
+import argparse
 import time
 
-# Find the last n markets and store it in history [1 second intervals]
-def fetch_past_markets(ticker, n):
-    history = []
-    prev_market = fetch_market(ticker)
-    for i in range(n):
-        time.sleep(1)
-        curr_market = fetch_market(ticker, prev_market)
-        history.append(curr_market)
-        prev_market = curr_market
+import requests
+
+# Waits for the next market update and computes deltas against the market lookback seconds before it
+# Uses the WebSocket feed when it is connected (returns as soon as an update is pushed, at most 1 second),
+# otherwise polls when the scheduler says so (adaptive polling, see scheduler.py) or once a second
+# Returns (market, arrival time.monotonic()): the reference is looked up from the arrival, the time the
+# snapshot is pushed with, so the lag is lookback seconds whatever the wait and the response latency
+def next_market(ticker, history, params=DEFAULT_PARAMS, feed=None, scheduler=None):
+    if feed is not None:
+        with metrics.timer("sleep", ticker):
+            feed.wait(ticker, timeout=1.0)
+    elif scheduler is not None:
+        with metrics.timer("sleep", ticker):
+            scheduler.wait(time.sleep)
+    else:
+        with metrics.timer("sleep", ticker):
+            time.sleep(1)
+
+    market = feed.latest(ticker) if feed is not None else None
+    if market is None:
+        market = fetch_market(ticker)
+    arrived = time.monotonic()
+    return add_lagged_deltas(market, history, params, arrived), arrived
 
-    return history
+# Whether an update goes into the history: every poll, pushed feed updates at most once per poll_fast seconds
+# so the history still reaches lookback seconds back (see scheduler.history_capacity)
+def keep_in_history(history, params, feed=None):
+    return feed is None or not len(history) or time.monotonic() - history.get("clock") >= params["poll_fast"]
 
 # Calibrate parameter thresholds of the bot
 # EX: a "large" delta_vol differs by market, so you need to define what is "large"
-def calibrate(ticker):
-    duration = 60 # calibration duration in seconds
+def calibrate(ticker, params=DEFAULT_PARAMS):
+    duration = params["duration"] # calibration duration in seconds
+    lookback = params["lookback"]
 
     delta_vols = []
     delta_prices = []
     delta_spreads = []
 
     # Store the last 10 markets (stores up to 10 seconds ago)
-    history = fetch_past_markets(ticker, 10)
+    history = fetch_past_markets(ticker, lookback, MarketHistory(history_capacity(params)))
 
     init_time = time.time()
 
@@ -35,226 +64,278 @@ def calibrate(ticker):
         time.sleep(1)
 
         # computes delta vol, price, etc. from curr to market 10 seconds ago
-        curr_market = fetch_market(ticker, history[0])
+        try:
+            curr_market = fetch_market(ticker)
+        except requests.RequestException as e:
+            journal.record("info", f"WARNING: market data failed, skipping this sample ({e})", ticker=ticker)
+            continue
+        arrived = time.monotonic()
+        add_lagged_deltas(curr_market, history, params, arrived)
 
         delta_vols.append(curr_market['delta_vol'])
         delta_prices.append(curr_market['delta_price'])
         delta_spreads.append(curr_market['delta_spread'])
 
-        history.pop(0)
-        history.append(curr_market)
+        history.push(curr_market, clock=arrived)
 
-    # Convert lists into np arrays for analysis
-    delta_vols = np.array(delta_vols)
-    delta_prices = np.array(delta_prices)
-    delta_spreads = np.abs(np.array(delta_spreads))
+    return thresholds_from_deltas(delta_vols, delta_prices, delta_spreads, params)
 
-    # Computes percentiles of parameters to determine how much change is "large" or "small"
-    # Modify percentiles to determine conservativeness of bot
-    # default values ensure bot works in extreme markets (such as when vol = 0 for long times)
+# Reasons not to buy NO on a stalled fake spike (empty list = trade)
+def entry_rejections(market, pre_spike_no, params=DEFAULT_PARAMS):
+    no_bid = market["no_bid"]
+    no_ask = market["no_ask"]
+    spread = no_ask - no_bid
 
-    # Compute vol thresholds with all vol that is not 0 (cuz 0 is no evidence)
-    delta_vols_nonzero = delta_vols[delta_vols > 0]
-    if len(delta_vols_nonzero) == 0:
-        vol_low, vol_high = 1, 5
-    else:
-        vol_low = max(1, int(np.percentile(delta_vols_nonzero, 25)))
-        vol_high = max(vol_low + 1, int(np.percentile(delta_vols_nonzero, 75)))
+    max_spread = params["max_spread"] # spread loses profit, so define a max spread
+    buffer = params["fee_buffer"] # buffer for Kalshi fees
+    expected_net = pre_spike_no - no_ask
 
-    # Compute spread thresholds with all spread that is not 0 (cuz 0 is no evidence)
-    delta_spreads_nonzero = delta_spreads[delta_spreads > 0]
-    if len(delta_spreads_nonzero) == 0:
-        spread_thresh = 2  # spread thresh is by default 2 if there is no spread activity
-    else:
-        spread_thresh = int(np.percentile(delta_spreads_nonzero, 80))
-        spread_thresh = max(1, spread_thresh)
+    rejections = []
 
-    price_high = max(2, int(np.percentile(delta_prices, 95)))
+    if not (0 <= no_bid <= 100 and 0 <= no_ask <= 100) or no_ask < no_bid:
+        rejections.append("of bad prices")
 
-    thresholds = {
-        "vol_low": vol_low,
-        "vol_high": vol_high,
-        "spread_thresh": spread_thresh,
-        "price_high": price_high,
-    }
+    if spread > max_spread:
+        rejections.append("of bad spread")
 
-    return thresholds
+    if expected_net <= buffer:
+        rejections.append("expected profit does not exceed Kalshi fees")
+
+    return rejections
 
 # Runs the main spike detector algorithm till end_hour:end_minute
-def detect(ticker, end_hour, end_minute):
-    alpha = 1 # evidence that move is a fake spike
-    beta = 2 # evidence that move is a real repricing
-    decay = 0.9 # old evidence loses 10% weight each jump
+# feed: optional feed.MarketFeed, market updates are then pushed instead of polled
+def detect(ticker, end_hour, end_minute, params=DEFAULT_PARAMS, feed=None):
+    http_client.configure(params)
+
+    alpha_floor = params["alpha_floor"]
+    beta_floor = params["beta_floor"]
+    lookback = params["lookback"]
+
+    alpha = alpha_floor # evidence that move is a fake spike
+    beta = beta_floor # evidence that move is a real repricing
+
+    # Restore thresholds, evidence and history saved by a previous run (see cache.py)
+    cache = None
+    state = None
+    cached_thresholds = None
+    if params["cache_dir"]:
+        cache = StateCache(params["cache_dir"], params["cache_max_age"], params["cache_series_max_age"],
+                           params["cache_max_entries"])
+        cache.evict()
+        state = cache.load(ticker)
+        if state is not None:
+            cached_thresholds = state["thresholds"]
+            alpha = max(alpha_floor, state["alpha"])
+            beta = max(beta_floor, state["beta"])
+            journal.record("info", f"Restored cached state (alpha {alpha}, beta {beta})", ticker=ticker)
+        else:
+            cached_thresholds = cache.load_series_thresholds(series_of(ticker))
 
     # Bayesian confidence that the current market move is a “fake spike”
     mu = alpha / (alpha + beta)
 
-    print("Calibrating model...")
-    # Calibrate model first
-    thresholds = calibrate(ticker)
-    print(thresholds)
-    print("Calibration success!")
+    # evidence state of this market (see model.py)
+    model = SpikeModel(1, params)
+    model.alpha[0], model.beta[0], model.mu[0] = alpha, beta, mu
+
+    # open order connections and load the signing key before the first spike
+    order_client.warm()
+
+    # open positions are managed between ticks while the detector keeps running (see positions.py)
+    positions = PositionManager(params, cache)
+    positions.restore(ticker)
+
+    if params["metrics_port"]:
+        port = metrics.serve(params["metrics_port"])
+        journal.record("info", f"Metrics on http://127.0.0.1:{port}/metrics", ticker=ticker)
+
+    # Order book depth evidence needs the incremental books of the WebSocket feed
+    depth = params["depth_evidence"] and feed is not None and feed.orderbook
+    if params["depth_evidence"] and not depth:
+        journal.record("info", "WARNING: depth_evidence needs a feed with orderbook=True, ignoring it", ticker=ticker)
+
+    # Adaptive polling: faster during jumps and positions, slower while quiet (the WebSocket feed pushes instead)
+    scheduler = None
+    if params["poll_mode"] == "adaptive" and feed is None:
+        scheduler = PollScheduler([ticker], params, RequestBudget(params["poll_budget"]), clock=time.monotonic)
+    # Pushed updates can arrive many times a second, evidence still advances once per elapsed second
+    evidence_clock = scheduler.evidence if scheduler is not None else EvidenceClock(time.monotonic)
+
+    # Online calibration keeps thresholds up to date while trading instead of a blocking warm-up
+    calibrator = None
+    if params["calibration_mode"] != "batch":
+        calibrator = OnlineCalibrator(params)
+        thresholds = cached_thresholds
+        journal.record("info", f"Calibrating online, trading starts after {calibrator.min_samples} ticks", ticker=ticker)
+        if cached_thresholds:
+            journal.record("info", f"Using cached thresholds until then: {cached_thresholds}", ticker=ticker,
+                           thresholds=cached_thresholds)
+    elif cached_thresholds:
+        thresholds = cached_thresholds
+        journal.record("info", f"Restored cached thresholds: {thresholds}", ticker=ticker, thresholds=thresholds)
+    else:
+        journal.record("info", "Calibrating model...", ticker=ticker)
+        # Calibrate model first
+        thresholds = calibrate(ticker, params)
+        journal.record("info", f"{thresholds}\nCalibration success!", ticker=ticker, thresholds=thresholds)
+
+    # Store the last 10 markets (stores up to 10 seconds ago, more snapshots when polling adaptively or on the feed)
+    history = MarketHistory(history_capacity(params, pushed=feed is not None))
+    if state is None or not cache.restore_history(state, history, restore_gap(params)):
+        fetch_past_markets(ticker, lookback, history)
 
-    # Store the last 10 markets (stores up to 10 seconds ago)
-    history = fetch_past_markets(ticker, 10)
+    journal.record("info", "Trading commencing...", ticker=ticker)
 
-    print("Trading commencing...")
+    tick = 0
+    tick_start = time.perf_counter()
 
     # Alpha/beta updates, end when end time is reached
     while not (datetime.now().hour == end_hour and datetime.now().minute == end_minute):
-        time.sleep(1)
-
         # compares current market to market 10 seconds ago
-        curr_market = fetch_market(ticker, history[0])
-
-        # Very slow decay of evidence over time
-        alpha = max(1.0, alpha * 0.99)
-        beta = max(2.0, beta * 0.99)
-
-        if curr_market['delta_price'] >= thresholds['price_high']:
-            # Deprioritize old evidence
-            alpha = max(1.0, alpha * decay)
-            beta  = max(2.0, beta * decay)
-
-            # If the YES price moved up by at least "jump" threshold,
-            # classify whether the move looks like a fake spike (alpha) or a real repricing (beta)
-            if curr_market["delta_vol"] == 0:
-                # only blame "fake spike" if liquidity actually pulls
-                if curr_market["delta_spread"] >= thresholds["spread_thresh"]:
-                    alpha += 1
-                # if spread tightens with no prints, treat it as tiny beta
-                elif curr_market["delta_spread"] <= -thresholds["spread_thresh"]:
-                    beta += 0.25
-                # otherwise no evidence
-
-            # Low volume on a jump suggests a hype spike -> alpha++
-            elif curr_market['delta_vol'] <= thresholds['vol_low']:
-                alpha += 1
-            # High volume on a jump suggests broad participation -> beta++
-            elif curr_market['delta_vol'] >= thresholds["vol_high"]:
-                beta += 1 + min(3, curr_market["delta_vol"] / thresholds["vol_high"])
-
-            # Spread tightening during the jump suggests healthy liquidity -> beta++
-            if curr_market['delta_spread'] <= -thresholds['spread_thresh'] and curr_market['delta_vol'] >= thresholds[
-                "vol_high"]:
-                beta += 1
-            # Spread widening during the jump suggests makers pulled liquidity -> alpha++
-            elif curr_market['delta_spread'] >= thresholds['spread_thresh']:
-                alpha += 1
-
-            # update mu
-            mu = alpha / (alpha + beta)
+        # a request that failed after its retries (timeout, connection error, 429/5xx) skips the tick
+        try:
+            curr_market, arrived = next_market(ticker, history, params, feed, scheduler)
+        except requests.RequestException as e:
+            journal.record("info", f"WARNING: market data failed, skipping this tick ({e})", ticker=ticker)
+            continue
+
+        # loop time from market to market, includes the sleep
+        now = time.perf_counter()
+        metrics.tick(now - tick_start, ticker, scheduler.interval[ticker] if scheduler is not None else None)
+        tick_start = now
+
+        # evidence is taken once per elapsed second, so fast polls and pushed updates do not count a jump twice
+        ticks = evidence_clock.take_ticks(ticker) if scheduler is not None or feed is not None else 1
+
+        # ask depth pulled/consumed since the last tick (none until the feed has a book)
+        if depth:
+            curr_market.update(feed.take_depth(ticker))
+
+        # exits of open positions (also while calibrating), then the order results that arrived since the last tick
+        wall = time.time()
+        positions.update(ticker, curr_market, wall)
+        for kind, _, _ in positions.poll(wall):
+            if kind == "opened":
+                # Reset alpha and beta values
+                model.reset(0)
+            elif kind == "closed":
+                # spike cooldown
+                model.start_cooldown(0, wall + params["cooldown"])
+
+        # save warm state every few ticks so a restart can resume quickly
+        tick += 1
+        if params["metrics_every"] and tick % params["metrics_every"] == 0:
+            journal.say(metrics.summary_line())
+        if cache is not None and tick % params["cache_every"] == 0:
+            cache.save(ticker, thresholds, alpha, beta, history)
+
+        if calibrator is not None:
+            # thresholds come from earlier ticks only, then this tick is added
+            thresholds = calibrator.thresholds() if calibrator.ready else cached_thresholds
+            if ticks:
+                calibrator.update(curr_market['delta_vol'], curr_market['delta_price'], curr_market['delta_spread'])
+
+            # still warming up, no evidence or trades yet
+            if thresholds is None:
+                if keep_in_history(history, params, feed):
+                    history.push(curr_market, clock=arrived)
+                continue
+
+        # Very slow decay of evidence over time, plus the jump evidence
+        jumped = False
+        if ticks:
+            with metrics.timer("evidence", ticker):
+                model.set_thresholds(thresholds)
+                depth_pulled = depth_consumed = None
+                if "depth_consumed" in curr_market:
+                    depth_pulled, depth_consumed = [curr_market['depth_pulled']], [curr_market['depth_consumed']]
+                jumped = model.update([curr_market['delta_price']], [curr_market['delta_vol']],
+                                      [curr_market['delta_spread']], ticks=ticks, depth_pulled=depth_pulled,
+                                      depth_consumed=depth_consumed)[0]
+        alpha, beta, mu = model.alpha[0], model.beta[0], model.mu[0]
+
+        if scheduler is not None:
+            scheduler.observe(ticker, curr_market['delta_price'] >= thresholds['price_high'], mu,
+                              position=bool(positions.open_positions(ticker)))
+        if jumped:
+            depth_fields = {k: curr_market[k] for k in ("depth_pulled", "depth_consumed", "ask_depth") if k in curr_market}
+            journal.record("jump", ticker=ticker, delta_price=curr_market['delta_price'], delta_vol=curr_market['delta_vol'],
+                           delta_spread=curr_market['delta_spread'], alpha=alpha, beta=beta, mu=mu, **depth_fields)
+
+        journal.record("tick", ticker=ticker, yes_bid=curr_market['yes_bid'], yes_ask=curr_market['yes_ask'],
+                       no_bid=curr_market['no_bid'], no_ask=curr_market['no_ask'], volume=curr_market['volume'],
+                       delta_price=curr_market['delta_price'], delta_vol=curr_market['delta_vol'],
+                       delta_spread=curr_market['delta_spread'], mu=mu)
 
         # Fake spike confidence reached
-        if mu > 0.7:
+        if mu > params["mu_entry"] and model.ready(wall)[0] and positions.can_open(ticker):
             # Check if the price is starting to drop. If so, bet
             if curr_market['delta_price'] <= 0:
                 # Check spread before buying
-                no_bid = curr_market["no_bid"]
-                no_ask = curr_market["no_ask"]
-                spread = no_ask - no_bid
-                pre_spike_no = max(market['no_bid'] for market in history)
-
-                max_spread = 3 # spread loses profit, so define a max spread
-                buffer = 2 # buffer for Kalshi fees
-                expected_net = pre_spike_no - no_ask
-
-                print("fake spike predicted, and spike stalled")
+                pre_spike_no = pre_spike_level(history, params)
 
                 # whether a trade occurs
-                trade = True
-
-                if not (0 <= no_bid <= 100 and 0 <= no_ask <= 100) or no_ask < no_bid:
-                    print("No trade because of bad prices")
-                    trade = False
-
-                if spread > max_spread:
-                    print("No trade because of bad spread")
-                    trade = False
-
-                if expected_net <= buffer:
-                    print("No trade because expected profit does not exceed Kalshi fees")
-                    trade = False
-
-                if trade:
-                    print("buying no shares to bet against it.")
-
-                    date = datetime.fromtimestamp(time.time())
-                    print(date)
+                rejections = entry_rejections(curr_market, pre_spike_no, params)
+                message = "\n".join(["fake spike predicted, and spike stalled"] +
+                                     [f"No trade because {reason}" for reason in rejections])
+                journal.record("signal", message, ticker=ticker, mu=mu, pre_spike_no=pre_spike_no,
+                               no_bid=curr_market['no_bid'], no_ask=curr_market['no_ask'], rejections=rejections)
 
-                    # places 1 contract no purchase
-                    buy = place_bet(ticker, "buy", "no", curr_market['no_ask'])
+                if not rejections:
+                    journal.say(f"buying no shares to bet against it.\n{datetime.now()}")
 
-                    # Ensures purchase went through
-                    data = buy.json()
-                    if "order" not in data or data["order"]["status"] in ("canceled", "rejected"):
-                        print("Buy didn't fill")
-
-                        # update history
-                        history.pop(0)
-                        history.append(curr_market)
-
-                        continue
-
-                    # Reset alpha and beta values
-                    alpha = 1
-                    beta = 2
-                    mu = alpha / (alpha + beta)
-
-                    # sell logic
-                    stop_loss = 5
-                    entry_cost = curr_market['no_ask']
-                    stop_level = max(1, entry_cost - stop_loss)
-
-                    max_timeout = 600
-                    t0 = time.time()
-
-                    while curr_market['no_bid'] < pre_spike_no:
-                        # exits market if no price drops by 5
-                        if curr_market['no_bid'] <= stop_level:
-                            print("stop loss hit")
-                            break
-
-                        # exits market if no activity for max_timeout seconds
-                        if time.time() - t0 > max_timeout:
-                            print("max timeout reached")
-                            break
-
-                        time.sleep(1)
-                        curr_market = fetch_market(ticker, history[0])
-                        history.pop(0)
-                        history.append(curr_market)
-
-                    sell = place_bet(ticker, "sell", "no")
-                    s = sell.json()
-                    if "order" not in s or s["order"]["status"] in ("canceled", "rejected"):
-                        print("WARNING: Sell did not fill")
-                    else:
-                        print("Contracts sold")
-
-                    print("Net:", curr_market['no_bid'] - entry_cost)
-
-
-                    # spike cooldown
-                    time.sleep(15)
-
-                    # reset history, fetch new past 10 markets
-                    history = fetch_past_markets(ticker, 10)
-                    continue
+                    # places 1 contract no purchase, the result is applied by positions.poll() on a later tick
+                    positions.open(ticker, curr_market, pre_spike_no, wall)
 
         # update history
-        history.pop(0)
-        history.append(curr_market)
+        if keep_in_history(history, params, feed):
+            history.push(curr_market, clock=arrived)
 
+    positions.close(time.time())
+    if positions.open_positions(ticker):
+        journal.record("info", f"WARNING: {len(positions.open_positions(ticker))} position(s) still open at the end time"
+                               + (", saved for the next run" if cache is not None else ""), ticker=ticker)
+    if cache is not None:
+        cache.save(ticker, thresholds, alpha, beta, history)
+
+    journal.flush()
 
 def main():
-    ticker = input("Input market ticker: ")
+    from data import parse_clock
+
+    parser = argparse.ArgumentParser(description="Live fake spike detector/trader, prompts for anything not given")
+    parser.add_argument("ticker", nargs="?")
+    parser.add_argument("--start", type=parse_clock, help="start time HH:MM")
+    parser.add_argument("--until", type=parse_clock, help="end time HH:MM")
+    parser.add_argument("--feed", action=argparse.BooleanOptionalAction, help="use the WebSocket feed")
+    parser.add_argument("--param", action="append", default=[], help="override a params.py value, e.g. mu_entry=0.6")
+    args = parser.parse_args()
+
+    params = dict(DEFAULT_PARAMS)
+    if args.param:
+        from sweep import _cast
+        for item in args.param:
+            name, value = item.split("=", 1)
+            params[name] = _cast(name, value)
+
+    ticker = args.ticker or input("Input market ticker: ")
+
+    if args.start:
+        start_hour, start_minute = args.start
+    else:
+        start_hour = int(input("Enter start hour: "))
+        start_minute = int(input("Enter start minute: "))
 
-    start_hour = int(input("Enter start hour: "))
-    start_minute = int(input("Enter start minute: "))
+    if args.until:
+        end_hour, end_minute = args.until
+    else:
+        end_hour = int(input("Enter end hour: "))
+        end_minute = int(input("Enter end minute: "))
 
-    end_hour = int(input("Enter end hour: "))
-    end_minute = int(input("Enter end minute: "))
+    use_feed = args.feed
+    if use_feed is None:
+        use_feed = input("Use WebSocket feed? (y/n): ").strip().lower() == "y"
 
     # start program at start time (3:25 AM for CBA games)
     print('Waiting for start time...')
@@ -263,7 +344,16 @@ def main():
             break
         time.sleep(60)
 
-    detect(ticker, end_hour, end_minute)
+    feed = None
+    if use_feed:
+        from feed import MarketFeed
+        feed = MarketFeed([ticker], orderbook=params["depth_evidence"]).start()
+
+    try:
+        detect(ticker, end_hour, end_minute, params, feed=feed)
+    finally:
+        if feed is not None:
+            feed.stop()
 
     print('Program ended.')
 
@@ -0,0 +1,286 @@
+"""
+Push-based market feed over the Kalshi WebSocket API
+
+MarketFeed subscribes to the ticker and trade channels for a list of tickers on a
+background thread and keeps the latest snapshot per ticker, in the same fields the
+REST market json uses (yes_bid, yes_ask, no_bid, no_ask, volume, yes_bid_dollars).
+detector.next_market() waits on the feed and falls back to polling when it is down.
+With orderbook=True it also subscribes to orderbook_delta and keeps an
+orderbook.OrderBook per ticker (depth features for detector.py).
+
+Replay server for offline testing (streams a csv logged by data.py as ticker messages):
+    python feed.py replay cba_game_sample.csv --ticker KXCBAGAME-26JAN15NINSHA-NIN --port 8765
+    python feed.py watch KXCBAGAME-26JAN15NINSHA-NIN --url ws://127.0.0.1:8765
+"""
+
+import argparse
+import asyncio
+import json
+import threading
+import time
+
+WS_URL = "wss://api.elections.kalshi.com/trade-api/ws/v2"
+WS_PATH = "/trade-api/ws/v2"
+
+CHANNELS = ["ticker", "trade"]
+
+class SequenceGap(Exception):
+    """
+    An orderbook_delta message was missed, the books must be rebuilt from new snapshots.
+    """
+
+# Signed headers for the WebSocket handshake
+def auth_headers():
+    import api_info as api
+
+    return api.auth_headers("GET", WS_PATH)
+
+class MarketFeed:
+    """
+    Latest market snapshot per ticker, kept up to date by a WebSocket subscription.
+    Reconnects with backoff until stopped.
+
+    :param tickers: market tickers to subscribe to
+    :param url: WebSocket url (ws:// for a local replay server)
+    :param auth: sign the handshake with the keys in api_info.py
+    :param orderbook: also keep an order book per ticker (orderbook_delta channel)
+    """
+
+    def __init__(self, tickers, url=WS_URL, auth=True, orderbook=False):
+        self.tickers = list(tickers)
+        self.url = url
+        self.auth = auth
+        self.orderbook = orderbook
+        self.connected = False
+
+        self._markets = {}
+        self._books = {}  # ticker -> OrderBook
+        self._book_seq = {}  # orderbook subscription id -> last message seq
+        self._seq = {}  # ticker -> number of updates received
+        self._seen = {}  # ticker -> last update returned by wait()
+        self._cond = threading.Condition()
+        self._stop = False
+        self._loop = None
+        self._ws = None
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=asyncio.run, args=(self._main(),), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop = True
+        if self._loop is not None and self._ws is not None:
+            asyncio.run_coroutine_threadsafe(self._ws.close(), self._loop)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    # Waits until the feed has connected, returns False on timeout
+    def wait_connected(self, timeout):
+        deadline = time.monotonic() + timeout
+        while not self.connected and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return self.connected
+
+    # Copy of the latest snapshot, or None if the feed is down or has not seen the ticker
+    def latest(self, ticker):
+        with self._cond:
+            if not self.connected or "yes_bid" not in self._markets.get(ticker, {}):
+                return None
+            return dict(self._markets[ticker])
+
+    # Order book depth features of ticker since the last call (see OrderBook.take_features)
+    # Empty when there is no book yet (no snapshot received, or the feed is down)
+    def take_depth(self, ticker):
+        with self._cond:
+            book = self._books.get(ticker)
+            if not self.connected or book is None or not book.ready:
+                return {}
+            return book.take_features()
+
+    # Blocks until ticker has an update not returned by a previous wait(), or timeout
+    # Returns True if there was an update
+    def wait(self, ticker, timeout):
+        with self._cond:
+            updated = self._cond.wait_for(lambda: self._seq.get(ticker, 0) > self._seen.get(ticker, 0), timeout)
+            self._seen[ticker] = self._seq.get(ticker, 0)
+            return updated
+
+    async def _main(self):
+        import websockets
+
+        self._loop = asyncio.get_running_loop()
+        backoff = 1
+
+        while not self._stop:
+            try:
+                headers = auth_headers() if self.auth else None
+                async with websockets.connect(self.url, additional_headers=headers) as ws:
+                    self._ws = ws
+                    await ws.send(json.dumps({
+                        "id": 1,
+                        "cmd": "subscribe",
+                        "params": {"channels": CHANNELS + ["orderbook_delta"] if self.orderbook else CHANNELS,
+                                   "market_tickers": self.tickers},
+                    }))
+                    self.connected = True
+                    backoff = 1
+
+                    async for message in ws:
+                        self.handle(json.loads(message))
+            except Exception as e:
+                if not self._stop:
+                    print(f"Feed disconnected: {e}")
+
+            self._set_disconnected()
+            if not self._stop:
+                await asyncio.sleep(backoff)
+                backoff = min(30, backoff * 2)
+
+    def _set_disconnected(self):
+        with self._cond:
+            self.connected = False
+            self._ws = None
+            # books are rebuilt from the snapshots sent after the next subscribe
+            self._books = {}
+            self._book_seq = {}
+            self._cond.notify_all()
+
+    # Applies one orderbook_snapshot or orderbook_delta message to the book of ticker
+    # Raises SequenceGap when a message of the subscription was missed (the feed then reconnects)
+    def _handle_book(self, message, msg, ticker):
+        from orderbook import OrderBook
+
+        sid, seq = message.get("sid"), message.get("seq")
+        if seq is not None:
+            last = self._book_seq.get(sid)
+            if last is not None and seq != last + 1:
+                raise SequenceGap(f"orderbook seq {last} -> {seq}")
+            self._book_seq[sid] = seq
+
+        book = self._books.get(ticker)
+        if message["type"] == "orderbook_snapshot":
+            if book is None:
+                book = self._books[ticker] = OrderBook(ticker)
+            book.apply_snapshot(msg)
+        elif book is not None:
+            price = msg["price"] if "price" in msg else int(round(float(msg["price_dollars"]) * 100))
+            book.apply_delta(msg["side"], price, msg["delta"])
+
+    # Applies one ticker, trade or order book message to the snapshot
+    def handle(self, message):
+        msg = message.get("msg", {})
+        ticker = msg.get("market_ticker")
+        if ticker is None:
+            return
+
+        with self._cond:
+            if message.get("type") in ("orderbook_snapshot", "orderbook_delta"):
+                self._handle_book(message, msg, ticker)
+                return
+
+            market = self._markets.setdefault(ticker, {"ticker": ticker})
+
+            if message.get("type") == "ticker":
+                market["yes_bid"] = msg["yes_bid"]
+                market["yes_ask"] = msg["yes_ask"]
+                market["no_bid"] = 100 - msg["yes_ask"]
+                market["no_ask"] = 100 - msg["yes_bid"]
+                market["yes_bid_dollars"] = msg.get("yes_bid_dollars", f"{msg['yes_bid'] / 100:.4f}")
+                market["volume"] = msg["volume"]
+                market["last_price"] = msg.get("price")
+            elif message.get("type") == "trade":
+                # volume is refreshed by the next ticker message, count trades in between
+                market["volume"] = market.get("volume", 0) + msg.get("count", 0)
+                market["last_price"] = msg.get("yes_price")
+                if ticker in self._books and "taker_side" in msg:
+                    self._books[ticker].trade(msg["taker_side"], msg.get("count", 0))
+            else:
+                return
+
+            # a trade before the first ticker message is not a usable snapshot yet
+            if "yes_bid" not in market:
+                return
+
+            self._seq[ticker] = self._seq.get(ticker, 0) + 1
+            self._cond.notify_all()
+
+# Rebuilds ticker messages from a csv logged by data.py (or a tape)
+# The csv only stores 10 second volume deltas, volume is rebuilt like replay.py does (see backtester.market_volume)
+def replay_messages(file, ticker, lookback=10):
+    import backtester
+
+    market = backtester.load_market(file)
+    volume = backtester.market_volume(market, lookback)
+    for i in range(len(market["yes_bid"])):
+        yes_bid = int(market["yes_bid"][i])
+        yes_ask = int(market["yes_ask"][i])
+
+        yield {
+            "type": "ticker",
+            "sid": 1,
+            "seq": i + 1,
+            "msg": {
+                "market_ticker": ticker,
+                "price": yes_bid,
+                "yes_bid": yes_bid,
+                "yes_ask": yes_ask,
+                "yes_bid_dollars": f"{yes_bid / 100:.4f}",
+                "volume": int(volume[i]),
+                "ts": str(market["ts"][i]),
+            },
+        }
+
+# Local mock of the exchange WebSocket that replays a csv at rate rows per second
+async def serve_replay(file, ticker, host="127.0.0.1", port=8765, rate=1.0):
+    from websockets.asyncio.server import serve
+    from websockets.exceptions import ConnectionClosed
+
+    async def handler(ws):
+        try:
+            # wait for the subscribe command like the exchange does
+            request = json.loads(await ws.recv())
+            await ws.send(json.dumps({"id": request.get("id"), "type": "subscribed", "msg": {"channel": "ticker", "sid": 1}}))
+
+            for message in replay_messages(file, ticker):
+                await ws.send(json.dumps(message))
+                await asyncio.sleep(1 / rate)
+        except ConnectionClosed:
+            pass
+
+    async with serve(handler, host, port) as server:
+        print(f"Replaying {file} as {ticker} on ws://{host}:{port}")
+        await server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description="Kalshi WebSocket market feed")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    replay = commands.add_parser("replay", help="serve a csv as a mock exchange feed")
+    replay.add_argument("file")
+    replay.add_argument("--ticker", default="KXCBAGAME-26JAN15NINSHA-NIN")
+    replay.add_argument("--host", default="127.0.0.1")
+    replay.add_argument("--port", type=int, default=8765)
+    replay.add_argument("--rate", type=float, default=1.0, help="rows per second")
+
+    watch = commands.add_parser("watch", help="print updates from a feed")
+    watch.add_argument("tickers", nargs="+")
+    watch.add_argument("--url", default=WS_URL)
+
+    args = parser.parse_args()
+
+    if args.command == "replay":
+        asyncio.run(serve_replay(args.file, args.ticker, args.host, args.port, args.rate))
+    else:
+        feed = MarketFeed(args.tickers, args.url, auth=args.url.startswith("wss://")).start()
+        try:
+            while True:
+                for ticker in args.tickers:
+                    if feed.wait(ticker, timeout=1.0):
+                        print(ticker, feed.latest(ticker))
+        except KeyboardInterrupt:
+            feed.stop()
+
+if __name__ == "__main__":
+    main()
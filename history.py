@@ -0,0 +1,225 @@
+"""
+Fixed-capacity market history
+
+Replaces the list of full market json dicts (history.pop(0) / append) with one
+preallocated NumPy column per field. Push and lagged lookup are O(1), the running
+max/min of tracked fields (e.g. no_bid for the pre-spike level) are kept with
+monotonic queues, and nothing is allocated per push.
+
+Every snapshot also keeps the time.monotonic() of its push, so the reference of the
+deltas can be looked up by age (at_age: nearest snapshot or linear interpolation)
+instead of by push count, unaffected by slow responses, resets or wall clock changes.
+"""
+
+import time
+
+import numpy as np
+
+# Stored fields, everything else in the market json is dropped
+FIELDS = ("yes_bid", "yes_ask", "no_bid", "no_ask", "volume", "yes_spread", "yes_bid_dollars", "ts")
+
+FLOAT_FIELDS = ("yes_bid_dollars", "ts")
+
+# Monotonic time of each push, kept beside the fields (not saved in snapshots, it means nothing to another process)
+CLOCK = "clock"
+
+class _Extreme:
+    # Running max of the last `capacity` values (min by storing negated values)
+    # Monotonic queue in preallocated ring arrays, amortized O(1) per push
+
+    def __init__(self, capacity, sign, dtype):
+        self.capacity = capacity
+        self.sign = sign
+        self.seqs = np.zeros(capacity, dtype=np.int64)
+        self.values = np.zeros(capacity, dtype=dtype)
+        self.front = 0
+        self.size = 0
+
+    def clear(self):
+        self.front = 0
+        self.size = 0
+
+    def push(self, seq, value):
+        value = self.sign * value
+        capacity = self.capacity
+
+        # drop smaller values from the back, they can never be the max again
+        while self.size and self.values[(self.front + self.size - 1) % capacity] <= value:
+            self.size -= 1
+
+        # drop values that left the window from the front
+        while self.size and self.seqs[self.front] <= seq - capacity:
+            self.front = (self.front + 1) % capacity
+            self.size -= 1
+
+        back = (self.front + self.size) % capacity
+        self.seqs[back] = seq
+        self.values[back] = value
+        self.size += 1
+
+    def get(self):
+        return self.sign * self.values[self.front].item()
+
+class _Lagged:
+    # Mapping view of the snapshot `lag` pushes ago, so history.oldest can be passed
+    # to market.add_deltas() like the old history[0] dict
+
+    def __init__(self, history, lag):
+        self._history = history
+        self._lag = lag
+
+    def __getitem__(self, field):
+        return self._history.get(field, self._history.lag_of(self._lag))
+
+    def __bool__(self):
+        return len(self._history) > 0
+
+class _Interpolated:
+    # Mapping view of a snapshot between two pushes: weight 0 is the older one, 1 the newer one
+    # Integer fields are rounded, like a snapshot that was actually polled
+
+    def __init__(self, history, older, newer, weight):
+        self._history = history
+        self._older = older
+        self._newer = newer
+        self._weight = weight
+
+    def __getitem__(self, field):
+        old = self._history.get(field, self._older)
+        value = old + self._weight * (self._history.get(field, self._newer) - old)
+        return value if field in FLOAT_FIELDS else int(round(value))
+
+    def __bool__(self):
+        return len(self._history) > 0
+
+class MarketHistory:
+    """
+    Last `capacity` market snapshots, newest at lag 0.
+
+    :param capacity: number of snapshots kept (10 = "10 seconds ago" at 1 Hz)
+    :param extremes: fields with an O(1) running max/min
+    """
+
+    def __init__(self, capacity=10, extremes=("no_bid", "yes_bid")):
+        self.capacity = capacity
+        self.columns = {
+            field: np.zeros(capacity, dtype=np.float64 if field in FLOAT_FIELDS + (CLOCK,) else np.int64)
+            for field in FIELDS + (CLOCK,)
+        }
+        self._head = 0  # next slot to write
+        self._count = 0
+        self._seq = 0  # total pushes
+        self._max = {field: _Extreme(capacity, 1, self.columns[field].dtype) for field in extremes}
+        self._min = {field: _Extreme(capacity, -1, self.columns[field].dtype) for field in extremes}
+
+        # view of the oldest snapshot, the reference for 10 second deltas
+        self.oldest = _Lagged(self, None)
+
+    def __len__(self):
+        return self._count
+
+    def full(self):
+        return self._count == self.capacity
+
+    def clear(self):
+        self._head = 0
+        self._count = 0
+        for extreme in (*self._max.values(), *self._min.values()):
+            extreme.clear()
+
+    # Adds a market json (or snapshot dict) received at wall time ts (default: now), overwriting the oldest once full
+    # clock is its time.monotonic(), derived from ts when only ts is given (e.g. snapshots restored from the cache)
+    def push(self, market, ts=None, clock=None):
+        slot = self._head
+        columns = self.columns
+        if clock is None:
+            clock = time.monotonic() if ts is None else time.monotonic() - (time.time() - ts)
+        columns[CLOCK][slot] = clock
+        for field in FIELDS:
+            if field == "ts":
+                columns["ts"][slot] = time.time() if ts is None else ts
+            elif field == "yes_bid_dollars":
+                columns[field][slot] = float(market.get(field, market["yes_bid"] / 100))
+            elif field == "yes_spread":
+                columns[field][slot] = market.get(field, market["yes_ask"] - market["yes_bid"])
+            else:
+                columns[field][slot] = market.get(field, 0)
+
+        for field, extreme in self._max.items():
+            extreme.push(self._seq, columns[field][slot])
+        for field, extreme in self._min.items():
+            extreme.push(self._seq, columns[field][slot])
+
+        self._seq += 1
+        self._head = (slot + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    # Lag of the oldest snapshot when lag is None
+    def lag_of(self, lag):
+        return self._count - 1 if lag is None else lag
+
+    # Value of field `lag` pushes ago (0 = newest)
+    def get(self, field, lag=0):
+        if not 0 <= lag < self._count:
+            raise IndexError(f"lag {lag} outside history of {self._count}")
+        return self.columns[field][(self._head - 1 - lag) % self.capacity].item()
+
+    # Snapshot dict of the market `lag` pushes ago
+    def snapshot(self, lag=0):
+        return {field: self.get(field, lag) for field in FIELDS}
+
+    # Max of field over the history
+    def max(self, field):
+        if self._count == 0:
+            raise ValueError("empty history")
+        if field in self._max:
+            return self._max[field].get()
+        return self._window(field).max().item()
+
+    # Min of field over the history
+    def min(self, field):
+        if self._count == 0:
+            raise ValueError("empty history")
+        if field in self._min:
+            return self._min[field].get()
+        return self._window(field).min().item()
+
+    # Monotonic times of the snapshots, newest first
+    def _times(self):
+        return self.columns[CLOCK][(self._head - 1 - np.arange(self._count)) % self.capacity]
+
+    # View of the market `seconds` before now (time.monotonic()), the reference of the deltas
+    # Nearest snapshot to that time, or with interpolate the line between the snapshots around it
+    # (the oldest/newest snapshot when the time is outside the history)
+    def at_age(self, seconds, now=None, interpolate=False):
+        if self._count == 0:
+            return _Lagged(self, None)
+        target = (time.monotonic() if now is None else now) - seconds
+        times = self._times()
+
+        if not interpolate:
+            return _Lagged(self, np.abs(times - target).argmin().item())
+
+        old_enough = np.flatnonzero(times <= target)
+        if not len(old_enough):
+            return _Lagged(self, None)
+        older = old_enough[0].item()
+        if older == 0:
+            return _Lagged(self, 0)
+        t_old, t_new = times[older].item(), times[older - 1].item()
+        weight = (target - t_old) / (t_new - t_old) if t_new > t_old else 0.0
+        return _Interpolated(self, older, older - 1, weight)
+
+    # Max of field over the snapshots of the last `seconds` (time.monotonic() now)
+    def recent_max(self, field, seconds, now=None):
+        if self._count == 0:
+            raise ValueError("empty history")
+        now = time.monotonic() if now is None else now
+        recent = self._window(CLOCK) >= now - seconds
+        if not recent.any():
+            return self.get(field)
+        return self._window(field)[recent].max().item()
+
+    def _window(self, field):
+        # slots fill from 0 after a clear, so a partial history is the first _count slots
+        return self.columns[field][:self._count]
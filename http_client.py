@@ -0,0 +1,424 @@
+"""
+Shared HTTP client for every Kalshi call
+
+One keep-alive session per HttpClient and one RateLimiter shared by all of them, with a
+token bucket per Kalshi rate-limit tier (reads and writes are limited separately).
+Inside a tier, waiting requests are served by priority: orders, then account calls,
+then market data. configure(params) sets the tier of a run (params["api_tier"]).
+
+- Timeouts: every request gets one, capped by an optional deadline (time.monotonic()),
+  so a slow response can never stall the loop past it.
+- Retries: GETs only (they are idempotent), on connection errors, timeouts, 429 and 5xx,
+  with jittered exponential backoff that honours Retry-After and the deadline.
+  Orders are never retried. A GET that still fails after its last retry raises HttpError
+  (a requests.RequestException, like the timeouts), so pollers can skip the tick.
+- Counters (throttled, retries, 429s, 5xx, timeouts) go to metrics.py.
+
+Check the retry, timeout and priority behaviour against a local stub server:
+    python http_client.py check
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+from params import DEFAULT_PARAMS
+
+# Requests per second (read, write) of each Kalshi API tier
+TIERS = {
+    "basic": (20, 10),
+    "advanced": (30, 30),
+    "premier": (100, 100),
+    "prime": (400, 400),
+}
+
+# Priorities inside a tier, lower is served first
+ORDER = 0
+ACCOUNT = 1
+DATA = 2
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+class DeadlineExceeded(requests.Timeout):
+    """
+    The request (or its wait for the rate limiter) would end after its deadline.
+    """
+
+class HttpError(requests.HTTPError):
+    """
+    A GET answered with a non-2xx status after its last retry (the response is attached).
+    """
+
+class TokenBucket:
+    """
+    Thread-safe token bucket; waiters of a lower priority value go first.
+
+    :param rate: tokens per second
+    :param burst: bucket size (default: rate)
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or rate
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self._waiting = [0, 0, 0]  # waiters per priority
+        self._cond = threading.Condition()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # Takes one token, waiting if needed; returns seconds waited (0 if a token was free)
+    # Raises DeadlineExceeded if no token can be had before deadline
+    def acquire(self, priority=DATA, deadline=None):
+        start = time.monotonic()
+        waited = False
+        with self._cond:
+            self._waiting[priority] += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    ahead = any(self._waiting[:priority])
+                    if self.tokens >= 1 and not ahead:
+                        self.tokens -= 1
+                        return now - start if waited else 0.0
+
+                    # next token (or a re-check once the waiters ahead were served)
+                    wait = (1 - self.tokens) / self.rate if self.tokens < 1 else 1 / self.rate
+                    if deadline is not None and now + wait > deadline:
+                        raise DeadlineExceeded("rate limit wait would pass the deadline")
+                    self._cond.wait(wait)
+                    waited = True
+            finally:
+                self._waiting[priority] -= 1
+                self._cond.notify_all()
+
+class RateLimiter:
+    """
+    One TokenBucket per tier: GETs are reads, everything else is a write.
+
+    :param tier: key of TIERS
+    """
+
+    def __init__(self, tier="basic"):
+        self.tier = None
+        self.set_tier(tier)
+
+    # Switches to the buckets of another tier (clients holding this limiter follow)
+    def set_tier(self, tier):
+        if tier == self.tier:
+            return
+        read, write = TIERS[tier]
+        self.read = TokenBucket(read)
+        self.write = TokenBucket(write)
+        self.tier = tier
+
+    def acquire(self, method, priority=DATA, deadline=None):
+        bucket = self.read if method == "GET" else self.write
+        return bucket.acquire(priority, deadline)
+
+# Shared by every HttpClient unless one is given, at the params.py tier until configure() sets the run's
+limiter = RateLimiter(DEFAULT_PARAMS["api_tier"])
+
+# Applies a run's params (api_tier) to the shared limiter, call before its first request
+def configure(params):
+    limiter.set_tier(params["api_tier"])
+
+class HttpClient:
+    """
+    Rate-limited, retrying requests session.
+
+    :param limiter: RateLimiter shared with other clients (None: no limit)
+    :param pool_size: keep-alive connections
+    :param timeout: seconds per attempt when no deadline is closer
+    :param max_retries: extra attempts of a GET
+    :param backoff: first retry delay in seconds, doubled each retry (full jitter), capped at max_backoff
+    """
+
+    def __init__(self, limiter=limiter, pool_size=10, timeout=5.0, max_retries=3, backoff=0.1, max_backoff=2.0):
+        self.limiter = limiter
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self.session = requests.Session()
+        self.set_pool_size(pool_size)
+
+    # Resizes the connection pool, e.g. to the number of tickers polled concurrently
+    def set_pool_size(self, size):
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, size))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get(self, url, params=None, signed=False, priority=DATA, deadline=None, timeout=None, retries=None):
+        return self.request("GET", url, params=params, signed=signed, priority=priority, deadline=deadline,
+                            timeout=timeout, retries=retries)
+
+    def post(self, url, data=None, signed=True, priority=ORDER, deadline=None, timeout=None):
+        return self.request("POST", url, data=data, signed=signed, priority=priority, deadline=deadline,
+                            timeout=timeout)
+
+    def request(self, method, url, params=None, data=None, signed=False, priority=DATA, deadline=None, timeout=None,
+                retries=None):
+        """
+        Sends one request through the limiter, retrying GETs.
+
+        :param signed: add Kalshi auth headers (signed per attempt, the timestamp must be fresh)
+        :param deadline: time.monotonic() by which the response must have arrived
+        :param timeout: seconds per attempt (default: self.timeout), shortened to meet the deadline
+        :param retries: extra attempts of a GET (default: self.max_retries), other methods are never retried
+        :return: the last response (a non-2xx POST is returned, not raised)
+        :raises HttpError: a GET still answered with a non-2xx status after its last retry
+        """
+        import api_info as api
+
+        timeout = self.timeout if timeout is None else timeout
+        if method != "GET":
+            retries = 0
+        elif retries is None:
+            retries = self.max_retries
+        _, host, path, _, _ = urlsplit(url)
+
+        attempt = 0
+        while True:
+            if self.limiter is not None:
+                try:
+                    waited = self.limiter.acquire(method, priority, deadline)
+                except DeadlineExceeded:
+                    metrics.count("throttled", host)
+                    raise
+                if waited > 0:
+                    metrics.count("rate_limit_waits", host)
+
+            attempt_timeout = timeout
+            if deadline is not None:
+                attempt_timeout = min(timeout, deadline - time.monotonic())
+                if attempt_timeout <= 0:
+                    metrics.count("deadline_exceeded", host)
+                    raise DeadlineExceeded(f"{method} {path} past its deadline")
+
+            headers = {"Content-Type": "application/json"} if data is not None else {}
+            if signed:
+                headers.update(api.auth_headers(method, path))
+
+            retry_after = None
+            try:
+                response = self.session.request(method, url, params=params, data=data, headers=headers,
+                                                timeout=attempt_timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                metrics.count("timeouts" if isinstance(e, requests.Timeout) else "connection_errors", host)
+                if attempt >= retries:
+                    raise
+            else:
+                if response.status_code == 429:
+                    metrics.count("http_429", host)
+                    retry_after = _retry_after(response)
+                elif response.status_code >= 500:
+                    metrics.count("http_5xx", host)
+                if response.status_code not in RETRY_STATUSES or attempt >= retries:
+                    if method == "GET" and not response.ok:
+                        raise HttpError(f"{method} {path} answered {response.status_code}", response=response)
+                    return response
+
+            # full jitter backoff, at least Retry-After, never past the deadline
+            delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                metrics.count("deadline_exceeded", host)
+                raise DeadlineExceeded(f"{method} {path} retry would pass its deadline")
+
+            metrics.count("retries", host)
+            time.sleep(delay)
+            attempt += 1
+
+    def close(self):
+        self.session.close()
+
+# Seconds from a Retry-After header (numeric form only), None if missing
+def _retry_after(response):
+    try:
+        return float(response.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return None
+
+# Client used by market.py and api_info.py
+shared = HttpClient()
+
+class _FlakyServer:
+    """
+    Local stub for check(): GET /flaky fails with `failures` statuses (503, or 429 with
+    Retry-After) before answering, GET /slow sleeps, POST /orders counts orders.
+    """
+
+    def __init__(self):
+        self.failures = []
+        self.hits = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def serve(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            wbufsize = 1 << 16
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, body, headers=()):
+                body = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _count(self):
+                path = self.path.split("?", 1)[0]
+                with stub._lock:
+                    stub.hits[path] = stub.hits.get(path, 0) + 1
+                    return path, stub.failures.pop(0) if stub.failures else None
+
+            def do_GET(self):
+                path, failure = self._count()
+                if path == "/slow":
+                    time.sleep(1.0)
+                if failure == 429:
+                    self._reply(429, {"error": "too many requests"}, [("Retry-After", "0.2")])
+                elif failure is not None:
+                    self._reply(failure, {"error": "unavailable"})
+                else:
+                    self._reply(200, {"ok": True})
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                path, failure = self._count()
+                self._reply(failure or 201, {"order": {"status": "executed"}})
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+# Runs the client against _FlakyServer; raises AssertionError if a behaviour is off
+def check():
+    stub = _FlakyServer()
+    url = stub.serve()
+    metrics.registry.reset()
+    client = HttpClient(limiter=RateLimiter("basic"), backoff=0.05)
+
+    try:
+        # reads are retried through 5xx and 429 (waiting at least Retry-After)
+        stub.failures = [503, 503]
+        assert client.get(url + "/flaky").status_code == 200
+        stub.failures = [429]
+        start = time.monotonic()
+        assert client.get(url + "/flaky").status_code == 200
+        assert time.monotonic() - start >= 0.2
+        print("OK: GET retried through 503, 503 and through 429 after Retry-After")
+
+        # a read still failing after its last retry raises, it never hands a 5xx body to the caller
+        stub.failures = [503] * (client.max_retries + 1)
+        try:
+            client.get(url + "/flaky")
+            raise AssertionError("GET returned a 503 after its last retry")
+        except HttpError as e:
+            assert e.response.status_code == 503
+        print("OK: GET raises HttpError once its retries are spent")
+
+        # orders are never retried
+        stub.failures = [503]
+        before = stub.hits.get("/orders", 0)
+        assert client.post(url + "/orders", data="{}", signed=False).status_code == 503
+        assert stub.hits["/orders"] == before + 1
+        print("OK: POST not retried")
+
+        # the deadline caps the timeout of a slow response
+        start = time.monotonic()
+        try:
+            client.get(url + "/slow", deadline=time.monotonic() + 0.3)
+            raise AssertionError("slow GET returned before its deadline")
+        except requests.Timeout:
+            pass
+        elapsed = time.monotonic() - start
+        assert elapsed < 0.6, elapsed
+        print(f"OK: slow GET gave up at its deadline ({elapsed * 1000:.0f} ms)")
+
+        # a drained read bucket serves the waiting order-priority read first
+        bucket = TokenBucket(10)
+        bucket.tokens = 0
+        served = []
+
+        def take(name, priority):
+            bucket.acquire(priority)
+            served.append(name)
+
+        threads = [threading.Thread(target=take, args=(f"data{i}", DATA)) for i in range(3)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.02)
+        order = threading.Thread(target=take, args=("order", ORDER))
+        order.start()
+        for thread in threads + [order]:
+            thread.join()
+        assert served[0] == "order", served
+        print(f"OK: priority order {served}")
+
+        # a free token is not counted as a wait
+        bucket = TokenBucket(10)
+        assert bucket.acquire() == 0.0
+        print("OK: no wait counted while tokens are free")
+
+        # a request that cannot get a token before its deadline is throttled
+        bucket.tokens = 0
+        try:
+            bucket.acquire(DATA, deadline=time.monotonic() + 0.01)
+            raise AssertionError("acquired a token past the deadline")
+        except DeadlineExceeded:
+            pass
+        print("OK: limiter wait past the deadline raises DeadlineExceeded")
+
+        # the read tier is enforced once the burst is spent
+        client.max_retries = 0
+        read_rate = TIERS["basic"][0]
+        n = 2 * read_rate
+        start = time.monotonic()
+        for _ in range(n):
+            client.get(url + "/fast")
+        elapsed = time.monotonic() - start
+        assert elapsed >= 0.9 * (n - read_rate) / read_rate, elapsed
+        print(f"OK: {n} GETs took {elapsed:.2f} s (read tier {read_rate}/s, burst {read_rate})")
+    finally:
+        client.close()
+        stub.stop()
+
+    print(metrics.summary_line())
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared rate-limited HTTP client")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("check", help="run the client against a local flaky stub server")
+    parser.parse_args()
+
+    check()
+
+if __name__ == "__main__":
+    main()
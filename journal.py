@@ -0,0 +1,266 @@
+"""
+Structured event journal
+
+Every decision of the detector, runner, backtester and order client is one typed
+record (see EVENTS) appended as a JSON line to <directory>/<name>-<YYYYMMDD>-<HHMMSS>.<index>.jsonl.
+A background thread batches the writes, rotates files at max_bytes and prints the
+human-readable message of a record (if any), so neither disk nor terminal output
+runs on the trading loop.
+
+Load a day of journals for analysis:
+    jumps = read_journal("journal", "jump", day="20260115")
+    jumps["mu"]  # numpy array
+
+    python journal.py summary journal --day 20260115
+"""
+
+import argparse
+import atexit
+import glob
+import json
+import os
+import queue
+import threading
+import time
+from collections import Counter
+
+# Fields of each record type; every record also has "t" (unix seconds) and "event"
+EVENTS = {
+    "tick": ("ticker", "yes_bid", "yes_ask", "no_bid", "no_ask", "volume", "delta_price", "delta_vol", "delta_spread", "mu"),
+    "jump": ("ticker", "ts", "delta_price", "delta_vol", "delta_spread", "alpha", "beta", "mu"),
+    "signal": ("ticker", "ts", "mu", "pre_spike_no", "no_bid", "no_ask", "rejections"),
+    "order": ("ticker", "action", "side", "price", "status", "status_code", "latency_ms", "error"),
+    "exit": ("ticker", "reason", "entry", "exit", "net"),
+    "info": ("ticker", "message"),
+}
+
+_CLOSE = object()
+
+def _to_json(value):
+    # numpy scalars and arrays from the backtester (tolist() of a numpy scalar is a Python scalar)
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+class Journal:
+    """
+    :param directory: journal root
+    :param name: file prefix, e.g. detector or backtest
+    :param max_bytes: rotate to a new file once the current one reaches this size
+    :param batch: records written per write call (at most)
+    :param flush_interval: seconds before a partial batch is written
+    :param echo: print record messages to stdout
+    """
+
+    def __init__(self, directory="journal", name="detector", max_bytes=64 << 20, batch=256, flush_interval=1.0, echo=True):
+        self.directory = directory
+        self.name = name
+        self.max_bytes = max_bytes
+        self.batch = batch
+        self.flush_interval = flush_interval
+        self.echo = echo
+
+        self._queue = queue.Queue()
+        self._file = None
+        self._size = 0
+        self._index = 0
+        self._stamp = time.strftime("%Y%m%d-%H%M%S")
+        self._closed = False
+
+        os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    # Queues one record; message is printed by the writer thread when echo is on
+    def record(self, event, message=None, **fields):
+        if event not in EVENTS:
+            raise ValueError(f"unknown journal event {event!r}")
+
+        fields["t"] = time.time()
+        fields["event"] = event
+        if event == "info":
+            fields["message"] = message
+        self._queue.put((fields, message))
+
+    # Prints a message without a record (prompts, banners), in order with the journal messages
+    def say(self, message):
+        self._queue.put((None, message))
+
+    # Blocks until everything queued so far is written
+    def flush(self):
+        self._queue.join()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put((_CLOSE, None))
+        self._thread.join()
+
+    def _open(self):
+        path = os.path.join(self.directory, f"{self.name}-{self._stamp}.{self._index:03d}.jsonl")
+        self._file = open(path, "a", encoding="utf-8")
+        self._size = self._file.tell()
+
+    def _write(self, lines):
+        if not lines:
+            return
+        if self._file is None:
+            self._open()
+
+        data = "".join(lines)
+        self._file.write(data)
+        self._file.flush()
+        self._size += len(data)
+
+        if self._size >= self.max_bytes:
+            self._file.close()
+            self._index += 1
+            self._open()
+
+    def _run(self):
+        lines = []
+        deadline = time.monotonic() + self.flush_interval
+        done = 0  # items taken from the queue but not written yet
+
+        while True:
+            try:
+                fields, message = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                fields, message = None, None
+                timed_out = True
+            else:
+                timed_out = False
+                done += 1
+
+            if fields is _CLOSE:
+                self._write(lines)
+                if self._file is not None:
+                    self._file.close()
+                for _ in range(done):
+                    self._queue.task_done()
+                return
+
+            if fields is not None:
+                lines.append(json.dumps(fields, default=_to_json) + "\n")
+            if message is not None and self.echo:
+                print(message)
+
+            # write when the batch is full, the interval passed or nothing else is waiting
+            if timed_out or len(lines) >= self.batch or self._queue.empty():
+                self._write(lines)
+                lines = []
+                deadline = time.monotonic() + self.flush_interval
+                for _ in range(done):
+                    self._queue.task_done()
+                done = 0
+
+_journal = None
+
+# Opens the process-wide journal (closing the previous one)
+def open_journal(directory="journal", name="detector", **kwargs):
+    global _journal
+    if _journal is not None:
+        _journal.close()
+    _journal = Journal(directory, name, **kwargs)
+    return _journal
+
+# The process-wide journal, opened with defaults on first use
+def get_journal():
+    if _journal is None:
+        open_journal()
+    return _journal
+
+# Records to the process-wide journal
+def record(event, message=None, **fields):
+    get_journal().record(event, message, **fields)
+
+def say(message):
+    get_journal().say(message)
+
+def flush():
+    if _journal is not None:
+        _journal.flush()
+
+@atexit.register
+def _close():
+    if _journal is not None:
+        _journal.close()
+
+# Journal files in directory (optionally of one name and one YYYYMMDD day), in write order
+def journal_paths(directory, name=None, day=None):
+    pattern = f"{name or '*'}-{day or '*'}-*.jsonl"
+    return sorted(glob.glob(os.path.join(directory, pattern)))
+
+def _column(values):
+    import numpy as np
+
+    if all(isinstance(value, (int, float)) and not isinstance(value, bool) or value is None for value in values):
+        if any(value is None or isinstance(value, float) for value in values):
+            return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+        return np.array(values, dtype=np.int64)
+    if all(isinstance(value, bool) for value in values):
+        return np.array(values, dtype=bool)
+    if all(isinstance(value, str) or value is None for value in values):
+        return np.array(["" if value is None else value for value in values], dtype=str)
+    return np.array(values, dtype=object)
+
+def read_journal(directory, event, name=None, day=None):
+    """
+    Loads every record of one type into NumPy columns.
+
+    :param directory: journal root
+    :param event: record type, see EVENTS
+    :param name: only files with this prefix (e.g. detector)
+    :param day: only files started on this day, YYYYMMDD
+    :return: dict of field -> array ("t" plus the fields of the event), missing numbers are nan
+    """
+    if event not in EVENTS:
+        raise ValueError(f"unknown journal event {event!r}")
+
+    # cheap substring test before parsing so other record types are skipped quickly
+    marker = f'"event": "{event}"'
+    rows = []
+    for path in journal_paths(directory, name, day):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if marker in line:
+                    try:
+                        rows.append(json.loads(line))
+                    except ValueError:
+                        pass  # partly written last line
+
+    columns = ("t",) + EVENTS[event]
+    return {column: _column([row.get(column) for row in rows]) for column in columns}
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize structured journals")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    summary = commands.add_parser("summary", help="count records per type")
+    summary.add_argument("directory", nargs="?", default="journal")
+    summary.add_argument("--name")
+    summary.add_argument("--day", help="YYYYMMDD")
+
+    args = parser.parse_args()
+
+    counts = Counter()
+    for path in journal_paths(args.directory, args.name, args.day):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    counts[json.loads(line)["event"]] += 1
+                except (ValueError, KeyError):
+                    pass
+
+    for event in EVENTS:
+        print(f"{event}: {counts[event]}")
+
+    exits = read_journal(args.directory, "exit", args.name, args.day)
+    if len(exits["t"]):
+        import numpy as np
+
+        print(f"net: {np.nansum(exits['net'])} cents over {len(exits['t'])} exits")
+
+if __name__ == "__main__":
+    main()
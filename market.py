@@ -1,21 +1,31 @@
-import requests
+import time
 
-def fetch_market(ticker, prev_market=None):
+import http_client
+import metrics
+
+BASE_URL = "https://api.elections.kalshi.com/trade-api/v2"
+
+# Max tickers per /markets list request (keeps the query string short)
+TICKERS_PER_REQUEST = 100
+
+# Rate-limited client shared by every fetch (see http_client.py), its keep-alive session
+# lets repeated polls reuse connections
+client = http_client.shared
+session = client.session
+
+# Resizes the connection pool, e.g. to the number of tickers polled concurrently
+def set_pool_size(size):
+    client.set_pool_size(size)
+
+def add_deltas(market, prev_market=None):
     """
-    Returns the market data for a ticker.
     Computes the spread.
     Computes the change in volume, spread, and change in price if given a previous market.
 
-    :param ticker:
+    :param market: raw market json, updated in place
     :param prev_market:
     :return: market
     """
-    url = f"https://api.elections.kalshi.com/trade-api/v2/markets/{ticker}"
-
-    market_response = requests.get(url)
-    market_data = market_response.json()
-    market = market_data['market']
-
     market['yes_spread'] = market['yes_ask'] - market['yes_bid']  # spread
 
     # Calculate additional parameters if there is a previous market
@@ -31,4 +41,151 @@ def fetch_market(ticker, prev_market=None):
 
     return market
 
+def fetch_market(ticker, prev_market=None, deadline=None):
+    """
+    Returns the market data for a ticker.
+    Computes the spread.
+    Computes the change in volume, spread, and change in price if given a previous market.
+
+    :param ticker:
+    :param prev_market:
+    :param deadline: time.monotonic() by which the response must arrive (retries included)
+    :return: market
+    """
+    url = f"{BASE_URL}/markets/{ticker}"
+
+    with metrics.timer("fetch", ticker):
+        market_response = client.get(url, deadline=deadline)
+    with metrics.timer("parse", ticker):
+        market_data = market_response.json()
+    market = market_data['market']
+
+    return add_deltas(market, prev_market)
+
+def fetch_orderbook(ticker, depth=None, deadline=None):
+    """
+    Returns the order book snapshot of a ticker (see orderbook.py).
+
+    :param ticker:
+    :param depth: price levels per side, None for all
+    :param deadline: time.monotonic() by which the response must arrive
+    :return: {"yes": [[price, count], ...], "no": [[price, count], ...]} (bids of each side)
+    """
+    params = {"depth": depth} if depth else None
+
+    with metrics.timer("fetch", ticker):
+        response = client.get(f"{BASE_URL}/markets/{ticker}/orderbook", params=params, deadline=deadline)
+    return response.json().get('orderbook') or {}
+
+def fetch_markets(tickers, prev_by_ticker=None, deadline=None):
+    """
+    Returns the market data for many tickers using the /markets list endpoint.
+    Makes one request per TICKERS_PER_REQUEST tickers (plus any extra pages).
+    Computes the spread and deltas for every ticker, like fetch_market.
+
+    :param tickers:
+    :param prev_by_ticker: dict of ticker -> previous market
+    :param deadline: time.monotonic() by which every page must arrive
+    :return: dict of ticker -> market (tickers the exchange did not return are missing)
+    """
+    prev_by_ticker = prev_by_ticker or {}
+    tickers = list(tickers)
+    url = f"{BASE_URL}/markets"
+
+    markets = {}
+    for i in range(0, len(tickers), TICKERS_PER_REQUEST):
+        chunk = tickers[i:i + TICKERS_PER_REQUEST]
+        params = {"tickers": ",".join(chunk), "limit": 1000}
+
+        # follow the cursor until every page is read
+        while True:
+            with metrics.timer("fetch"):
+                market_response = client.get(url, params=params, deadline=deadline)
+            with metrics.timer("parse"):
+                market_data = market_response.json()
+
+            for market in market_data.get('markets', []):
+                markets[market['ticker']] = add_deltas(market, prev_by_ticker.get(market['ticker']))
+
+            cursor = market_data.get('cursor')
+            if not cursor:
+                break
+            params["cursor"] = cursor
+
+    return markets
+
+# Find the last n markets and store it in history [~1 second intervals, each stamped with its own time]
+# Refills history in place if given, otherwise returns a new MarketHistory of capacity n
+def fetch_past_markets(ticker, n, history=None):
+    from history import MarketHistory
+
+    if history is None:
+        history = MarketHistory(n)
+    history.clear()
+
+    prev_market = fetch_market(ticker)
+    for i in range(n):
+        time.sleep(1)
+        curr_market = fetch_market(ticker, prev_market)
+        history.push(curr_market)
+        prev_market = curr_market
+
+    return history
+
+# Same as fetch_past_markets for many tickers, one bulk request per second
+# Returns a dict of ticker -> history of capacity n (or capacity if given)
+def fetch_past_markets_bulk(tickers, n, capacity=None):
+    from history import MarketHistory
+
+    history = {ticker: MarketHistory(capacity or n) for ticker in tickers}
+    prev_markets = fetch_markets(tickers)
+    for i in range(n):
+        time.sleep(1)
+        curr_markets = fetch_markets(tickers, prev_markets)
+        for ticker, curr_market in curr_markets.items():
+            history[ticker].push(curr_market)
+        prev_markets = curr_markets
+
+    return history
+
+def list_markets_page(series_ticker=None, status="open", cursor=None, limit=1000):
+    """
+    Returns one page of the /markets list endpoint.
+
+    :param series_ticker: e.g. KXCBAGAME, None for all series
+    :param status: market status filter, e.g. open
+    :param cursor: cursor returned by the previous page, None for the first page
+    :return: (markets, next cursor or None)
+    """
+    params = {"limit": limit}
+    if series_ticker:
+        params["series_ticker"] = series_ticker
+    if status:
+        params["status"] = status
+    if cursor:
+        params["cursor"] = cursor
+
+    market_data = client.get(f"{BASE_URL}/markets", params=params).json()
+    return market_data.get('markets', []), market_data.get('cursor') or None
+
+def list_markets(series_ticker=None, status="open", max_pages=None):
+    """
+    Returns every market of a series (or of the whole exchange) using cursor pagination.
+
+    :param series_ticker: e.g. KXCBAGAME, None for all series
+    :param status: market status filter, e.g. open
+    :param max_pages: stop after this many requests
+    :return: list of markets
+    """
+    markets = []
+    cursor = None
+    pages = 0
+    while max_pages is None or pages < max_pages:
+        page, cursor = list_markets_page(series_ticker, status, cursor)
+        markets.extend(page)
+        pages += 1
+
+        if not cursor:
+            break
 
+    return markets
@@ -0,0 +1,196 @@
+"""
+Per-stage latency metrics for the live loop
+
+Each stage (fetch, parse, evidence, sign, order, sleep, tick) gets a streaming
+histogram per ticker: fixed log-spaced buckets, so recording is one bisect and
+one increment (about a microsecond) and p50/p95/p99 need no stored samples.
+Counters track loop overruns and missed ticks.
+
+    with metrics.timer("evidence", ticker):
+        ...
+    metrics.serve(9100)  # Prometheus text on http://127.0.0.1:9100/metrics
+    print(metrics.summary_line())
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Bucket upper bounds in seconds, 10 us to ~100 s, 4 buckets per doubling
+BOUNDS = [1e-5 * 2 ** (i / 4) for i in range(94)]
+
+# Bounds exported to Prometheus (one per doubling keeps the scrape small)
+EXPORTED = BOUNDS[::4]
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BOUNDS) + 1)  # last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BOUNDS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    # Quantile q, interpolated linearly inside its bucket and capped at the largest observation
+    def quantile(self, q):
+        if self.count == 0:
+            return 0.0
+
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                if i == len(BOUNDS):
+                    return self.max
+                lower = BOUNDS[i - 1] if i else 0.0
+                return min(lower + (BOUNDS[i] - lower) * (rank - seen) / n, self.max)
+            seen += n
+        return self.max
+
+    # Observations <= bound (bound must be one of BOUNDS)
+    def cumulative(self, bound):
+        return sum(self.counts[:BOUNDS.index(bound) + 1])
+
+class Metrics:
+    """
+    Histograms keyed by (stage, ticker) and counters keyed by (name, ticker).
+
+    :param interval: expected tick length in seconds, used by tick()
+    """
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self.histograms = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def observe(self, stage, seconds, ticker=""):
+        key = (stage, ticker)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def count(self, name, ticker="", n=1):
+        key = (name, ticker)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    @contextmanager
+    def timer(self, stage, ticker=""):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, ticker)
+
+    # Records one loop iteration: a tick longer than 1.25 intervals is an overrun,
+    # and every whole interval beyond the first is a missed tick
+    # interval: expected length of this tick if it differs from self.interval (adaptive polling)
+    def tick(self, seconds, ticker="", interval=None):
+        interval = self.interval if interval is None else interval
+        self.observe("tick", seconds, ticker)
+        if seconds > 1.25 * interval:
+            self.count("overruns", ticker)
+            missed = int(round(seconds / interval)) - 1
+            if missed > 0:
+                self.count("missed_ticks", ticker, missed)
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    # One line per call, e.g. "fetch p50 41.20 p95 60.10 p99 88.00 max 120.30 ms | ... | overruns 2"
+    # Stages are merged across tickers
+    def summary_line(self):
+        with self._lock:
+            merged = {}
+            for (stage, _), histogram in self.histograms.items():
+                total = merged.setdefault(stage, Histogram())
+                total.counts = [a + b for a, b in zip(total.counts, histogram.counts)]
+                total.count += histogram.count
+                total.sum += histogram.sum
+                total.max = max(total.max, histogram.max)
+
+            counters = {}
+            for (name, _), value in self.counters.items():
+                counters[name] = counters.get(name, 0) + value
+
+        parts = []
+        for stage, h in sorted(merged.items()):
+            parts.append(f"{stage} p50 {h.quantile(0.5) * 1000:.2f} p95 {h.quantile(0.95) * 1000:.2f} "
+                         f"p99 {h.quantile(0.99) * 1000:.2f} max {h.max * 1000:.2f} ms")
+        parts.extend(f"{name} {value}" for name, value in sorted(counters.items()))
+
+        return " | ".join(parts)
+
+    # Prometheus text exposition format
+    def prometheus(self):
+        lines = ["# TYPE detector_stage_seconds histogram"]
+        with self._lock:
+            for (stage, ticker), h in sorted(self.histograms.items()):
+                labels = f'stage="{stage}",ticker="{ticker}"'
+                for bound in EXPORTED:
+                    lines.append(f'detector_stage_seconds_bucket{{{labels},le="{bound:.6g}"}} {h.cumulative(bound)}')
+                lines.append(f'detector_stage_seconds_bucket{{{labels},le="+Inf"}} {h.count}')
+                lines.append(f"detector_stage_seconds_sum{{{labels}}} {h.sum:.9f}")
+                lines.append(f"detector_stage_seconds_count{{{labels}}} {h.count}")
+
+            lines.append("# TYPE detector_stage_max_seconds gauge")
+            for (stage, ticker), h in sorted(self.histograms.items()):
+                lines.append(f'detector_stage_max_seconds{{stage="{stage}",ticker="{ticker}"}} {h.max:.9f}')
+
+            lines.append("# TYPE detector_events_total counter")
+            for (name, ticker), value in sorted(self.counters.items()):
+                lines.append(f'detector_events_total{{name="{name}",ticker="{ticker}"}} {value}')
+
+        return "\n".join(lines) + "\n"
+
+    # Serves prometheus() at http://host:port/metrics from a daemon thread
+    def serve(self, port, host="127.0.0.1"):
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self._server.server_port
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+# Process-wide registry used by market.py, api_info.py, bet.py, detector.py and runner.py
+registry = Metrics()
+
+observe = registry.observe
+count = registry.count
+timer = registry.timer
+tick = registry.tick
+summary_line = registry.summary_line
+serve = registry.serve
@@ -0,0 +1,337 @@
+"""
+Vectorized Bayesian fake spike model
+
+SpikeModel keeps the alpha/beta evidence, mu, thresholds and cooldown of many markets
+as NumPy arrays indexed by market, and updates every market for one tick in a single
+step. The jump, zero-volume and spread branches of update_evidence become masks;
+increments are applied in the same order as the scalar code, so the floats match it
+exactly. detector.py, runner.py and backtester.py all run on it. A one-market model
+(detector.py) updates through the scalar code on plain floats, NumPy per-call overhead
+would make it tens of times slower. tests/test_model.py checks both paths.
+
+Check against the scalar update_evidence (and time a tick of many markets):
+    python model.py check cba_game_sample.csv --markets 1000
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from params import DEFAULT_PARAMS
+
+THRESHOLD_NAMES = ("vol_low", "vol_high", "spread_thresh", "price_high")
+
+# One tick of the Bayesian fake spike model for one market, the scalar reference of SpikeModel.update
+# (and its one-market fast path)
+# Returns the new (alpha, beta) and whether the tick was a jump (mu only changes on jumps)
+def update_evidence(alpha, beta, market, thresholds, params=DEFAULT_PARAMS):
+    alpha_floor = params["alpha_floor"]
+    beta_floor = params["beta_floor"]
+    decay = params["jump_decay"] # old evidence loses weight each jump
+
+    # Very slow decay of evidence over time
+    alpha = max(alpha_floor, alpha * params["tick_decay"])
+    beta = max(beta_floor, beta * params["tick_decay"])
+
+    if market['delta_price'] < thresholds['price_high']:
+        return alpha, beta, False
+
+    # Deprioritize old evidence
+    alpha = max(alpha_floor, alpha * decay)
+    beta  = max(beta_floor, beta * decay)
+
+    # If the YES price moved up by at least "jump" threshold,
+    # classify whether the move looks like a fake spike (alpha) or a real repricing (beta)
+    if market["delta_vol"] == 0:
+        # only blame "fake spike" if liquidity actually pulls
+        if market["delta_spread"] >= thresholds["spread_thresh"]:
+            alpha += 1
+        # if spread tightens with no prints, treat it as tiny beta
+        elif market["delta_spread"] <= -thresholds["spread_thresh"]:
+            beta += 0.25
+        # otherwise no evidence
+
+    # Low volume on a jump suggests a hype spike -> alpha++
+    elif market['delta_vol'] <= thresholds['vol_low']:
+        alpha += 1
+    # High volume on a jump suggests broad participation -> beta++
+    elif market['delta_vol'] >= thresholds["vol_high"]:
+        beta += 1 + min(3, market["delta_vol"] / thresholds["vol_high"])
+
+    # Spread tightening during the jump suggests healthy liquidity -> beta++
+    if market['delta_spread'] <= -thresholds['spread_thresh'] and market['delta_vol'] >= thresholds["vol_high"]:
+        beta += 1
+    # Spread widening during the jump suggests makers pulled liquidity -> alpha++
+    elif market['delta_spread'] >= thresholds['spread_thresh']:
+        alpha += 1
+
+    # Order book depth (see orderbook.py), only when the market has a book
+    if "depth_consumed" in market:
+        # A sweep through ask depth suggests a real repricing -> beta++
+        if market["depth_consumed"] >= params["depth_sweep"]:
+            beta += 1
+        # Asks pulled rather than bought suggest a fake spike -> alpha++
+        elif market["depth_pulled"] > market["depth_consumed"]:
+            alpha += 1
+
+    return alpha, beta, True
+
+class SpikeModel:
+    """
+    :param n: number of markets
+    :param params: see params.py
+    """
+
+    def __init__(self, n, params=DEFAULT_PARAMS):
+        self.n = n
+        self.params = params
+        self.alpha_floor = float(params["alpha_floor"])
+        self.beta_floor = float(params["beta_floor"])
+
+        self.alpha = np.full(n, self.alpha_floor) # evidence that move is a fake spike
+        self.beta = np.full(n, self.beta_floor) # evidence that move is a real repricing
+        self.mu = self.alpha / (self.alpha + self.beta)
+
+        # thresholds per market, nan until calibrated (no market jumps before that)
+        self.thresholds = {name: np.full(n, np.nan) for name in THRESHOLD_NAMES}
+
+        # time (seconds or rows, as the caller counts) each market may trade again
+        self.cooldown_until = np.zeros(n)
+
+        # thresholds of a one-market model as floats, for the update fast path
+        self._one_thresholds = None
+
+    # Sets thresholds of the markets in index (dict of name -> scalar or array)
+    def set_thresholds(self, thresholds, index=slice(None)):
+        for name in THRESHOLD_NAMES:
+            self.thresholds[name][index] = thresholds[name]
+        if self.n == 1:
+            self._one_thresholds = {name: self.thresholds[name][0].item() for name in THRESHOLD_NAMES}
+
+    # Markets with thresholds
+    def calibrated(self):
+        return ~np.isnan(self.thresholds["price_high"])
+
+    # Very slow decay of evidence, applied ticks times to the markets in mask
+    # Decays one tick at a time so floats match the live loop, and stops once every market is at its floors
+    def decay(self, ticks=1, mask=None):
+        tick_decay = self.params["tick_decay"]
+        alpha = self.alpha if mask is None else self.alpha[mask]
+        beta = self.beta if mask is None else self.beta[mask]
+
+        if alpha.size == 1:
+            # one market (backtester): plain floats, same arithmetic without per-tick array overhead
+            a, b = float(alpha[0]), float(beta[0])
+            for _ in range(ticks):
+                if a <= self.alpha_floor and b <= self.beta_floor:
+                    break
+                a = max(self.alpha_floor, a * tick_decay)
+                b = max(self.beta_floor, b * tick_decay)
+            alpha, beta = np.array([a]), np.array([b])
+        else:
+            for _ in range(ticks):
+                if (alpha <= self.alpha_floor).all() and (beta <= self.beta_floor).all():
+                    break
+                alpha = np.maximum(self.alpha_floor, alpha * tick_decay)
+                beta = np.maximum(self.beta_floor, beta * tick_decay)
+
+        if mask is None:
+            self.alpha, self.beta = alpha, beta
+        else:
+            self.alpha[mask] = alpha
+            self.beta[mask] = beta
+
+    # Jump evidence for the markets in mask (their YES price jumped by at least price_high)
+    # depth_pulled/depth_consumed: order book features (see orderbook.py), nan for markets without a book
+    def observe_jump(self, delta_price, delta_vol, delta_spread, mask, depth_pulled=None, depth_consumed=None):
+        decay = self.params["jump_decay"] # old evidence loses weight each jump
+        dv = np.asarray(delta_vol, dtype=np.float64)[mask]
+        ds = np.asarray(delta_spread, dtype=np.float64)[mask]
+        vol_low = self.thresholds["vol_low"][mask]
+        vol_high = self.thresholds["vol_high"][mask]
+        spread_thresh = self.thresholds["spread_thresh"][mask]
+
+        # Deprioritize old evidence
+        alpha = np.maximum(self.alpha_floor, self.alpha[mask] * decay)
+        beta = np.maximum(self.beta_floor, self.beta[mask] * decay)
+
+        zero_vol = dv == 0
+        widening = ds >= spread_thresh
+        tightening = ds <= -spread_thresh
+        low_vol = ~zero_vol & (dv <= vol_low)
+        high_vol = ~zero_vol & ~low_vol & (dv >= vol_high)
+
+        # zero volume: only blame "fake spike" if liquidity actually pulls, tiny beta if the spread tightens
+        # low volume on a jump suggests a hype spike, high volume suggests broad participation
+        alpha = alpha + np.where((zero_vol & widening) | low_vol, 1.0, 0.0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            high_vol_evidence = 1 + np.minimum(3, dv / vol_high)
+        beta = beta + np.where(zero_vol & ~widening & tightening, 0.25, np.where(high_vol, high_vol_evidence, 0.0))
+
+        # Spread tightening with high volume suggests healthy liquidity -> beta++
+        # Spread widening suggests makers pulled liquidity -> alpha++
+        healthy = tightening & (dv >= vol_high)
+        beta = beta + np.where(healthy, 1.0, 0.0)
+        alpha = alpha + np.where(~healthy & widening, 1.0, 0.0)
+
+        # A sweep through ask depth suggests a real repricing -> beta++
+        # Asks pulled rather than bought suggest a fake spike -> alpha++
+        if depth_consumed is not None:
+            consumed = np.asarray(depth_consumed, dtype=np.float64)[mask]
+            pulled = np.asarray(depth_pulled, dtype=np.float64)[mask]
+            sweep = consumed >= self.params["depth_sweep"]
+            beta = beta + np.where(sweep, 1.0, 0.0)
+            alpha = alpha + np.where(~sweep & (pulled > consumed), 1.0, 0.0)
+
+        self.alpha[mask] = alpha
+        self.beta[mask] = beta
+        self.mu[mask] = alpha / (alpha + beta)
+
+    # One tick for every market: decay, then jump evidence where delta_price >= price_high
+    # active: markets that take evidence this tick (default: calibrated ones)
+    # ticks: seconds of decay, per market with adaptive polling (markets with 0 take no evidence)
+    # depth_pulled/depth_consumed: optional order book features, see observe_jump
+    # Returns the mask of markets that jumped (mu only changes on jumps)
+    def update(self, delta_price, delta_vol, delta_spread, active=None, ticks=1, depth_pulled=None,
+               depth_consumed=None):
+        if self.n == 1 and isinstance(ticks, int) and ticks >= 1:
+            return self._update_one(delta_price, delta_vol, delta_spread, active, ticks, depth_pulled, depth_consumed)
+
+        calibrated = self.calibrated()
+        active = calibrated if active is None else np.asarray(active) & calibrated
+
+        if np.ndim(ticks) == 0:
+            self.decay(ticks, active)
+        else:
+            ticks = np.asarray(ticks)
+            active = active & (ticks > 0)
+            for n in np.unique(ticks[active]):
+                self.decay(int(n), active & (ticks == n))
+
+        with np.errstate(invalid="ignore"):
+            jumped = active & (np.asarray(delta_price) >= self.thresholds["price_high"])
+        if jumped.any():
+            self.observe_jump(delta_price, delta_vol, delta_spread, jumped, depth_pulled, depth_consumed)
+
+        return jumped
+
+    # update() of a one-market model through update_evidence on plain floats (same arithmetic, same order)
+    def _update_one(self, delta_price, delta_vol, delta_spread, active, ticks, depth_pulled, depth_consumed):
+        thresholds = self._one_thresholds
+        if thresholds is None or thresholds["price_high"] != thresholds["price_high"] or \
+                (active is not None and not np.all(active)):
+            return np.zeros(1, dtype=bool)
+
+        alpha, beta = self.alpha[0].item(), self.beta[0].item()
+        tick_decay = self.params["tick_decay"]
+        for _ in range(ticks - 1):
+            alpha = max(self.alpha_floor, alpha * tick_decay)
+            beta = max(self.beta_floor, beta * tick_decay)
+
+        market = {"delta_price": delta_price[0], "delta_vol": delta_vol[0], "delta_spread": delta_spread[0]}
+        if depth_consumed is not None:
+            market["depth_pulled"], market["depth_consumed"] = depth_pulled[0], depth_consumed[0]
+        alpha, beta, jumped = update_evidence(alpha, beta, market, thresholds, self.params)
+
+        self.alpha[0], self.beta[0] = alpha, beta
+        if jumped:
+            self.mu[0] = alpha / (alpha + beta)
+        return np.array([jumped])
+
+    # Markets whose fake spike confidence is reached and whose spike stalled
+    def entries(self, delta_price, active=None):
+        entry = (self.mu > self.params["mu_entry"]) & (np.asarray(delta_price) <= 0)
+        return entry if active is None else entry & active
+
+    # Markets allowed to trade at time now
+    def ready(self, now):
+        return self.cooldown_until <= now
+
+    # Resets alpha and beta of the markets in mask (after a trade)
+    def reset(self, mask):
+        self.alpha[mask] = self.alpha_floor
+        self.beta[mask] = self.beta_floor
+        self.mu[mask] = self.alpha_floor / (self.alpha_floor + self.beta_floor)
+
+    def start_cooldown(self, mask, until):
+        self.cooldown_until[mask] = until
+
+# Runs update_evidence and SpikeModel over the same markets, row by row
+# markets: list of dicts of delta arrays (see backtester.load_market) of equal length
+# Returns the number of (market, row) states compared; raises AssertionError on the first mismatch
+def check(markets, thresholds, params=DEFAULT_PARAMS):
+    n = len(markets)
+    rows = len(markets[0]["delta_price"])
+    model = SpikeModel(n, params)
+    for i in range(n):
+        model.set_thresholds(thresholds[i], i)
+
+    scalar = [(model.alpha_floor, model.beta_floor, model.mu[0])] * n
+    dp = np.array([m["delta_price"] for m in markets])
+    dv = np.array([m["delta_vol"] for m in markets])
+    ds = np.array([m["delta_spread"] for m in markets])
+
+    for row in range(rows):
+        model.update(dp[:, row], dv[:, row], ds[:, row])
+
+        for i in range(n):
+            alpha, beta, mu = scalar[i]
+            tick = {"delta_price": int(dp[i, row]), "delta_vol": int(dv[i, row]), "delta_spread": int(ds[i, row])}
+            alpha, beta, jumped = update_evidence(alpha, beta, tick, thresholds[i], params)
+            if jumped:
+                mu = alpha / (alpha + beta)
+            scalar[i] = (alpha, beta, mu)
+
+            if (alpha, beta, mu) != (model.alpha[i], model.beta[i], model.mu[i]):
+                raise AssertionError(f"market {i} row {row}: scalar {(alpha, beta, mu)}, "
+                                     f"vectorized {(model.alpha[i], model.beta[i], model.mu[i])}")
+
+    return n * rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Check SpikeModel against the scalar detector logic")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    check_parser = commands.add_parser("check", help="compare with update_evidence and time one tick")
+    check_parser.add_argument("file", help="csv logged by data.py or a tape")
+    check_parser.add_argument("--markets", type=int, default=1000, help="markets in the timing run")
+    check_parser.add_argument("--compare", type=int, default=20, help="markets compared state by state")
+
+    args = parser.parse_args()
+
+    from backtester import calibrate, load_market
+
+    market = load_market(args.file)
+    thresholds = calibrate(market)
+
+    # shifted copies of the recording stand in for different markets, thresholds vary around the calibrated ones
+    rng = np.random.default_rng(0)
+    def variant(i):
+        shift = int(rng.integers(len(market["delta_price"])))
+        copy = {name: np.roll(market[name], shift) for name in ("delta_price", "delta_vol", "delta_spread")}
+        scaled = {name: max(1, int(round(value * rng.uniform(0.5, 1.5)))) for name, value in thresholds.items()}
+        return copy, scaled
+
+    variants = [variant(i) for i in range(args.compare)]
+    compared = check([v[0] for v in variants], [v[1] for v in variants])
+    print(f"OK: {compared} market-ticks match the scalar update exactly")
+
+    variants = [variant(i) for i in range(args.markets)]
+    model = SpikeModel(args.markets)
+    for i, (_, scaled) in enumerate(variants):
+        model.set_thresholds(scaled, i)
+    dp = np.array([v[0]["delta_price"] for v in variants])
+    dv = np.array([v[0]["delta_vol"] for v in variants])
+    ds = np.array([v[0]["delta_spread"] for v in variants])
+
+    ticks = min(1000, dp.shape[1])
+    start = time.perf_counter()
+    for row in range(ticks):
+        model.update(dp[:, row], dv[:, row], ds[:, row])
+        model.entries(dp[:, row])
+    elapsed = (time.perf_counter() - start) / ticks
+    print(f"{args.markets} markets: {elapsed * 1e6:.0f} us per tick")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+In-memory order book of one market
+
+Kalshi books only hold bids: YES bids and NO bids, a NO bid at p being a YES ask at
+100 - p. OrderBook keeps the resting contracts of both sides in arrays indexed by price
+in cents (1-99), built from an /orderbook snapshot (REST or the WebSocket
+orderbook_snapshot message) and then updated from orderbook_delta messages.
+Depth at a price and cumulative depth (contracts at a price or better) are O(1) lookups.
+
+Between two evidence ticks the book also counts contracts leaving the top `levels`
+cents of each side: taken by trades (consumed) or cancelled (pulled). On a YES jump,
+asks pulled rather than bought point to a fake spike, a sweep through ask depth to a
+real repricing (see model.update_evidence and params["depth_evidence"]).
+
+Check the incremental book against a rebuilt one (and time an update):
+    python orderbook.py check
+Print the book of a market:
+    python orderbook.py show KXCBAGAME-26JAN15NINSHA-NIN
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from params import DEFAULT_PARAMS
+
+YES = 0
+NO = 1
+SIDES = {"yes": YES, "no": NO}
+
+# Prices are whole cents 1-99, index 0 and 100 stay empty
+PRICES = 101
+
+# (price, count) pairs of one side of a snapshot, in cents
+# Snapshots carry "yes"/"no" in cents or only "yes_dollars"/"no_dollars" as strings
+def snapshot_levels(book, side):
+    levels = book.get(side)
+    if levels:
+        return [(int(price), int(count)) for price, count in levels]
+    return [(int(round(float(price) * 100)), int(count)) for price, count in book.get(f"{side}_dollars") or []]
+
+class OrderBook:
+    """
+    Bids of both sides of one market.
+
+    :param levels: cents from the best bid counted by the depth features
+    """
+
+    def __init__(self, ticker="", levels=DEFAULT_PARAMS["depth_levels"]):
+        self.ticker = ticker
+        self.levels = levels
+        self.depth = np.zeros((2, PRICES), dtype=np.int64)  # contracts bid at each price
+        self.cumulative = np.zeros((2, PRICES + 1), dtype=np.int64)  # contracts bid at each price or better
+        self.best = [0, 0]  # best bid per side, 0 when the side is empty
+        self.ready = False  # a snapshot has been applied
+
+        # contracts that left the top levels since the last take_features()
+        self._removed = np.zeros(2, dtype=np.int64)
+        self._consumed = np.zeros(2, dtype=np.int64)
+
+    @classmethod
+    def from_snapshot(cls, book, ticker="", levels=DEFAULT_PARAMS["depth_levels"]):
+        order_book = cls(ticker, levels)
+        order_book.apply_snapshot(book)
+        return order_book
+
+    # Replaces both sides with a snapshot ({"yes": [[price, count], ...], "no": [...]})
+    # Features counted so far are kept, the snapshot itself is not a change
+    def apply_snapshot(self, book):
+        self.depth[:] = 0
+        for side, index in SIDES.items():
+            for price, count in snapshot_levels(book, side):
+                if 1 <= price <= 99:
+                    self.depth[index, price] += count
+
+        # cumulative[side, p] = contracts at p or better (higher bids are better)
+        self.cumulative[:, :PRICES] = np.cumsum(self.depth[:, ::-1], axis=1)[:, ::-1]
+        self.cumulative[:, PRICES] = 0
+        for index in (YES, NO):
+            self._set_best(index)
+        self.ready = True
+
+    # Adds delta contracts (negative: removed) to the bids of side ("yes"/"no") at price
+    def apply_delta(self, side, price, delta):
+        index = SIDES[side]
+        if not 1 <= price <= 99:
+            return
+
+        old = self.depth[index, price]
+        new = max(0, old + delta)
+        change = new - old
+        if change == 0:
+            return
+
+        # removals at the top of the book feed the pulled/consumed features
+        if change < 0 and price > self.best[index] - self.levels:
+            self._removed[index] -= change
+
+        self.depth[index, price] = new
+        self.cumulative[index, 1:price + 1] += change
+        if new > 0 and price > self.best[index]:
+            self.best[index] = price
+        elif new == 0 and price == self.best[index]:
+            self._set_best(index)
+
+    # A trade message: the taker bought taker_side, taking the bids of the other side
+    def trade(self, taker_side, count):
+        self._consumed[1 - SIDES[taker_side]] += count
+
+    def _set_best(self, index):
+        prices = np.flatnonzero(self.depth[index])
+        self.best[index] = prices[-1].item() if len(prices) else 0
+
+    # Contracts bid on side at exactly price
+    def depth_at(self, side, price):
+        return self.depth[SIDES[side], price].item()
+
+    # Contracts bid on side at price or better
+    def cumulative_depth(self, side, price):
+        return self.cumulative[SIDES[side], max(1, price)].item()
+
+    def best_bid(self, side):
+        return self.best[SIDES[side]]
+
+    # Best ask of side (100 - best bid of the other side), None when there is none
+    def best_ask(self, side):
+        other = self.best[1 - SIDES[side]]
+        return 100 - other if other else None
+
+    # Contracts bid within `levels` cents of the best bid of side
+    def top_depth(self, side):
+        index = SIDES[side]
+        if not self.best[index]:
+            return 0
+        return self.cumulative[index, max(1, self.best[index] - self.levels + 1)].item()
+
+    # Depth features since the last call, then starts counting again
+    # The YES asks are the NO bids, so a YES jump lifts or pulls NO bid depth:
+    #   depth_consumed: ask contracts taken by trades
+    #   depth_pulled: ask contracts removed without a trade
+    #   ask_depth: ask contracts left within `levels` cents of the best ask
+    # (bid_* are the same for the YES bids)
+    # traded: contracts traded in the interval when no trade messages are received (e.g. delta_vol), counted as
+    # consumed on both sides up to what was removed
+    def take_features(self, traded=None):
+        removed = self._removed
+        consumed = self._consumed if traded is None else np.full(2, max(0, traded))
+        consumed = np.minimum(consumed, removed)
+        pulled = removed - consumed
+
+        features = {
+            "depth_pulled": pulled[NO].item(),
+            "depth_consumed": consumed[NO].item(),
+            "ask_depth": self.top_depth("no"),
+            "bid_pulled": pulled[YES].item(),
+            "bid_consumed": consumed[YES].item(),
+            "bid_depth": self.top_depth("yes"),
+        }
+
+        self._removed = np.zeros(2, dtype=np.int64)
+        self._consumed = np.zeros(2, dtype=np.int64)
+        return features
+
+    # Snapshot dict in the REST format
+    def to_snapshot(self):
+        return {side: [[price.item(), self.depth[index, price].item()] for price in np.flatnonzero(self.depth[index])]
+                for side, index in SIDES.items()}
+
+# Random deltas applied to a book, compared with a book rebuilt from the resulting levels
+def check(updates=100000, seed=0):
+    rng = np.random.default_rng(seed)
+    levels = {"yes": {price: int(rng.integers(1, 50)) for price in range(20, 45)},
+              "no": {price: int(rng.integers(1, 50)) for price in range(50, 75)}}
+    book = OrderBook.from_snapshot({side: list(prices.items()) for side, prices in levels.items()})
+
+    sides = rng.choice(["yes", "no"], updates)
+    prices = rng.integers(1, 100, updates)
+    deltas = rng.integers(-30, 31, updates)
+    for side, price, delta in zip(sides, prices.tolist(), deltas.tolist()):
+        book.apply_delta(side, price, delta)
+        levels[side][price] = max(0, levels[side].get(price, 0) + delta)
+
+    rebuilt = OrderBook.from_snapshot({side: list(prices.items()) for side, prices in levels.items()})
+    for side in SIDES:
+        for price in range(1, 100):
+            assert book.depth_at(side, price) == rebuilt.depth_at(side, price), (side, price)
+            assert book.cumulative_depth(side, price) == rebuilt.cumulative_depth(side, price), (side, price)
+        assert book.best_bid(side) == rebuilt.best_bid(side), side
+    print(f"OK: {updates} deltas match the rebuilt book (best yes bid {book.best_bid('yes')}, "
+          f"best yes ask {book.best_ask('yes')})")
+
+    start = time.perf_counter()
+    for side, price, delta in zip(sides, prices.tolist(), deltas.tolist()):
+        book.apply_delta(side, price, delta)
+    seconds = (time.perf_counter() - start) / updates
+    start = time.perf_counter()
+    for price in prices.tolist():
+        book.cumulative_depth("yes", price)
+    query = (time.perf_counter() - start) / updates
+    print(f"apply_delta {seconds * 1e6:.2f} us, cumulative_depth {query * 1e6:.2f} us")
+
+def show(ticker, levels):
+    from market import fetch_orderbook
+
+    book = OrderBook.from_snapshot(fetch_orderbook(ticker), ticker, levels)
+    for side in SIDES:
+        bids = ", ".join(f"{price}c x{count}" for price, count in reversed(book.to_snapshot()[side][-levels:]))
+        print(f"{side.upper()} bids: {bids or '-'} (top {levels} cents: {book.top_depth(side)} contracts)")
+    print(f"YES {book.best_bid('yes')} / {book.best_ask('yes')}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Array-backed order book")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    check_parser = commands.add_parser("check", help="compare incremental updates with a rebuilt book")
+    check_parser.add_argument("--updates", type=int, default=100000)
+    check_parser.add_argument("--seed", type=int, default=0)
+
+    show_parser = commands.add_parser("show", help="print the book of a market")
+    show_parser.add_argument("ticker")
+    show_parser.add_argument("--levels", type=int, default=DEFAULT_PARAMS["depth_levels"])
+
+    args = parser.parse_args()
+
+    if args.command == "check":
+        check(args.updates, args.seed)
+    else:
+        show(args.ticker, args.levels)
+
+if __name__ == "__main__":
+    main()
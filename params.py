@@ -0,0 +1,65 @@
+"""
+Detector hyperparameters shared by detector.py, backtester.py and sweep.py
+
+Copy and edit the dict to try other values, e.g. dict(DEFAULT_PARAMS, mu_entry=0.8)
+"""
+
+DEFAULT_PARAMS = {
+    # calibration
+    "duration": 60,  # calibration duration in seconds
+    "vol_low_pct": 25,  # percentile of nonzero delta_vol that counts as "low"
+    "vol_high_pct": 75,  # percentile of nonzero delta_vol that counts as "high"
+    "spread_pct": 80,  # percentile of nonzero |delta_spread| that counts as a spread move
+    "price_pct": 95,  # percentile of delta_price that counts as a jump
+    "calibration_mode": "batch",  # "batch" (fixed after duration), "window" or "p2" (online, see calibration.py)
+    "min_samples": 30,  # ticks before online calibration lets the bot trade
+    "calibration_window": 600,  # ticks kept by "window" calibration
+    "calibration_refresh": 10,  # ticks between online threshold updates
+
+    # alpha/beta evidence
+    "jump_decay": 0.9,  # old evidence loses 10% weight each jump
+    "tick_decay": 0.99,  # very slow decay of evidence every tick
+    "alpha_floor": 1.0,  # prior/minimum evidence that a move is a fake spike
+    "beta_floor": 2.0,  # prior/minimum evidence that a move is a real repricing
+    "mu_entry": 0.7,  # fake spike confidence needed to enter
+
+    # order book depth evidence (see orderbook.py, needs the WebSocket feed)
+    "depth_evidence": False,  # add evidence from ask depth pulled/consumed on jumps
+    "depth_levels": 5,  # cents from the best price counted as top-of-book depth
+    "depth_sweep": 20,  # ask contracts consumed on a jump that count as a sweep (real repricing)
+
+    # trading
+    "lookback": 10,  # seconds behind the deltas and the pre-spike NO level
+    "lag_mode": "nearest",  # delta reference: "nearest" snapshot to lookback seconds ago, "interpolate" between the
+                            # two around it, or "count" (lookback polls ago, fixed polling only)
+    "max_spread": 3,  # spread loses profit, so define a max spread
+    "fee_buffer": 2,  # buffer for Kalshi fees
+    "stop_loss": 5,  # exit if NO drops this many cents below entry
+    "max_timeout": 600,  # exit after this many seconds in a position
+    "cooldown": 15,  # spike cooldown in seconds after a trade
+    "max_positions": 1,  # open positions (1 contract each) per market, see positions.py
+    "reconcile_every": 60,  # seconds between checks of the local positions against the portfolio, 0 disables
+
+    # polling (see scheduler.py)
+    "poll_mode": "fixed",  # "fixed" (1 second) or "adaptive"
+    "poll_fast": 0.2,  # seconds between polls during a jump, near mu_entry or in a position
+    "poll_slow": 5.0,  # longest seconds between polls of a quiet market
+    "poll_backoff": 1.5,  # quiet poll interval growth per poll
+    "poll_hot_seconds": 10,  # seconds a jump keeps the market on fast polling
+    "poll_mu_margin": 0.1,  # mu within this of mu_entry polls fast
+    "poll_budget": 10,  # requests per second of detector.py in adaptive mode
+
+    # http client (see http_client.py)
+    "api_tier": "basic",  # Kalshi rate-limit tier: "basic", "advanced", "premier" or "prime"
+
+    # warm-state cache (see cache.py)
+    "cache_dir": ".detector_cache",  # "" disables the cache
+    "cache_max_age": 600,  # seconds before a cached ticker state is ignored on startup
+    "cache_series_max_age": 86400,  # seconds before cached series thresholds are ignored
+    "cache_max_entries": 500,  # cached ticker files kept
+    "cache_every": 10,  # ticks between cache saves
+
+    # latency metrics (see metrics.py)
+    "metrics_port": 0,  # local Prometheus endpoint port, 0 disables it
+    "metrics_every": 60,  # ticks between latency summary lines, 0 disables them
+}
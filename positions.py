@@ -0,0 +1,244 @@
+"""
+Non-blocking position manager
+
+Tracks every open NO position (one contract each, several per market up to
+max_positions) with its target (the pre-spike NO level), stop level and timeout.
+update() evaluates the exits of a market on every tick and poll() applies order
+results as they arrive, so the detector keeps polling and updating alpha/beta while
+positions are open instead of waiting inside an exit loop.
+
+Positions are saved to the warm-state cache (see cache.py) whenever they change, so a
+restarted detector picks them up again, and every reconcile_every seconds they are
+checked against the portfolio on a background thread, never on the trading path.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import journal
+from params import DEFAULT_PARAMS
+
+# NO contracts held per ticker according to the exchange ({ticker: contracts}, NO negative)
+def fetch_portfolio(ticker):
+    import api_info as api
+    import bet
+
+    return api.get_positions(ticker, bet.client.base_url)
+
+def filled(data):
+    return data is not None and "order" in data and data["order"]["status"] not in ("canceled", "rejected")
+
+class PositionManager:
+    """
+    Open positions of one or more markets.
+
+    :param params: see params.py (stop_loss, max_timeout, max_positions, reconcile_every)
+    :param cache: cache.StateCache the positions are saved to, None to keep them in memory only
+    :param submit: function(ticker, action, side, price) -> Future of the order response (default: bet.submit_bet)
+    :param portfolio: function(ticker) -> {ticker: contracts}, see fetch_portfolio
+    """
+
+    def __init__(self, params=DEFAULT_PARAMS, cache=None, submit=None, portfolio=fetch_portfolio):
+        if submit is None:
+            from bet import submit_bet as submit
+
+        self.params = params
+        self.cache = cache
+        self.submit = submit
+        self.portfolio = portfolio
+
+        self.positions = {}  # ticker -> list of dicts with entry, pre_spike_no, stop_level, opened, closing
+        self.last_market = {}  # ticker -> market of the last update()
+        self._orders = {}  # future -> (ticker, action, buy details or position)
+        self._reconciled_at = {}  # ticker -> time of the last portfolio check
+        self._reconciling = {}  # future -> (ticker, fills applied when the check started)
+        self._fills = {}  # ticker -> orders filled so far, a check that overlaps a fill is stale
+        self._executor = None
+
+    # Loads the positions of ticker left open by a previous run
+    def restore(self, ticker):
+        if self.cache is None:
+            return []
+
+        restored = self.cache.load_positions(ticker)
+        for position in restored:
+            position["closing"] = None
+        self.positions[ticker] = restored
+        if restored:
+            journal.record("info", f"Restored {len(restored)} open position(s): "
+                                   f"{', '.join(str(p['entry']) for p in restored)}", ticker=ticker)
+        return restored
+
+    def open_positions(self, ticker):
+        return self.positions.get(ticker, [])
+
+    # Open positions plus buys in flight
+    def exposure(self, ticker):
+        pending = sum(1 for t, action, _ in self._orders.values() if t == ticker and action == "buy")
+        return len(self.open_positions(ticker)) + pending
+
+    def can_open(self, ticker):
+        return self.exposure(ticker) < self.params["max_positions"]
+
+    # Sends a buy of 1 NO contract at the market's NO ask without waiting for it
+    def open(self, ticker, market, pre_spike_no, now):
+        future = self.submit(ticker, "buy", "no", market['no_ask'])
+        self._orders[future] = (ticker, "buy", {"entry": market['no_ask'], "pre_spike_no": pre_spike_no, "sent": now})
+
+    # Evaluates the exits of ticker's positions against this tick's market, sells without waiting
+    def update(self, ticker, market, now):
+        self.last_market[ticker] = market
+
+        for position in self.open_positions(ticker):
+            if position["closing"] is not None:
+                continue
+
+            reason = None
+            if market['no_bid'] >= position["pre_spike_no"]:
+                reason = "target reached"
+            # exits market if no price drops by stop_loss
+            elif market['no_bid'] <= position["stop_level"]:
+                reason = "stop loss hit"
+            # exits market if no activity for max_timeout seconds
+            elif now - position["opened"] > self.params["max_timeout"]:
+                reason = "max timeout reached"
+
+            if reason is not None:
+                self._sell(ticker, position, reason)
+
+    # Sells every open position that is not already being closed, e.g. at the end of a session
+    def sell_all(self, reason):
+        for ticker in list(self.positions):
+            for position in self.open_positions(ticker):
+                if position["closing"] is None:
+                    self._sell(ticker, position, reason)
+
+    def _sell(self, ticker, position, reason):
+        position["closing"] = reason
+        future = self.submit(ticker, "sell", "no", None)
+        self._orders[future] = (ticker, "sell", position)
+
+    # Applies finished orders and portfolio checks, starts a portfolio check when one is due
+    # Returns events (kind, ticker, position): "opened", "closed" (position has exit and net) or "dropped"
+    def poll(self, now):
+        events = []
+        for future in [f for f in self._orders if f.done()]:
+            ticker, action, details = self._orders.pop(future)
+            try:
+                data = future.result().json()
+            except Exception as e:
+                journal.record("order", f"{ticker} {action} failed: {e}", ticker=ticker, error=str(e))
+                data = None
+
+            if action == "buy":
+                event = self._bought(ticker, details, data, now)
+            else:
+                event = self._sold(ticker, details, data)
+            if event is not None:
+                events.append(event)
+
+        for future in [f for f in self._reconciling if f.done()]:
+            ticker, fills = self._reconciling.pop(future)
+            try:
+                held = -future.result().get(ticker, 0)
+            except Exception as e:
+                journal.record("info", f"WARNING: portfolio check failed: {e}", ticker=ticker)
+                continue
+            if fills == self._fills.get(ticker, 0):
+                events.extend(self._reconcile(ticker, held))
+
+        self._start_reconcile(now)
+        return events
+
+    def _bought(self, ticker, buy, data, now):
+        if not filled(data):
+            journal.record("info", "Buy didn't fill", ticker=ticker)
+            return None
+
+        self._fills[ticker] = self._fills.get(ticker, 0) + 1
+        stop_level = max(1, buy["entry"] - self.params["stop_loss"])
+        position = {"entry": buy["entry"], "pre_spike_no": buy["pre_spike_no"], "stop_level": stop_level,
+                    "opened": now, "closing": None}
+        self.positions.setdefault(ticker, []).append(position)
+        journal.record("info", f"bought NO at {buy['entry']}, target {buy['pre_spike_no']}, stop {stop_level}",
+                       ticker=ticker)
+        self._save(ticker)
+        return ("opened", ticker, position)
+
+    def _sold(self, ticker, position, data):
+        reason = position["closing"]
+        if not filled(data):
+            # position stays open, the exit is evaluated again next tick
+            journal.record("info", "WARNING: Sell did not fill", ticker=ticker)
+            position["closing"] = None
+            return None
+
+        self._fills[ticker] = self._fills.get(ticker, 0) + 1
+        exit_price = self.last_market[ticker]['no_bid']
+        net = exit_price - position['entry']
+        position.update(exit=exit_price, net=net)
+        message = f"{reason}\nContracts sold\nNet: {net}" if reason != "target reached" else f"Contracts sold\nNet: {net}"
+        journal.record("exit", message, ticker=ticker, reason=reason, entry=position['entry'], exit=exit_price, net=net)
+
+        self.positions[ticker].remove(position)
+        self._save(ticker)
+        return ("closed", ticker, position)
+
+    # Checks the tickers due for a portfolio check on the background thread
+    def _start_reconcile(self, now):
+        every = self.params["reconcile_every"]
+        if not every:
+            return
+
+        busy = {ticker for ticker, _ in self._reconciling.values()}
+        for ticker, positions in self.positions.items():
+            if not positions or ticker in busy or now - self._reconciled_at.get(ticker, now - every) < every:
+                continue
+            # orders in flight change the position, check once they are done
+            if any(t == ticker for t, _, _ in self._orders.values()):
+                continue
+
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1)
+            self._reconciled_at[ticker] = now
+            self._reconciling[self._executor.submit(self.portfolio, ticker)] = (ticker, self._fills.get(ticker, 0))
+
+    # Drops local positions the exchange no longer holds (settled or closed elsewhere)
+    # Contracts held beyond the local positions have no known target and are only reported
+    def _reconcile(self, ticker, held):
+        positions = self.open_positions(ticker)
+        if held > len(positions):
+            journal.record("info", f"WARNING: portfolio holds {held} NO contracts, {len(positions)} tracked",
+                           ticker=ticker)
+            return []
+        if held == len(positions):
+            return []
+
+        # positions being closed go first, then the oldest
+        extra = sorted(positions, key=lambda p: (p["closing"] is None, p["opened"]))[:len(positions) - held]
+        for position in extra:
+            positions.remove(position)
+        journal.record("info", f"WARNING: portfolio holds {held} NO contracts, dropped {len(extra)} tracked "
+                               f"position(s)", ticker=ticker)
+        self._save(ticker)
+        return [("dropped", ticker, position) for position in extra]
+
+    def _save(self, ticker):
+        if self.cache is not None:
+            self.cache.save_positions(ticker, [{k: v for k, v in p.items() if k != "closing"}
+                                               for p in self.open_positions(ticker)])
+
+    # Waits for orders in flight and applies them
+    # With sell_reason every open position is then sold (see sell_all) and those orders are waited for too
+    def close(self, now, sell_reason=None):
+        events = self._drain(now)
+        if sell_reason is not None:
+            self.sell_all(sell_reason)
+            events += self._drain(now)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        return events
+
+    def _drain(self, now):
+        for future in list(self._orders):
+            future.exception()
+        return self.poll(now)
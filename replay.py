@@ -0,0 +1,324 @@
+"""
+Replay harness for detector.py
+
+Runs the real detector.detect() (calibration, entry checks, IOC buy, stop loss/timeout
+exit loop, sells) against SimulatedExchange, a local stand-in for the Kalshi REST API
+that serves a recorded csv or tape one row per virtual second:
+
+- GET  /trade-api/v2/markets/{ticker}   the row at the current virtual time
+- POST /trade-api/v2/portfolio/orders   IOC buys fill if the limit reaches the recorded no_ask,
+                                        market sells fill at the recorded no_bid
+
+Sleeps in the detector advance a virtual clock instantly, while the work between them
+takes real time, so a 3 hour game replays in well under a minute. Decision latency
+(market response served -> order received, in real time) and fill rates are reported.
+
+    python replay.py cba_game_sample.csv --ticker KXCBAGAME-26JAN15NINSHA-NIN
+    python replay.py tapes --ticker KXCBAGAME-26JAN15NINSHA-NIN --param mu_entry=0.6
+"""
+
+import argparse
+import json
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+API_PREFIX = "/trade-api/v2"
+
+class VirtualClock:
+    """
+    Wall clock for the replayed code: sleep() jumps ahead instantly, real time spent
+    between sleeps still passes (at 1x).
+
+    :param start: virtual unix time at creation
+    """
+
+    def __init__(self, start):
+        self._start = start
+        self._real_start = time.perf_counter()
+        self._slept = 0.0
+        self._lock = threading.Lock()
+        self.datetime = self._datetime_class()
+
+    def time(self):
+        with self._lock:
+            return self._start + self._slept + (time.perf_counter() - self._real_start)
+
+    def sleep(self, seconds):
+        with self._lock:
+            self._slept += max(0.0, seconds)
+
+    # measuring code keeps real time
+    def perf_counter(self):
+        return time.perf_counter()
+
+    def monotonic(self):
+        return self.time()
+
+    def _datetime_class(self):
+        clock = self
+
+        class VirtualDatetime(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return datetime.fromtimestamp(clock.time(), tz)
+
+        return VirtualDatetime
+
+    # Replaces module.time and module.datetime (as imported by detector.py) if present; returns an undo function
+    def install(self, module):
+        saved = {name: getattr(module, name) for name in ("time", "datetime") if hasattr(module, name)}
+        module.time = self
+        if "datetime" in saved:
+            module.datetime = self.datetime
+
+        def undo():
+            for name, value in saved.items():
+                setattr(module, name, value)
+
+        return undo
+
+# Market json snapshots for every row of a csv or tape loaded by backtester.load_market
+# csv files have no volume: it is rebuilt from the 10 second delta_vol so the detector sees the same deltas
+def market_snapshots(market, ticker, lookback=10):
+    import backtester
+
+    n = len(market["yes_bid"])
+    yes_bid = market["yes_bid"]
+    yes_ask = market["yes_ask"]
+    no_bid = market["no_bid"] if "no_bid" in market else 100 - yes_ask
+    no_ask = market["no_ask"] if "no_ask" in market else 100 - yes_bid
+
+    volume = backtester.market_volume(market, lookback)
+
+    return [{
+        "ticker": ticker,
+        "yes_bid": int(yes_bid[row]),
+        "yes_ask": int(yes_ask[row]),
+        "no_bid": int(no_bid[row]),
+        "no_ask": int(no_ask[row]),
+        "volume": int(volume[row]),
+        "yes_bid_dollars": f"{yes_bid[row] / 100:.4f}",
+    } for row in range(n)]
+
+class SimulatedExchange:
+    """
+    Local Kalshi stand-in serving one recorded market on a virtual clock.
+
+    :param snapshots: market json per row (see market_snapshots), row r is live during virtual second r
+    :param clock: VirtualClock shared with the replayed code
+    """
+
+    def __init__(self, ticker, snapshots, clock, start):
+        self.ticker = ticker
+        self.snapshots = snapshots
+        self.clock = clock
+        self.start = start
+
+        self.position = 0
+        self.orders = []  # one dict per order received
+        self.last_served = None  # real time the last market response was sent
+        self._server = None
+
+    def row(self):
+        return min(len(self.snapshots) - 1, max(0, int(self.clock.time() - self.start)))
+
+    def market(self):
+        return dict(self.snapshots[self.row()])
+
+    # Fills one order against the current row
+    def order(self, payload):
+        received = time.perf_counter()
+        row = self.row()
+        snapshot = self.snapshots[row]
+        action = payload["action"]
+        side = payload["side"]
+
+        order = {"ticker": payload["ticker"], "side": side, "action": action, "type": payload["type"]}
+        fill = None
+        if payload["ticker"] != self.ticker or side != "no":
+            order["status"] = "rejected"
+        elif action == "buy":
+            # immediate or cancel: fills only if the limit reaches the ask
+            if payload.get("no_price") is not None and payload["no_price"] >= snapshot["no_ask"]:
+                fill = snapshot["no_ask"]
+                self.position += payload["count"]
+        elif self.position > 0:
+            # reduce-only market sell
+            fill = snapshot["no_bid"]
+            self.position -= min(self.position, payload["count"])
+
+        if "status" not in order:
+            order["status"] = "executed" if fill is not None else "canceled"
+
+        latency = received - self.last_served if self.last_served is not None else float("nan")
+        self.orders.append({"row": row, "action": action, "status": order["status"], "price": fill,
+                            "limit": payload.get("no_price"), "latency": latency})
+        return order
+
+    def serve(self, host="127.0.0.1", port=0):
+        exchange = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            wbufsize = 1 << 16
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, body):
+                body = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                path = self.path.split("?", 1)[0]
+                if path == f"{API_PREFIX}/markets/{exchange.ticker}":
+                    self._reply(200, {"market": exchange.market()})
+                    exchange.last_served = time.perf_counter()
+                elif path == f"{API_PREFIX}/portfolio/positions":
+                    # NO contracts are negative
+                    self._reply(200, {"market_positions": [{"ticker": exchange.ticker, "position": -exchange.position}]})
+                elif path == f"{API_PREFIX}/exchange/status":
+                    self._reply(200, {"exchange_active": True, "trading_active": True})
+                else:
+                    self._reply(404, {"error": {"message": f"not found: {path}"}})
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self.path.split("?", 1)[0] != f"{API_PREFIX}/portfolio/orders":
+                    self._reply(404, {"error": {"message": f"not found: {self.path}"}})
+                    return
+                self._reply(201, {"order": exchange.order(json.loads(body))})
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f"http://{host}:{self._server.server_port}"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    # Fill rates, decision latency and realized PnL of the orders received
+    def report(self):
+        buys = [o for o in self.orders if o["action"] == "buy"]
+        sells = [o for o in self.orders if o["action"] == "sell"]
+        filled_buys = [o for o in buys if o["status"] == "executed"]
+        filled_sells = [o for o in sells if o["status"] == "executed"]
+
+        pnl = sum(s["price"] for s in filled_sells) - sum(b["price"] for b in filled_buys[:len(filled_sells)])
+        latencies = np.array([o["latency"] for o in self.orders if not math.isnan(o["latency"])]) * 1000
+
+        report = {
+            "buys": len(buys),
+            "buy_fill_rate": len(filled_buys) / len(buys) if buys else float("nan"),
+            "sells": len(sells),
+            "sell_fill_rate": len(filled_sells) / len(sells) if sells else float("nan"),
+            "pnl": pnl,
+            "open_position": self.position,
+        }
+        if len(latencies):
+            report["latency_p50_ms"] = float(np.percentile(latencies, 50))
+            report["latency_max_ms"] = float(latencies.max())
+
+        return report
+
+# Replays a recorded market through detector.detect(), returns the exchange report
+def replay(file, ticker, params=None):
+    import api_info as api
+    import backtester
+    import bet
+    import detector
+    import history
+    import market as market_api
+    import scheduler
+    from params import DEFAULT_PARAMS
+
+    # no warm-state cache or metrics server, latency summary once per replayed hour
+    overrides = params or {}
+    params = dict(DEFAULT_PARAMS, cache_dir="", metrics_port=0, metrics_every=3600)
+    params.update(overrides)
+
+    recorded = backtester.load_market(file)
+    snapshots = market_snapshots(recorded, ticker, params["lookback"])
+    start = datetime.fromisoformat(str(recorded["ts"][0])).timestamp()
+
+    # throwaway signing key unless real credentials are set
+    if api.key_b64.startswith("<"):
+        from cryptography.hazmat.primitives.asymmetric import rsa
+        api.use_private_key(rsa.generate_private_key(public_exponent=65537, key_size=2048))
+
+    clock = VirtualClock(start)
+    exchange = SimulatedExchange(ticker, snapshots, clock, start)
+    url = exchange.serve()
+
+    saved_urls = (market_api.BASE_URL, bet.client.base_url)
+    market_api.BASE_URL = url + API_PREFIX
+    bet.client.base_url = url
+    # replayed seconds pass faster than the exchange rate limits, which are in real seconds
+    saved_limiters = (market_api.client.limiter, bet.client.http.limiter)
+    market_api.client.limiter = bet.client.http.limiter = None
+    # history timestamps, warm-up sleeps and the poll scheduler run on the same virtual time as the detector
+    undos = [clock.install(module) for module in (detector, market_api, history, scheduler)]
+
+    # stop on the first whole minute after the recording ends
+    end = datetime.fromtimestamp(start + len(snapshots)).replace(second=0, microsecond=0) + timedelta(minutes=1)
+
+    real_start = time.perf_counter()
+    try:
+        detector.detect(ticker, end.hour, end.minute, params)
+    finally:
+        for undo in undos:
+            undo()
+        market_api.BASE_URL, bet.client.base_url = saved_urls
+        market_api.client.limiter, bet.client.http.limiter = saved_limiters
+        exchange.stop()
+
+    report = exchange.report()
+    report["rows"] = len(snapshots)
+    report["seconds"] = time.perf_counter() - real_start
+    return report
+
+# Fill rate as a percentage, "-" when no order was placed
+def _rate(value):
+    return "-" if math.isnan(value) else f"{value:.0%}"
+
+def main():
+    from sweep import _cast
+
+    parser = argparse.ArgumentParser(description="Replay a recorded market through the live detector")
+    parser.add_argument("file", help="csv logged by data.py or a tape")
+    parser.add_argument("--ticker", required=True)
+    parser.add_argument("--param", action="append", default=[], help="override a params.py value, e.g. mu_entry=0.6")
+    args = parser.parse_args()
+
+    params = {}
+    for item in args.param:
+        name, value = item.split("=", 1)
+        params[name] = _cast(name, value)
+
+    import journal
+    journal.open_journal(name="replay")
+
+    report = replay(args.file, args.ticker, params)
+    journal.flush()
+
+    print(f"Replayed {report['rows']} rows in {report['seconds']:.1f}s "
+          f"({report['rows'] / report['seconds']:.0f}x real time)")
+    print(f"Buys: {report['buys']} (fill rate {_rate(report['buy_fill_rate'])}), "
+          f"sells: {report['sells']} (fill rate {_rate(report['sell_fill_rate'])}), "
+          f"net: {report['pnl']} cents, open position: {report['open_position']}")
+    if "latency_p50_ms" in report:
+        print(f"Decision latency (market served -> order received): "
+              f"p50 {report['latency_p50_ms']:.2f} ms, max {report['latency_max_ms']:.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+"""
+Multi-market live trader
+
+Trades many tickers from one process. One bulk /markets request per tick (see
+market.fetch_markets) feeds a separate history and calibration per market, one
+vectorized SpikeModel step (see model.py) updates the evidence of every market at once,
+and entries and exits go through one positions.PositionManager like in detector.py.
+Orders go to a small thread pool, so a slow order never stalls the tick for the other
+markets. Market data and orders draw from one shared per-second request budget.
+With params["poll_mode"] = "adaptive" each tick only fetches the markets the PollScheduler
+says are due (see scheduler.py), so hot markets are polled several times a second.
+
+    python runner.py --tickers KXCBAGAME-26JAN15NINSHA-NIN KXCBAGAME-26JAN15NINSHA-SHA --until 6:00
+    python runner.py --series KXCBAGAME --pattern "*26JAN15*" --until 6:00
+"""
+
+import argparse
+import fnmatch
+import math
+import time
+from concurrent.futures import Future
+from datetime import datetime
+
+import numpy as np
+import requests
+
+from bet import OrderClient
+from calibration import OnlineCalibrator, thresholds_from_deltas
+from detector import entry_rejections
+from history import MarketHistory
+import http_client
+import journal
+import metrics
+from market import TICKERS_PER_REQUEST, fetch_markets, list_markets
+from model import SpikeModel
+from params import DEFAULT_PARAMS
+from positions import PositionManager
+from scheduler import (PollScheduler, RequestBudget, add_lagged_deltas, history_capacity, history_spans,
+                       pre_spike_level)
+
+class MarketTrader:
+    """
+    History and calibration of one market, same rules as detector.detect()
+    The alpha/beta evidence lives in the shared SpikeModel at index, updated for every market at once by Runner,
+    and the positions of every market in Runner's PositionManager (see positions.py), like the detector's.
+    """
+
+    def __init__(self, ticker, index, model, params=DEFAULT_PARAMS):
+        self.ticker = ticker
+        self.index = index
+        self.model = model
+        self.params = params
+
+        self.history = MarketHistory(history_capacity(params))
+        self.thresholds = None
+        self.calibrator = OnlineCalibrator(params) if params["calibration_mode"] != "batch" else None
+        self._warmup = []  # (delta_vol, delta_price, delta_spread) until batch calibration is done
+        self.spanned = False  # history reached lookback seconds back (no pre-filled history, see observe)
+
+        self.last_market = None
+
+    @property
+    def mu(self):
+        return self.model.mu[self.index]
+
+    def _calibrate(self, curr):
+        deltas = (curr['delta_vol'], curr['delta_price'], curr['delta_spread'])
+
+        if self.calibrator is not None:
+            # thresholds come from earlier ticks only, then this tick is added
+            self.thresholds = self.calibrator.thresholds() if self.calibrator.ready else None
+            self.calibrator.update(*deltas)
+            if self.thresholds is not None:
+                self.model.set_thresholds(self.thresholds, self.index)
+        elif self.thresholds is None:
+            self._warmup.append(deltas)
+            if len(self._warmup) >= self.params["duration"]:
+                vols, prices, spreads = np.array(self._warmup).T
+                self.thresholds = thresholds_from_deltas(vols, prices, spreads, self.params)
+                self.model.set_thresholds(self.thresholds, self.index)
+                self._warmup = []
+                journal.record("info", f"{self.ticker} calibrated: {self.thresholds}", ticker=self.ticker,
+                               thresholds=self.thresholds)
+
+    # Takes this tick's market; returns True if the market can trade (deltas and thresholds known)
+    # ticks: seconds of evidence this poll (see PollScheduler.take_ticks), calibration only samples those
+    # arrived: time.monotonic() of the snapshot, its deltas are only used once the history spans the lookback
+    def observe(self, curr, ticks=1, arrived=None):
+        self.last_market = curr
+
+        # still filling the 10 second history: deltas against a younger snapshot would understate every move
+        self.spanned = self.spanned or history_spans(self.history, self.params, arrived)
+        if not self.spanned or "delta_vol" not in curr:
+            return False
+
+        if ticks:
+            self._calibrate(curr)
+        return self.thresholds is not None
+
+    # delta_price at or above the jump threshold
+    def jumping(self):
+        curr = self.last_market
+        return self.thresholds is not None and curr.get('delta_price', 0) >= self.thresholds['price_high']
+
+    # Fake spike predicted and the spike stalled: returns the pre-spike NO level to buy at, None if rejected
+    def entry(self, curr):
+        pre_spike_no = pre_spike_level(self.history, self.params)
+        rejections = entry_rejections(curr, pre_spike_no, self.params)
+        message = f"{self.ticker} no trade because {', '.join(rejections)}" if rejections else None
+        journal.record("signal", message, ticker=self.ticker, mu=self.mu, pre_spike_no=pre_spike_no,
+                       no_bid=curr['no_bid'], no_ask=curr['no_ask'], rejections=rejections)
+        return None if rejections else pre_spike_no
+
+class Runner:
+    """
+    Drives every MarketTrader from one loop, with one vectorized SpikeModel update per tick.
+    Entries and exits of every market go through one PositionManager (see positions.py).
+
+    :param budget_per_second: shared request budget (market data + orders)
+    :param order_workers: threads (and pooled connections) submitting orders
+    """
+
+    def __init__(self, tickers, params=DEFAULT_PARAMS, budget_per_second=10, order_workers=4):
+        self.tickers = list(tickers)
+        self.params = params
+        http_client.configure(params)
+        self.model = SpikeModel(len(self.tickers), params)
+        self.traders = {ticker: MarketTrader(ticker, i, self.model, params) for i, ticker in enumerate(self.tickers)}
+        self.budget = RequestBudget(budget_per_second)
+        self.scheduler = None
+        if params["poll_mode"] == "adaptive":
+            self.scheduler = PollScheduler(self.tickers, params, self.budget, TICKERS_PER_REQUEST)
+        self.client = OrderClient(pool_size=order_workers, workers=order_workers)
+        self.positions = PositionManager(params, submit=self._submit)
+
+    # Order submission of the PositionManager, drawing from the shared request budget
+    # An order the budget cannot pay for fails right away (the buy is dropped, the sell retried next tick)
+    def _submit(self, ticker, action, side, price=None):
+        if not self.budget.try_acquire():
+            future = Future()
+            future.set_exception(RuntimeError("request budget exhausted"))
+            return future
+        return self.client.submit(ticker, action, side, price)
+
+    # Applies finished orders: a fill resets the market's evidence, an exit starts its cooldown
+    def _poll_positions(self, now):
+        for kind, ticker, _ in self.positions.poll(now):
+            i = self.traders[ticker].index
+            if kind == "opened":
+                self.model.reset(i)
+            elif kind == "closed":
+                self.model.start_cooldown(i, now + self.params["cooldown"])
+
+    # One tick: bulk fetch, exits, one evidence step for every market, entries
+    # With adaptive polling only the markets due this tick are fetched and stepped
+    def tick(self):
+        if self.scheduler is not None:
+            tickers = self.scheduler.due()
+            if not tickers:
+                self._poll_positions(time.time())
+                return
+        else:
+            tickers = self.tickers
+            requests_needed = max(1, math.ceil(len(tickers) / TICKERS_PER_REQUEST))
+            if not self.budget.try_acquire(requests_needed):
+                journal.record("info", "WARNING: request budget exhausted, skipping market data this tick")
+                self._poll_positions(time.time())
+                return
+
+        # a snapshot that arrives after the next tick is stale, give up on it instead
+        try:
+            snapshot = fetch_markets(tickers, deadline=time.monotonic() + 1.0)
+        except requests.RequestException as e:
+            journal.record("info", f"WARNING: market data failed, skipping this tick ({e})")
+            self._poll_positions(time.time())
+            return
+        arrived = time.monotonic()
+        now = time.time()
+
+        n = len(self.tickers)
+        delta_price = np.zeros(n)
+        delta_vol = np.zeros(n)
+        delta_spread = np.zeros(n)
+        active = np.zeros(n, dtype=bool)
+        ticks = np.zeros(n, dtype=np.int64)
+
+        ticked = []
+        for ticker, curr in snapshot.items():
+            trader = self.traders[ticker]
+            i = trader.index
+            add_lagged_deltas(curr, trader.history, self.params, arrived)
+            # exits of open positions (also while calibrating)
+            self.positions.update(ticker, curr, now)
+            ticks[i] = self.scheduler.take_ticks(ticker) if self.scheduler is not None else 1
+            if trader.observe(curr, ticks[i], arrived):
+                delta_price[i] = curr['delta_price']
+                delta_vol[i] = curr['delta_vol']
+                delta_spread[i] = curr['delta_spread']
+                active[i] = True
+            ticked.append((trader, curr))
+        self._poll_positions(now)
+
+        # every market's evidence in one step, also while positions are open like detector.detect()
+        with metrics.timer("evidence"):
+            jumped = self.model.update(delta_price, delta_vol, delta_spread, active,
+                                       ticks if self.scheduler is not None else 1)
+            entries = self.model.entries(delta_price, active & self.model.ready(now))
+
+        for i in np.flatnonzero(jumped):
+            journal.record("jump", ticker=self.tickers[i], delta_price=delta_price[i], delta_vol=delta_vol[i],
+                           delta_spread=delta_spread[i], alpha=self.model.alpha[i], beta=self.model.beta[i],
+                           mu=self.model.mu[i])
+
+        for trader, curr in ticked:
+            ticker = trader.ticker
+            if entries[trader.index] and self.positions.can_open(ticker):
+                pre_spike_no = trader.entry(curr)
+                if pre_spike_no is not None:
+                    self.positions.open(ticker, curr, pre_spike_no, now)
+            trader.history.push(curr, now, arrived)
+
+            # markets still calibrating keep their 1 second polls
+            if self.scheduler is not None and trader.thresholds is not None:
+                self.scheduler.observe(ticker, trader.jumping(), trader.mu, bool(self.positions.open_positions(ticker)))
+
+    def open_positions(self):
+        return sum(len(self.positions.open_positions(ticker)) for ticker in self.tickers)
+
+    def run(self, end_hour, end_minute):
+        journal.record("info", f"Trading {len(self.tickers)} markets...")
+        self.client.warm()
+
+        if self.params["metrics_port"]:
+            port = metrics.serve(self.params["metrics_port"])
+            journal.record("info", f"Metrics on http://127.0.0.1:{port}/metrics")
+
+        ticks = 0
+        tick_start = time.perf_counter()
+        while not (datetime.now().hour == end_hour and datetime.now().minute == end_minute):
+            with metrics.timer("step"):
+                self.tick()
+
+            with metrics.timer("sleep"):
+                if self.scheduler is not None:
+                    # wake up for the next due market, and often enough to collect orders
+                    time.sleep(min(self.scheduler.delay(), self.params["poll_fast"]))
+                else:
+                    time.sleep(max(0.0, 1.0 - (time.perf_counter() - tick_start)))
+
+            now = time.perf_counter()
+            metrics.tick(now - tick_start, interval=self.params["poll_fast"] if self.scheduler is not None else None)
+            tick_start = now
+
+            ticks += 1
+            if self.params["metrics_every"] and ticks % self.params["metrics_every"] == 0:
+                journal.say(f"{metrics.summary_line()} | open positions {self.open_positions()}")
+
+        self.close()
+
+    # Waits for in-flight orders, then sells every open position
+    def close(self):
+        self.positions.close(time.time(), sell_reason="end of session")
+        if self.open_positions():
+            journal.record("info", f"WARNING: {self.open_positions()} position(s) still open at the end time")
+
+        self.client.close()
+        journal.flush()
+
+# Tickers from a list, or from the open markets of a series filtered by a glob pattern
+def resolve_tickers(tickers=None, series=None, pattern=None):
+    if tickers:
+        found = list(tickers)
+    else:
+        found = [market['ticker'] for market in list_markets(series_ticker=series)]
+
+    if pattern:
+        found = [ticker for ticker in found if fnmatch.fnmatch(ticker, pattern)]
+
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(description="Trade many markets from one process")
+    parser.add_argument("--tickers", nargs="+", help="market tickers")
+    parser.add_argument("--tickers-file", help="tickers ranked by scanner.py --out")
+    parser.add_argument("--series", help="trade the open markets of a series, e.g. KXCBAGAME")
+    parser.add_argument("--pattern", help="glob filter on tickers, e.g. '*26JAN15*'")
+    parser.add_argument("--until", required=True, help="end time HH:MM")
+    parser.add_argument("--budget", type=float, default=10, help="shared requests per second")
+    parser.add_argument("--order-workers", type=int, default=4)
+    parser.add_argument("--metrics-port", type=int, default=0, help="serve Prometheus metrics on this port")
+    args = parser.parse_args()
+
+    if args.tickers_file:
+        from scanner import read_tickers
+        args.tickers = (args.tickers or []) + read_tickers(args.tickers_file)
+
+    if not args.tickers and not args.series:
+        parser.error("pass --tickers, --tickers-file or --series")
+
+    tickers = resolve_tickers(args.tickers, args.series, args.pattern)
+    if not tickers:
+        parser.error("no tickers matched")
+
+    end_hour, end_minute = (int(part) for part in args.until.split(":"))
+    journal.open_journal(name="runner")
+    params = dict(DEFAULT_PARAMS, metrics_port=args.metrics_port)
+    Runner(tickers, params, args.budget, args.order_workers).run(end_hour, end_minute)
+
+    print('Program ended.')
+
+if __name__ == "__main__":
+    main()
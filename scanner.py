@@ -0,0 +1,270 @@
+"""
+Market scanner
+
+Finds the open markets of one or more series and ranks them by how often they show
+fake spikes, so the logger and trader can be pointed at the most spike-prone tickers.
+
+1. List every open market with cursor pagination. Pages are cached on disk and reused
+   while younger than --max-age, so a rescan only refetches stale pages.
+2. Sample the busiest candidates (by 24h volume) with bulk requests once a second.
+3. Calibrate each market from the start of the sample, then run the same alpha/beta
+   evidence (model.SpikeModel) over the rest and count fake spike signals and jumps.
+
+Every request, cached pages excluded, is counted against --budget. Candidates and
+sample length are sized up front so a full scan never exceeds it.
+
+    python scanner.py --series KXCBAGAME --window 300 --budget 1000 --top 10 --out scan.txt
+    python runner.py --tickers-file scan.txt --until 6:00
+"""
+
+import argparse
+import fnmatch
+import json
+import math
+import os
+import time
+
+import numpy as np
+import requests
+
+import http_client
+import market as market_api
+from calibration import thresholds_from_deltas
+from history import MarketHistory
+from model import SpikeModel
+from params import DEFAULT_PARAMS
+from scheduler import add_lagged_deltas, history_capacity, history_spans
+
+class Budget:
+    """
+    Total number of requests a scan may make.
+    """
+
+    def __init__(self, total):
+        self.total = total
+        self.used = 0
+
+    @property
+    def left(self):
+        return self.total - self.used
+
+    def take(self, n=1):
+        if self.used + n > self.total:
+            return False
+        self.used += n
+        return True
+
+class PageCache:
+    """
+    /markets list pages on disk: <directory>/<series>/<status>/<index>.json
+
+    :param max_age: seconds a page is reused before it is refetched
+    """
+
+    def __init__(self, directory=".scanner_cache", max_age=300):
+        self.directory = directory
+        self.max_age = max_age
+
+    def _path(self, series, status, index):
+        return os.path.join(self.directory, series or "_all", status or "_any", f"{index:05d}.json")
+
+    # Cached page index if it is fresh and was fetched with the same cursor, else None
+    def load(self, series, status, index, cursor):
+        try:
+            with open(self._path(series, status, index)) as f:
+                page = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if page["cursor_in"] != cursor or time.time() - page["fetched_at"] > self.max_age:
+            return None
+        return page
+
+    def save(self, series, status, index, cursor, markets, next_cursor):
+        path = self._path(series, status, index)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        page = {"fetched_at": time.time(), "cursor_in": cursor, "cursor": next_cursor, "markets": markets}
+
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(page, f)
+        os.replace(tmp, path)
+        return page
+
+# Every market of a series, from the page cache where fresh; stops early if the budget runs out
+# Returns (markets, complete)
+def scan_series(series, budget, cache=None, status="open"):
+    markets = []
+    cursor = None
+    index = 0
+
+    while True:
+        page = cache.load(series, status, index, cursor) if cache else None
+        if page is None:
+            if not budget.take():
+                return markets, False
+            page_markets, next_cursor = market_api.list_markets_page(series, status, cursor)
+            page = {"markets": page_markets, "cursor": next_cursor}
+            if cache:
+                cache.save(series, status, index, cursor, page_markets, next_cursor)
+
+        markets.extend(page["markets"])
+        cursor = page["cursor"]
+        index += 1
+
+        if not cursor:
+            return markets, True
+
+# Picks as many of the busiest markets as the remaining budget can sample for at least min_ticks
+# Returns (tickers, ticks)
+def plan_sample(markets, budget, window, min_ticks):
+    markets = sorted(markets, key=lambda m: m.get('volume_24h') or 0, reverse=True)
+    per_request = market_api.TICKERS_PER_REQUEST
+
+    count = min(len(markets), (budget.left // min_ticks) * per_request)
+    if count == 0:
+        return [], 0
+
+    requests_per_tick = math.ceil(count / per_request)
+    ticks = min(window, budget.left // requests_per_tick)
+    return [m['ticker'] for m in markets[:count]], ticks
+
+def sample_scores(tickers, ticks, budget, params=DEFAULT_PARAMS, calibration_ticks=60, sleep=time.sleep):
+    """
+    Samples tickers once a second for ticks seconds and counts fake spikes per market.
+
+    :param calibration_ticks: ticks (after the lookback fills) used to calibrate each market
+    :return: list of dicts (ticker, signals, fake_jumps, jumps, ticks), best first
+    """
+    http_client.configure(params)
+    n = len(tickers)
+    requests_per_tick = math.ceil(n / market_api.TICKERS_PER_REQUEST)
+
+    history = {ticker: MarketHistory(history_capacity(params)) for ticker in tickers}
+    index = {ticker: i for i, ticker in enumerate(tickers)}
+    model = SpikeModel(n, params)
+
+    warmup = {ticker: [] for ticker in tickers}
+    spanned = set()  # tickers whose history reaches lookback seconds back
+    signals = np.zeros(n, dtype=np.int64)
+    fake_jumps = np.zeros(n, dtype=np.int64)
+    jumps = np.zeros(n, dtype=np.int64)
+    scored_ticks = np.zeros(n, dtype=np.int64)
+
+    for tick in range(ticks):
+        if tick:
+            sleep(1)
+        if not budget.take(requests_per_tick):
+            break
+
+        try:
+            snapshot = market_api.fetch_markets(tickers)
+        except requests.RequestException as e:
+            print(f"WARNING: market data failed, skipping this tick ({e})")
+            continue
+        arrived = time.monotonic()
+
+        delta_price = np.zeros(n)
+        delta_vol = np.zeros(n)
+        delta_spread = np.zeros(n)
+        active = np.zeros(n, dtype=bool)
+
+        for ticker, curr in snapshot.items():
+            add_lagged_deltas(curr, history[ticker], params, arrived)
+            if history_spans(history[ticker], params, arrived):
+                spanned.add(ticker)
+            history[ticker].push(curr, clock=arrived)
+            # the lookback fills first, younger references would understate every move
+            if ticker not in spanned or "delta_vol" not in curr:
+                continue
+
+            i = index[ticker]
+            if warmup[ticker] is not None:
+                warmup[ticker].append((curr['delta_vol'], curr['delta_price'], curr['delta_spread']))
+                if len(warmup[ticker]) >= calibration_ticks:
+                    vols, prices, spreads = np.array(warmup[ticker]).T
+                    model.set_thresholds(thresholds_from_deltas(vols, prices, spreads, params), i)
+                    warmup[ticker] = None
+                continue
+
+            delta_price[i] = curr['delta_price']
+            delta_vol[i] = curr['delta_vol']
+            delta_spread[i] = curr['delta_spread']
+            active[i] = True
+
+        # same evidence and signal rules as the backtester: reset and cool down after each signal
+        active &= model.ready(tick)
+        mu_before = model.mu.copy()
+        jumped = model.update(delta_price, delta_vol, delta_spread, active)
+        entries = model.entries(delta_price, active)
+
+        jumps += jumped
+        fake_jumps += jumped & (model.mu > mu_before)
+        scored_ticks += active
+        signals += entries
+        model.reset(entries)
+        model.start_cooldown(entries, tick + 1 + params["cooldown"])
+
+    scores = [{"ticker": ticker, "signals": int(signals[i]), "fake_jumps": int(fake_jumps[i]),
+               "jumps": int(jumps[i]), "ticks": int(scored_ticks[i])} for i, ticker in enumerate(tickers)]
+    scores.sort(key=lambda s: (s["signals"], s["fake_jumps"], s["jumps"]), reverse=True)
+    return scores
+
+# Tickers of a file written by --out (one per line, # comments allowed)
+def read_tickers(path):
+    with open(path) as f:
+        return [line.split("#", 1)[0].strip() for line in f if line.split("#", 1)[0].strip()]
+
+def main():
+    parser = argparse.ArgumentParser(description="Rank open markets by recent fake spike frequency")
+    parser.add_argument("--series", nargs="+", required=True, help="series tickers, e.g. KXCBAGAME")
+    parser.add_argument("--pattern", help="glob filter on tickers")
+    parser.add_argument("--window", type=int, default=300, help="sample length in seconds")
+    parser.add_argument("--calibration", type=int, default=60, help="sample ticks used to calibrate each market")
+    parser.add_argument("--budget", type=int, default=1000, help="max requests for the whole scan")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--out", help="write the top tickers here, one per line")
+    parser.add_argument("--cache-dir", default=".scanner_cache")
+    parser.add_argument("--max-age", type=float, default=300, help="seconds cached pages are reused")
+    args = parser.parse_args()
+
+    budget = Budget(args.budget)
+    cache = PageCache(args.cache_dir, args.max_age) if args.cache_dir else None
+
+    markets = []
+    for series in args.series:
+        found, complete = scan_series(series, budget, cache)
+        markets.extend(found)
+        if not complete:
+            print(f"WARNING: request budget ran out while listing {series}")
+    if args.pattern:
+        markets = [m for m in markets if fnmatch.fnmatch(m['ticker'], args.pattern)]
+    print(f"{len(markets)} open markets, {budget.used} requests used")
+
+    # lookback to fill the history, calibration, then at least as many scored ticks
+    min_ticks = DEFAULT_PARAMS["lookback"] + 2 * args.calibration
+    tickers, ticks = plan_sample(markets, budget, args.window, min_ticks)
+    if not tickers:
+        print("Not enough request budget left to sample any market")
+        return
+    if ticks < min_ticks:
+        print(f"WARNING: {ticks} ticks is too short to calibrate and score every market (need {min_ticks})")
+    print(f"Sampling {len(tickers)} markets for {ticks} seconds...")
+
+    scores = sample_scores(tickers, ticks, budget, calibration_ticks=args.calibration)
+    top = scores[:args.top]
+
+    for rank, score in enumerate(top, 1):
+        print(f"{rank:>3}. {score['ticker']}  signals {score['signals']}  fake jumps {score['fake_jumps']}  "
+              f"jumps {score['jumps']}  scored ticks {score['ticks']}")
+    print(f"{budget.used} of {budget.total} requests used")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(f"# scanner.py {' '.join(args.series)} {time.strftime('%Y-%m-%d %H:%M')}\n")
+            for score in top:
+                f.write(score["ticker"] + "\n")
+        print(f"Wrote {len(top)} tickers to {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Adaptive polling
+
+PollScheduler decides when each market is polled next: every poll_fast seconds while a
+jump is in progress, mu is close to mu_entry or a position is open, and backing off from
+1 second toward poll_slow while the market stays quiet. Every poll draws from one
+RequestBudget shared by all markets, the most urgent markets first.
+
+Deltas still compare the market with lookback seconds ago whatever the poll rate:
+delta_reference() picks the reference snapshot by age (params["lag_mode"], also at a
+fixed 1 Hz where slow responses stretch the ticks), and evidence is applied once per
+elapsed second (take_ticks), so fast polls never count one jump twice and thresholds
+calibrated at 1 Hz still apply.
+
+Enable with params["poll_mode"] = "adaptive" (detector.py and runner.py).
+"""
+
+import math
+import time
+
+from params import DEFAULT_PARAMS
+
+# Shortest sleep while waiting for a poll or for the budget to refill
+MIN_SLEEP = 0.01
+
+class RequestBudget:
+    """
+    Requests per second shared by every market (token bucket refilled continuously).
+
+    :param per_second: sustained request rate, also the burst size
+    """
+
+    def __init__(self, per_second):
+        self.per_second = per_second
+        self.tokens = float(per_second)
+        self.updated = time.monotonic()
+        self.denied = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.per_second, self.tokens + (now - self.updated) * self.per_second)
+        self.updated = now
+
+    def try_acquire(self, n=1):
+        self._refill()
+        if self.tokens < n:
+            self.denied += 1
+            return False
+        self.tokens -= n
+        return True
+
+    # Takes as many of n requests as the bucket holds, returns how many
+    def take_up_to(self, n):
+        self._refill()
+        granted = min(n, int(self.tokens))
+        if granted < n:
+            self.denied += 1
+        self.tokens -= granted
+        return granted
+
+class EvidenceClock:
+    """
+    Whole seconds elapsed per market, so evidence, decay and online calibration advance once
+    per second however often a market is polled (adaptive polling) or pushed (WebSocket feed).
+
+    :param clock: monotonic seconds
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.evidence_at = {}
+
+    # Whole seconds since ticker's last evidence tick (1 on the first call); 0 means no evidence this update
+    def take_ticks(self, ticker):
+        now = self.clock()
+        last = self.evidence_at.get(ticker)
+        if last is None:
+            self.evidence_at[ticker] = now
+            return 1
+
+        ticks = int(now - last)
+        self.evidence_at[ticker] = last + ticks
+        return ticks
+
+class PollScheduler:
+    """
+    Poll times of many markets.
+
+    :param budget: RequestBudget shared by every market, None for no limit
+    :param per_request: markets fetched by one request (market.TICKERS_PER_REQUEST for bulk fetches)
+    :param clock: monotonic seconds
+    """
+
+    def __init__(self, tickers, params=DEFAULT_PARAMS, budget=None, per_request=1, clock=time.monotonic):
+        self.fast = params["poll_fast"]
+        self.slow = params["poll_slow"]
+        self.backoff = params["poll_backoff"]
+        self.hot_seconds = params["poll_hot_seconds"]
+        self.mu_near = params["mu_entry"] - params["poll_mu_margin"]
+        self.mu_prior = params["alpha_floor"] / (params["alpha_floor"] + params["beta_floor"])
+        self.budget = budget
+        self.per_request = per_request
+        self.clock = clock
+
+        now = clock()
+        self.interval = {ticker: 1.0 for ticker in tickers}  # interval of the last poll
+        self.next_poll = {ticker: now for ticker in tickers}
+        self.last_poll = {ticker: now for ticker in tickers}
+        self.hot_until = {ticker: -math.inf for ticker in tickers}
+        self.evidence = EvidenceClock(clock)
+
+    # Sets the next poll of ticker from its state after the last poll
+    # jumping: delta_price at or above price_high, which keeps the market fast for poll_hot_seconds
+    def observe(self, ticker, jumping=False, mu=0.0, position=False):
+        now = self.clock()
+        if jumping:
+            self.hot_until[ticker] = now + self.hot_seconds
+
+        # mu only counts as close to mu_entry once there is evidence above the prior
+        if position or now < self.hot_until[ticker] or (mu >= self.mu_near and mu > self.mu_prior):
+            interval = self.fast
+        else:
+            # quiet: back to 1 second after a fast spell, then slower every poll
+            interval = min(self.slow, max(1.0, self.interval[ticker] * self.backoff))
+
+        self.interval[ticker] = interval
+        self.next_poll[ticker] = self.last_poll[ticker] + interval
+
+    # Tickers to poll now, shortest interval first, as many as the budget allows
+    # Their next poll is scheduled at the current interval until observe() changes it
+    def due(self):
+        now = self.clock()
+        due = [ticker for ticker, at in self.next_poll.items() if at <= now]
+        if not due:
+            return []
+
+        due.sort(key=lambda ticker: (self.interval[ticker], self.next_poll[ticker]))
+        if self.budget is not None:
+            requests = self.budget.take_up_to(math.ceil(len(due) / self.per_request))
+            due = due[:requests * self.per_request]
+
+        for ticker in due:
+            self.last_poll[ticker] = now
+            self.next_poll[ticker] = now + self.interval[ticker]
+        return due
+
+    # Seconds until the next poll is due
+    def delay(self):
+        return max(0.0, min(self.next_poll.values()) - self.clock())
+
+    # Sleeps until at least one ticker is due and the budget allows it, returns the due tickers
+    def wait(self, sleep=time.sleep):
+        while True:
+            due = self.due()
+            if due:
+                return due
+            sleep(max(MIN_SLEEP, self.delay()))
+
+    # Whole seconds since ticker's last evidence tick (1 on the first poll); 0 means no evidence this poll
+    def take_ticks(self, ticker):
+        return self.evidence.take_ticks(ticker)
+
+# Whether deltas count polls (lag_mode "count" at a fixed 1 Hz) instead of seconds
+def count_lag(params=DEFAULT_PARAMS):
+    return params["lag_mode"] == "count" and params["poll_mode"] != "adaptive"
+
+# Snapshots a MarketHistory needs to reach lookback seconds back (one more to have a snapshot on both sides)
+# pushed: updates come from the WebSocket feed, kept at most one per poll_fast seconds like adaptive polls
+def history_capacity(params=DEFAULT_PARAMS, pushed=False):
+    if params["poll_mode"] == "adaptive" or pushed:
+        return math.ceil(params["lookback"] / params["poll_fast"]) + 1
+    if count_lag(params):
+        return params["lookback"]
+    return params["lookback"] + 1
+
+# Reference of the deltas: lookback polls ago in "count" mode, the market lookback seconds ago otherwise
+# now: time.monotonic() of the poll
+def delta_reference(history, params=DEFAULT_PARAMS, now=None):
+    if count_lag(params):
+        return history.oldest
+    return history.at_age(params["lookback"], now, interpolate=params["lag_mode"] == "interpolate")
+
+# Whether the history reaches back lookback seconds before now (holds lookback snapshots in "count" mode), so
+# deltas against delta_reference span the whole lag instead of the time since the first poll
+# (the backtester's rule too: rows whose reference is before the recording keep no lagged deltas)
+def history_spans(history, params=DEFAULT_PARAMS, now=None):
+    if count_lag(params):
+        return history.full()
+    if not len(history):
+        return False
+    now = time.monotonic() if now is None else now
+    return history.get("clock", len(history) - 1) <= now - params["lookback"]
+
+# Adds the deltas of a market that arrived at monotonic time `arrived` against the history lookback seconds before
+# that arrival. Snapshots (and backtest rows) are stamped on arrival too, so the lag does not grow with the latency
+def add_lagged_deltas(market, history, params=DEFAULT_PARAMS, arrived=None):
+    from market import add_deltas
+
+    return add_deltas(market, delta_reference(history, params, arrived))
+
+# Highest NO bid of the last lookback seconds (lookback polls in "count" mode), the exit target of a trade
+def pre_spike_level(history, params=DEFAULT_PARAMS, now=None):
+    if count_lag(params):
+        return history.max('no_bid')
+    return history.recent_max('no_bid', params["lookback"], now)
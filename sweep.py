@@ -0,0 +1,185 @@
+"""
+Parameter sweep for the detector
+
+Runs backtester.py over a grid or random search space of the values in params.py
+and writes one results table (csv) with signal counts and simulated PnL per configuration.
+
+The csv files are parsed once, saved as .npy arrays, and memory-mapped read-only by
+every worker process, so workers share the market data instead of re-reading csvs.
+
+Example:
+    python sweep.py cba_game_sample.csv --grid mu_entry=0.6,0.7,0.8 --grid jump_decay=0.8,0.9
+    python sweep.py a.csv b.csv --random mu_entry=0.5:0.9 --random price_pct=80:99 --samples 200
+"""
+
+import argparse
+import itertools
+import os
+import random
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import backtester
+from params import DEFAULT_PARAMS
+
+# Columns the workers need
+NUMERIC_COLUMNS = backtester.COLUMNS
+
+# Shared too when a market has them: ts and volume (see backtester.lag_deltas) and the recorded NO side
+# of tapes (see backtester.simulate_trades, which otherwise implies it from the YES book)
+OPTIONAL_COLUMNS = ("ts", "volume", "no_bid", "no_ask")
+
+# Market arrays of the current worker process, set by _init_worker
+_markets = []
+
+# Every combination of the listed values
+def grid_space(grid):
+    names = list(grid)
+    for values in itertools.product(*(grid[name] for name in names)):
+        yield dict(zip(names, values))
+
+# n random configurations, each value drawn uniformly from (low, high) or from a list of choices
+def random_space(ranges, n, seed=None):
+    rng = random.Random(seed)
+    for _ in range(n):
+        config = {}
+        for name, spec in ranges.items():
+            if isinstance(spec, tuple):
+                low, high = spec
+                if isinstance(DEFAULT_PARAMS[name], bool):
+                    config[name] = rng.choice((low, high))
+                elif isinstance(DEFAULT_PARAMS[name], int):
+                    config[name] = rng.randint(int(low), int(high))
+                else:
+                    config[name] = rng.uniform(low, high)
+            else:
+                config[name] = rng.choice(spec)
+        yield config
+
+# Saves each market's columns as .npy files in directory and returns their paths
+def share_markets(files, directory):
+    shared = []
+    for i, file in enumerate(files):
+        market = backtester.load_market(file)
+        paths = {}
+        for column in NUMERIC_COLUMNS + tuple(column for column in OPTIONAL_COLUMNS if column in market):
+            paths[column] = os.path.join(directory, f"{i}_{column}.npy")
+            np.save(paths[column], market[column])
+        shared.append(paths)
+
+    return shared
+
+def _init_worker(shared):
+    global _markets
+    _markets = [{column: np.load(path, mmap_mode="r") for column, path in paths.items()} for paths in shared]
+
+# Backtests one configuration over every market and returns its results row
+def run_config(config, markets=None):
+    if markets is None:
+        markets = _markets
+    params = dict(DEFAULT_PARAMS, **config)
+
+    signals = 0
+    trades = 0
+    wins = 0
+    pnl = 0
+    for market in markets:
+        if len(market["delta_price"]) < backtester.start_row(params):
+            continue
+        market = backtester.lag_deltas(market, params)
+
+        thresholds = backtester.calibrate(market, params)
+        _, market_signals = backtester.detect(market, thresholds, params)
+        market_trades = backtester.simulate_trades(market, market_signals, params)
+
+        signals += len(market_signals)
+        trades += len(market_trades)
+        wins += int((market_trades["pnl"] > 0).sum())
+        pnl += int(market_trades["pnl"].sum())
+
+    row = dict(config)
+    row.update({
+        "signals": signals,
+        "trades": trades,
+        "wins": wins,
+        "pnl": pnl,
+    })
+
+    return row
+
+# Runs every configuration on a process pool over all cores and returns the results table
+def sweep(files, configs, workers=None):
+    configs = list(configs)
+
+    with tempfile.TemporaryDirectory() as directory:
+        shared = share_markets(files, directory)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(shared,)) as pool:
+            chunksize = max(1, len(configs) // (4 * (workers or os.cpu_count() or 1)))
+            rows = list(pool.map(run_config, configs, chunksize=chunksize))
+
+    import pandas as pd
+
+    return pd.DataFrame(rows)
+
+BOOLS = {"true": True, "1": True, "false": False, "0": False}
+
+# Casts a command line value to the type of the default parameter (bools are true/false or 1/0)
+def _cast(name, value):
+    if name not in DEFAULT_PARAMS:
+        raise argparse.ArgumentTypeError(f"unknown parameter {name!r}")
+    if isinstance(DEFAULT_PARAMS[name], str):
+        return value
+    # bool is a subclass of int, check it first
+    if isinstance(DEFAULT_PARAMS[name], bool):
+        if value.strip().lower() not in BOOLS:
+            raise argparse.ArgumentTypeError(f"{name} takes true/false or 1/0, not {value!r}")
+        return BOOLS[value.strip().lower()]
+    if isinstance(DEFAULT_PARAMS[name], int):
+        return int(float(value))
+    return float(value)
+
+def _parse_grid(items):
+    grid = {}
+    for item in items:
+        name, values = item.split("=", 1)
+        grid[name] = [_cast(name, value) for value in values.split(",")]
+    return grid
+
+def _parse_random(items):
+    ranges = {}
+    for item in items:
+        name, spec = item.split("=", 1)
+        if ":" in spec:
+            low, high = spec.split(":", 1)
+            ranges[name] = (_cast(name, low), _cast(name, high))
+        else:
+            ranges[name] = [_cast(name, value) for value in spec.split(",")]
+    return ranges
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep detector parameters over logged csv files")
+    parser.add_argument("files", nargs="+", help="csv files logged by data.py")
+    parser.add_argument("--grid", action="append", default=[], metavar="NAME=V1,V2,...", help="grid values for a parameter")
+    parser.add_argument("--random", action="append", default=[], metavar="NAME=LOW:HIGH", help="random range (or V1,V2,... choices) for a parameter")
+    parser.add_argument("--samples", type=int, default=100, help="number of random configurations")
+    parser.add_argument("--seed", type=int, default=None, help="random search seed")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--out", default="sweep_results.csv", help="results table path")
+    args = parser.parse_args()
+
+    if args.random:
+        configs = random_space(_parse_random(args.random), args.samples, args.seed)
+    else:
+        configs = grid_space(_parse_grid(args.grid))
+
+    results = sweep(args.files, configs, args.workers)
+    results = results.sort_values("pnl", ascending=False)
+    results.to_csv(args.out, index=False)
+
+    print(results.head(10).to_string(index=False))
+    print(f"Wrote {len(results)} configurations to {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""
+Synthetic market generator with labeled spikes
+
+Builds markets in data.py's csv format (or tapes) from a folded random walk with two
+kinds of labeled events injected on top:
+- fake spikes:      YES jumps on thin volume while the spread widens, then reverts
+- real repricings:  YES jumps permanently on a volume burst while the spread tightens
+
+Every market is generated with NumPy in a handful of array passes (events are placed
+with difference arrays and cumulative sums, no per-row Python), and markets are written
+by a process pool, so corpora of billions of rows are bounded by disk speed. Use
+--format tape for large corpora, csv formatting is the slow part.
+
+The scorer runs the backtester's detector over each market and reports precision
+(signals inside a fake spike), recall (fake spikes with a signal) and detection delay.
+
+    python synth.py generate synth --markets 100 --rows 1000000 --format tape
+    python synth.py score synth --param mu_entry=0.6
+"""
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from params import DEFAULT_PARAMS
+
+FAKE = 1
+REAL = 2
+
+# One record per injected event
+LABEL_DTYPE = np.dtype([
+    ("start", np.int64),  # row of the jump
+    ("end", np.int64),  # first row after the event (fake: after the reversion, real: after the volume burst)
+    ("kind", np.int64),  # FAKE or REAL
+    ("height", np.int64),  # YES cents of the jump as recorded (after folding and clipping)
+])
+
+# The fair price is folded into [FAIR_LOW, FAIR_HIGH] so fake spikes on top stay inside the book
+FAIR_LOW = 5
+FAIR_HIGH = 80
+
+# Rows per event slot: at most one event per slot, so events never overlap and
+# each one is followed by more than a lookback of quiet rows
+SLOT = 200
+
+def generate_market(rows, seed=0, fake_rate=0.001, real_rate=0.0005, noise=1.0, lookback=10):
+    """
+    One synthetic market with labeled events.
+
+    :param rows: number of 1 second rows
+    :param fake_rate: fake spikes per row
+    :param real_rate: real repricings per row
+    :param noise: scales the random walk, spread and volume noise (0 = flat between events)
+    :param lookback: rows behind each delta, like params["lookback"]
+    :return: (market, labels) - market as backtester.load_market columns plus no_bid, no_ask, volume;
+             labels a record array (see LABEL_DTYPE)
+    """
+    p_fake = fake_rate * SLOT
+    p_real = real_rate * SLOT
+    if p_fake + p_real > 1:
+        raise ValueError(f"fake_rate + real_rate must be at most {1 / SLOT}")
+
+    rng = np.random.default_rng(seed)
+
+    # events: one draw per slot, starting somewhere in the first half of it
+    slots = rows // SLOT
+    draw = rng.random(slots)
+    kind = np.where(draw < p_fake, FAKE, np.where(draw < p_fake + p_real, REAL, 0))
+    starts = np.arange(slots) * SLOT + rng.integers(lookback + 1, SLOT // 2, size=slots)
+    keep = kind > 0
+    kind, starts = kind[keep], starts[keep]
+    events = len(starts)
+
+    fake = kind == FAKE
+    heights = rng.integers(4, 13, size=events)
+    lengths = np.where(fake, rng.integers(2, 9, size=events), rng.integers(5, 16, size=events))
+    ends = starts + lengths
+    widen = rng.integers(1, 5, size=events)
+
+    def ramp(at, values):
+        # running sum of values added at rows `at`, i.e. a step function
+        diff = np.zeros(rows + 1, dtype=np.int64)
+        np.add.at(diff, at, values)
+        return np.cumsum(diff[:rows])
+
+    # fair price: walk plus permanent real repricings (up or down), folded into the fair range
+    p_step = min(0.45, 0.05 * noise)
+    steps = rng.choice([-1, 0, 1], size=rows, p=[p_step, 1 - 2 * p_step, p_step])
+    signs = np.where(rng.random(events) < 0.5, 1, -1)
+    fair = rng.integers(20, 60) + np.cumsum(steps) + ramp(starts[~fake], (signs * heights)[~fake])
+
+    width = FAIR_HIGH - FAIR_LOW
+    folded = np.mod(fair - FAIR_LOW, 2 * width)
+    fair = FAIR_LOW + np.where(folded > width, 2 * width - folded, folded)
+
+    def span(mask, values):
+        # values added over [start, end) of the events in mask
+        return ramp(np.concatenate([starts[mask], ends[mask]]), np.concatenate([values, -values]))
+
+    # fake spikes: temporary offset on top of the fair price, wider spread, almost no volume
+    # real repricings: volume burst with a one cent spread
+    in_fake = span(fake, np.ones(fake.sum(), dtype=np.int64)) > 0
+    in_real = span(~fake, np.ones((~fake).sum(), dtype=np.int64)) > 0
+    offset = span(fake, heights[fake])
+    extra_spread = span(fake, widen[fake])
+
+    yes_bid = np.clip(fair + offset, 1, 98)
+
+    spread = 1 + (rng.random(rows) < min(1.0, 0.2 * noise)) + (rng.random(rows) < min(1.0, 0.05 * noise))
+    spread = np.where(in_real, 1, spread + extra_spread)
+    yes_ask = np.minimum(99, yes_bid + spread)
+
+    lam = np.where(in_fake, 0.1, np.where(in_real, 25.0, 3.0 * max(noise, 0.1)))
+    volume = np.cumsum(rng.poisson(lam))
+
+    def delta(column):
+        out = np.zeros(rows, dtype=np.int64)
+        out[lookback:] = column[lookback:] - column[:-lookback]
+        return out
+
+    yes_spread = yes_ask - yes_bid
+    market = {
+        "yes_ask": yes_ask.astype(np.int64),
+        "yes_bid": yes_bid.astype(np.int64),
+        "yes_spread": yes_spread.astype(np.int64),
+        "delta_vol": delta(volume),
+        "delta_spread": delta(yes_spread),
+        "delta_price": delta(yes_bid),
+        "no_bid": (100 - yes_ask).astype(np.int64),
+        "no_ask": (100 - yes_bid).astype(np.int64),
+        "volume": volume.astype(np.int64),
+    }
+
+    labels = np.zeros(events, dtype=LABEL_DTYPE)
+    labels["start"] = starts
+    labels["end"] = ends
+    labels["kind"] = kind
+    labels["height"] = yes_bid[starts] - yes_bid[starts - 1]
+
+    return market, labels
+
+# Writes market as <directory>/<ticker>.csv (data.py format) or tape segments in <directory>/<ticker>/
+# and labels as <directory>/<ticker>.labels.csv
+def write_market(directory, ticker, market, labels, fmt="csv", start_ts=1768447266):
+    import pandas as pd
+
+    rows = len(market["yes_bid"])
+    if fmt == "csv":
+        ts = (np.arange(rows) + start_ts).astype("datetime64[s]").astype(str)
+        columns = {"ts": ts}
+        columns.update({name: market[name] for name in ("yes_ask", "yes_bid", "yes_spread", "delta_vol",
+                                                        "delta_spread", "delta_price")})
+        pd.DataFrame(columns).to_csv(os.path.join(directory, f"{ticker}.csv"), index=False)
+    elif fmt == "tape":
+        from tape import RECORD_DTYPE, TapeWriter
+
+        records = np.zeros(rows, dtype=RECORD_DTYPE)
+        records["ts"] = np.arange(rows) + float(start_ts)
+        records["sent"] = records["ts"]
+        for field in ("yes_bid", "yes_ask", "no_bid", "no_ask", "yes_spread", "delta_spread", "delta_price",
+                      "volume", "delta_vol"):
+            records[field] = market[field]
+        records["last_price"] = market["yes_bid"]
+        for field in ("volume_24h", "open_interest", "liquidity"):
+            records[field] = -1
+
+        writer = TapeWriter(os.path.join(directory, ticker), ticker)
+        chunk = max(1, writer.max_bytes // RECORD_DTYPE.itemsize)
+        for i in range(0, rows, chunk):
+            writer.write_records(records[i:i + chunk])
+        writer.close()
+    else:
+        raise ValueError(f"unknown format {fmt!r}")
+
+    pd.DataFrame(labels).assign(kind=np.where(labels["kind"] == FAKE, "fake", "real")).to_csv(
+        os.path.join(directory, f"{ticker}.labels.csv"), index=False)
+
+def _generate_one(job):
+    directory, ticker, seed, rows, options, fmt = job
+    market, labels = generate_market(rows, seed, **options)
+    write_market(directory, ticker, market, labels, fmt)
+    return rows, int((labels["kind"] == FAKE).sum()), int((labels["kind"] == REAL).sum())
+
+# Generates markets in parallel, returns (rows, fake spikes, real repricings) in total
+def generate(directory, markets, rows, seed=0, fmt="csv", workers=None, **options):
+    os.makedirs(directory, exist_ok=True)
+    jobs = [(directory, f"SYNTH-{seed}-{i:05d}", seed * 1_000_003 + i, rows, options, fmt) for i in range(markets)]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        totals = np.array(list(pool.map(_generate_one, jobs)))
+
+    return tuple(int(total) for total in totals.sum(axis=0))
+
+# Labeled markets of a generated directory: list of (market path, labels path)
+def labeled_markets(directory):
+    found = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".labels.csv"):
+            continue
+        ticker = name[:-len(".labels.csv")]
+        path = os.path.join(directory, f"{ticker}.csv")
+        if not os.path.exists(path):
+            path = os.path.join(directory, ticker)
+        found.append((path, os.path.join(directory, name)))
+    return found
+
+def read_labels(path):
+    import pandas as pd
+
+    df = pd.read_csv(path)
+    labels = np.zeros(len(df), dtype=LABEL_DTYPE)
+    for name in ("start", "end", "height"):
+        labels[name] = df[name].to_numpy()
+    labels["kind"] = np.where(df["kind"].to_numpy() == "fake", FAKE, REAL)
+    return labels
+
+def score_market(market, labels, params=DEFAULT_PARAMS):
+    """
+    Matches the detector's signals on one market with its labels.
+
+    A signal belongs to an event if it fires between the jump and a lookback after the
+    event ends (the detector waits for the price to stall). Events inside the
+    calibration rows are not scored.
+
+    :return: dict of counts and the detection delays (rows from jump to first signal) of every detected fake spike
+    """
+    import backtester
+
+    thresholds = backtester.calibrate(market, params)
+    _, signals = backtester.detect(market, thresholds, params)
+
+    labels = labels[labels["start"] >= backtester.start_row(params)]
+    rows = signals["row"]
+
+    event = np.searchsorted(labels["start"], rows, side="right") - 1
+    inside = (event >= 0) & (rows < labels["end"][np.maximum(event, 0)] + params["lookback"])
+    event = np.where(inside, event, -1)
+    on_fake = inside & (labels["kind"][np.maximum(event, 0)] == FAKE)
+    on_real = inside & ~on_fake
+
+    detected, first = np.unique(event[on_fake], return_index=True)
+    delays = rows[on_fake][first] - labels["start"][detected]
+
+    return {
+        "signals": len(rows),
+        "true_signals": int(on_fake.sum()),
+        "real_signals": int(on_real.sum()),
+        "fakes": int((labels["kind"] == FAKE).sum()),
+        "reals": int((labels["kind"] == REAL).sum()),
+        "detected": len(detected),
+        "delays": delays,
+    }
+
+def _score_one(job):
+    import backtester
+
+    market_path, labels_path, params = job
+    return score_market(backtester.load_market(market_path), read_labels(labels_path), params)
+
+# Scores every labeled market of directory, returns the summed counts and delays
+def score(directory, params=DEFAULT_PARAMS, workers=None):
+    jobs = [(market_path, labels_path, params) for market_path, labels_path in labeled_markets(directory)]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(_score_one, jobs))
+
+    total = {name: sum(r[name] for r in results) for name in ("signals", "true_signals", "real_signals", "fakes",
+                                                                "reals", "detected")}
+    total["markets"] = len(results)
+    total["delays"] = np.concatenate([r["delays"] for r in results]) if results else np.zeros(0, dtype=np.int64)
+    return total
+
+def main():
+    from sweep import _cast
+
+    parser = argparse.ArgumentParser(description="Generate labeled synthetic markets and score the detector on them")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    gen = commands.add_parser("generate", help="write labeled synthetic markets")
+    gen.add_argument("out", help="output directory")
+    gen.add_argument("--markets", type=int, default=10)
+    gen.add_argument("--rows", type=int, default=100_000, help="rows (seconds) per market")
+    gen.add_argument("--fake-rate", type=float, default=0.001, help="fake spikes per row")
+    gen.add_argument("--real-rate", type=float, default=0.0005, help="real repricings per row")
+    gen.add_argument("--noise", type=float, default=1.0, help="random walk, spread and volume noise scale")
+    gen.add_argument("--seed", type=int, default=0)
+    gen.add_argument("--format", choices=("csv", "tape"), default="csv")
+    gen.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+
+    sc = commands.add_parser("score", help="precision, recall and detection delay of the detector")
+    sc.add_argument("directory", help="directory written by generate")
+    sc.add_argument("--param", action="append", default=[], help="override a params.py value, e.g. mu_entry=0.6")
+    sc.add_argument("--workers", type=int, default=None)
+
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        import time
+
+        start = time.perf_counter()
+        rows, fakes, reals = generate(args.out, args.markets, args.rows, args.seed, args.format, args.workers,
+                                      fake_rate=args.fake_rate, real_rate=args.real_rate, noise=args.noise)
+        elapsed = time.perf_counter() - start
+        print(f"Wrote {args.markets} markets, {rows} rows ({rows / elapsed:,.0f} rows/s), "
+              f"{fakes} fake spikes, {reals} real repricings to {args.out}")
+        return
+
+    params = dict(DEFAULT_PARAMS)
+    for item in args.param:
+        name, value = item.split("=", 1)
+        params[name] = _cast(name, value)
+
+    total = score(args.directory, params, args.workers)
+    precision = total["true_signals"] / total["signals"] if total["signals"] else float("nan")
+    recall = total["detected"] / total["fakes"] if total["fakes"] else float("nan")
+
+    print(f"Markets: {total['markets']}, fake spikes: {total['fakes']}, real repricings: {total['reals']}")
+    print(f"Signals: {total['signals']} ({total['true_signals']} on fake spikes, "
+          f"{total['real_signals']} on real repricings, "
+          f"{total['signals'] - total['true_signals'] - total['real_signals']} on noise)")
+    print(f"Precision: {precision:.3f}, recall: {recall:.3f}")
+    if len(total["delays"]):
+        delays = total["delays"]
+        print(f"Detection delay (rows after the jump): mean {delays.mean():.1f}, median {np.median(delays):.0f}, "
+              f"p90 {np.percentile(delays, 90):.0f}")
+
+if __name__ == "__main__":
+    main()
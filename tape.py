@@ -0,0 +1,259 @@
+"""
+Binary market recordings ("tapes")
+
+Append-only segments of fixed-width records, one record per market snapshot, holding
+every numeric field of the market json (both sides of the book, volume, open interest,
+request/response timestamps) plus the derived spread and 10 second deltas.
+
+Segment layout:
+    MAGIC (8 bytes) | header length (uint32 LE) | json header | padding to 64 bytes | records
+
+Segments rotate once they reach max_bytes. Closed segments can be compressed with
+gzip/bz2/lzma; uncompressed segments are memory-mapped zero-copy by read_segment().
+
+Convert a csv logged by data.py:
+    python tape.py convert cba_game_sample.csv --ticker KXCBAGAME-26JAN15NINSHA-NIN --out tapes
+"""
+
+import argparse
+import bz2
+import gzip
+import json
+import lzma
+import os
+import shutil
+import struct
+import time
+
+import numpy as np
+
+MAGIC = b"KXTAPE\x00\x01"
+HEADER_ALIGN = 64
+VERSION = 1
+
+RECORD_DTYPE = np.dtype([
+    ("ts", "<f8"),  # response arrival, unix seconds
+    ("sent", "<f8"),  # request sent, unix seconds
+    ("yes_bid", "<i2"),
+    ("yes_ask", "<i2"),
+    ("no_bid", "<i2"),
+    ("no_ask", "<i2"),
+    ("last_price", "<i2"),
+    ("yes_spread", "<i2"),
+    ("delta_spread", "<i2"),
+    ("delta_price", "<i2"),
+    ("volume", "<i8"),
+    ("volume_24h", "<i8"),
+    ("open_interest", "<i8"),
+    ("liquidity", "<i8"),
+    ("delta_vol", "<i8"),
+])
+
+# Fields read straight from the market json, missing ones are stored as -1
+RAW_FIELDS = ("yes_bid", "yes_ask", "no_bid", "no_ask", "last_price", "volume", "volume_24h", "open_interest", "liquidity")
+
+# Derived fields, missing ones (first ticks without history) are stored as 0
+DERIVED_FIELDS = ("yes_spread", "delta_vol", "delta_spread", "delta_price")
+
+COMPRESSORS = {
+    "gzip": (".gz", gzip.open),
+    "bz2": (".bz2", bz2.open),
+    "lzma": (".xz", lzma.open),
+}
+
+def _header(ticker):
+    header = json.dumps({
+        "version": VERSION,
+        "ticker": ticker,
+        "dtype": RECORD_DTYPE.descr,
+        "created": time.time(),
+    }).encode("utf-8")
+
+    size = len(MAGIC) + 4 + len(header)
+    padding = -size % HEADER_ALIGN
+    return MAGIC + struct.pack("<I", len(header)) + header + b" " * padding
+
+def _parse_header(data):
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError("not a tape segment")
+
+    (length,) = struct.unpack("<I", data[len(MAGIC):len(MAGIC) + 4])
+    header = json.loads(data[len(MAGIC) + 4:len(MAGIC) + 4 + length])
+    size = len(MAGIC) + 4 + length
+    header["offset"] = size + (-size % HEADER_ALIGN)
+    header["dtype"] = np.dtype([tuple(field) for field in header["dtype"]])
+
+    return header
+
+class TapeWriter:
+    """
+    Appends snapshots of one ticker to <directory>/<ticker>.<index>.tape segments.
+
+    :param max_bytes: rotate to a new segment once the current one reaches this size
+    :param compress: None, "gzip", "bz2" or "lzma", applied to each segment when it is closed
+    """
+
+    def __init__(self, directory, ticker, max_bytes=64 << 20, compress=None):
+        if compress is not None and compress not in COMPRESSORS:
+            raise ValueError(f"unknown compression {compress!r}")
+
+        self.directory = directory
+        self.ticker = ticker
+        self.max_bytes = max_bytes
+        self.compress = compress
+
+        self._record = np.zeros(1, dtype=RECORD_DTYPE)
+        self._file = None
+        self._path = None
+        self._size = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._index = len(segment_paths(directory, ticker))
+        self._open()
+
+    def _open(self):
+        self._path = os.path.join(self.directory, f"{self.ticker}.{self._index:05d}.tape")
+        self._file = open(self._path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(_header(self.ticker))
+        self._size = self._file.tell()
+
+    # Writes one market json (after market.add_deltas) received at ts
+    def write(self, market, ts, sent=None):
+        record = self._record[0]
+        record["ts"] = ts
+        record["sent"] = ts if sent is None else sent
+        for field in RAW_FIELDS:
+            record[field] = market.get(field, -1)
+        for field in DERIVED_FIELDS:
+            record[field] = market.get(field, 0)
+
+        self._file.write(self._record.tobytes())
+        self._size += RECORD_DTYPE.itemsize
+
+        if self._size >= self.max_bytes:
+            self.rotate()
+
+    # Writes many records at once (e.g. from a converter)
+    def write_records(self, records):
+        self._file.write(np.ascontiguousarray(records, dtype=RECORD_DTYPE).tobytes())
+        self._size += len(records) * RECORD_DTYPE.itemsize
+        if self._size >= self.max_bytes:
+            self.rotate()
+
+    def flush(self):
+        self._file.flush()
+
+    def rotate(self):
+        self._close_segment()
+        self._index += 1
+        self._open()
+
+    def close(self):
+        self._close_segment()
+
+    def _close_segment(self):
+        self._file.close()
+        if self.compress is not None:
+            suffix, opener = COMPRESSORS[self.compress]
+            with open(self._path, "rb") as src, opener(self._path + suffix, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(self._path)
+
+# Segment files of ticker in directory, in write order
+def segment_paths(directory, ticker=None):
+    paths = []
+    for name in sorted(os.listdir(directory)):
+        if ".tape" not in name or (ticker is not None and not name.startswith(f"{ticker}.")):
+            continue
+        paths.append(os.path.join(directory, name))
+    return paths
+
+# Records of one segment, memory-mapped zero-copy unless the segment is compressed
+# Returns (header, records); a partly written last record is ignored
+def read_segment(path):
+    for suffix, opener in COMPRESSORS.values():
+        if path.endswith(suffix):
+            with opener(path, "rb") as f:
+                data = f.read()
+            header = _parse_header(data)
+            count = (len(data) - header["offset"]) // header["dtype"].itemsize
+            return header, np.frombuffer(data, dtype=header["dtype"], count=count, offset=header["offset"])
+
+    with open(path, "rb") as f:
+        header = _parse_header(f.read(HEADER_ALIGN * 64))
+
+    count = (os.path.getsize(path) - header["offset"]) // header["dtype"].itemsize
+    if count == 0:
+        return header, np.zeros(0, dtype=header["dtype"])
+    return header, np.memmap(path, dtype=header["dtype"], mode="r", offset=header["offset"], shape=(count,))
+
+# All records of a tape: path is a segment file, or a directory holding one ticker's segments
+def read_tape(path, ticker=None):
+    if not os.path.isdir(path):
+        return read_segment(path)[1]
+
+    paths = segment_paths(path, ticker)
+    tickers = {os.path.basename(p).split(".", 1)[0] for p in paths}
+    if len(tickers) > 1:
+        raise ValueError(f"{path} holds several tickers, pass one of {sorted(tickers)}")
+
+    segments = [read_segment(p)[1] for p in paths]
+    if len(segments) == 1:
+        return segments[0]
+    return np.concatenate(segments) if segments else np.zeros(0, dtype=RECORD_DTYPE)
+
+# Converts a csv logged by data.py into a tape
+# The csv has no NO side, volume or request times: NO prices are implied from the YES book,
+# unknown fields are -1 and sent = ts
+def csv_to_tape(file, directory, ticker, max_bytes=64 << 20, compress=None):
+    import pandas as pd
+
+    df = pd.read_csv(file)
+    records = np.zeros(len(df), dtype=RECORD_DTYPE)
+
+    ts = pd.to_datetime(df["ts"]).to_numpy(dtype="datetime64[ns]").astype(np.int64) / 1e9
+    records["ts"] = ts
+    records["sent"] = ts
+    for field in ("yes_ask", "yes_bid", "yes_spread", "delta_vol", "delta_spread", "delta_price"):
+        records[field] = df[field].to_numpy()
+    records["no_bid"] = 100 - records["yes_ask"]
+    records["no_ask"] = 100 - records["yes_bid"]
+    for field in ("last_price", "volume", "volume_24h", "open_interest", "liquidity"):
+        records[field] = -1
+
+    writer = TapeWriter(directory, ticker, max_bytes, compress)
+    chunk = max(1, max_bytes // RECORD_DTYPE.itemsize)
+    for i in range(0, len(records), chunk):
+        writer.write_records(records[i:i + chunk])
+    writer.close()
+
+    return len(records)
+
+def main():
+    parser = argparse.ArgumentParser(description="Binary market recordings")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    convert = commands.add_parser("convert", help="convert a data.py csv to a tape")
+    convert.add_argument("file")
+    convert.add_argument("--ticker", required=True)
+    convert.add_argument("--out", default="tapes")
+    convert.add_argument("--max-bytes", type=int, default=64 << 20)
+    convert.add_argument("--compress", choices=sorted(COMPRESSORS))
+
+    info = commands.add_parser("info", help="print the segments of a tape")
+    info.add_argument("path")
+
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        count = csv_to_tape(args.file, args.out, args.ticker, args.max_bytes, args.compress)
+        print(f"Wrote {count} records to {args.out}")
+    else:
+        paths = segment_paths(args.path) if os.path.isdir(args.path) else [args.path]
+        for path in paths:
+            header, records = read_segment(path)
+            print(f"{path}: {header['ticker']} {len(records)} records")
+
+if __name__ == "__main__":
+    main()
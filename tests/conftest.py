@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+# the modules are top-level scripts in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import journal
+
+# Journal records go to a throwaway directory instead of ./journal, without echoing to the terminal
+@pytest.fixture(autouse=True)
+def quiet_journal(tmp_path):
+    journal.open_journal(str(tmp_path / "journal"), name="test", echo=False)
+    yield
+    journal.get_journal().close()
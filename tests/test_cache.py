@@ -0,0 +1,36 @@
+import time
+
+from cache import StateCache, restore_gap
+from history import MarketHistory
+from params import DEFAULT_PARAMS
+
+def _market(i):
+    return {"yes_bid": 40 + i, "yes_ask": 42 + i, "no_bid": 58 - i, "no_ask": 60 - i, "volume": 10 * i}
+
+# The state is saved every cache_every ticks, a restart a few seconds after the last save still restores
+def test_restart_restores_history(tmp_path):
+    params = DEFAULT_PARAMS
+    cache = StateCache(str(tmp_path))
+    history = MarketHistory(params["lookback"] + 1)
+
+    # last save one full cache_every interval ago, then a 3 second restart
+    newest = time.time() - params["cache_every"] - 3
+    for i in range(history.capacity):
+        history.push(_market(i), newest - (history.capacity - 1 - i))
+    cache.save("KXTEST-26JAN15AAA-BBB", {"price_high": 3}, 1.5, 2.5, history)
+
+    restored = MarketHistory(history.capacity)
+    assert cache.restore_history(cache.load("KXTEST-26JAN15AAA-BBB"), restored, restore_gap(params))
+    assert len(restored) == history.capacity
+    assert restored.get("yes_bid") == history.get("yes_bid")
+    assert restored.max("no_bid") == history.max("no_bid")
+
+def test_stale_history_is_not_restored(tmp_path):
+    cache = StateCache(str(tmp_path))
+    history = MarketHistory(3)
+    history.push(_market(0), time.time() - 3600)
+    cache.save("KXTEST-26JAN15AAA-BBB", {"price_high": 3}, 1.0, 2.0, history)
+
+    restored = MarketHistory(3)
+    assert not cache.restore_history(cache.load("KXTEST-26JAN15AAA-BBB"), restored, restore_gap(DEFAULT_PARAMS))
+    assert len(restored) == 0
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from calibration import OnlineCalibrator, P2Quantile, thresholds_from_deltas
+from params import DEFAULT_PARAMS
+
+# Exact like np.percentile (linear interpolation) until five values are seen
+def test_p2_exact_for_five_values():
+    estimate = P2Quantile(90)
+    values = [7.0, 1.0, 4.0, 9.0, 3.0]
+    for i, value in enumerate(values):
+        estimate.add(value)
+        assert estimate.value() == pytest.approx(np.percentile(values[:i + 1], 90))
+
+def test_p2_empty():
+    with pytest.raises(ValueError):
+        P2Quantile(50).value()
+
+# Streaming estimates stay close to np.percentile on large samples of different shapes
+@pytest.mark.parametrize("pct", [10, 50, 90, 99])
+@pytest.mark.parametrize("draw", [
+    lambda rng, n: rng.normal(0, 1, n),
+    lambda rng, n: rng.exponential(3, n),
+    lambda rng, n: rng.integers(-5, 6, n).astype(float),
+], ids=["normal", "exponential", "integers"])
+def test_p2_matches_percentile(pct, draw):
+    rng = np.random.default_rng(pct)
+    values = draw(rng, 20000)
+    estimate = P2Quantile(pct)
+    for value in values:
+        estimate.add(value)
+
+    spread = np.percentile(values, 99) - np.percentile(values, 1)
+    assert abs(estimate.value() - np.percentile(values, pct)) <= 0.02 * spread
+
+def _deltas(n, seed=0):
+    rng = np.random.default_rng(seed)
+    vols = rng.poisson(2, n) * rng.integers(0, 2, n)
+    prices = rng.integers(-4, 5, n)
+    spreads = rng.integers(-2, 3, n)
+    return vols, prices, spreads
+
+# The window calibrator gives the batch thresholds of its last calibration_window ticks
+def test_window_matches_batch():
+    params = dict(DEFAULT_PARAMS, calibration_mode="window", calibration_window=300, calibration_refresh=1)
+    calibrator = OnlineCalibrator(params)
+    vols, prices, spreads = _deltas(1000)
+    for i, (vol, price, spread) in enumerate(zip(vols, prices, spreads)):
+        calibrator.update(vol, price, spread)
+        if i % 97 == 0 or i == len(vols) - 1:
+            lo = max(0, i + 1 - 300)
+            expected = thresholds_from_deltas(vols[lo:i + 1], prices[lo:i + 1], spreads[lo:i + 1], params)
+            assert calibrator.thresholds() == expected, i
+
+# P² thresholds land within a tick of the batch ones on the same deltas
+def test_p2_calibrator_close_to_batch():
+    params = dict(DEFAULT_PARAMS, calibration_mode="p2")
+    calibrator = OnlineCalibrator(params)
+    vols, prices, spreads = _deltas(5000, seed=1)
+    for vol, price, spread in zip(vols, prices, spreads):
+        calibrator.update(vol, price, spread)
+
+    expected = thresholds_from_deltas(vols, prices, spreads, params)
+    assert calibrator.ready
+    for name, value in calibrator.thresholds().items():
+        assert abs(value - expected[name]) <= 1, name
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        OnlineCalibrator(dict(DEFAULT_PARAMS, calibration_mode="batch"))
@@ -0,0 +1,35 @@
+import os
+import shutil
+
+from catalog import Catalog
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cba_game_sample.csv")
+TICKER = "KXCBAGAME-26JAN15NINSHA-NIN"
+HEADER = "ts,yes_ask,yes_bid,yes_spread,delta_vol,delta_spread,delta_price\n"
+
+# Only data.py recordings are indexed, a recording that fails to parse is not parsed (nor warned about) again
+# until it changes
+def test_refresh_skips_non_recordings_and_failed_parses(tmp_path, capsys):
+    recordings = tmp_path / "recordings"
+    recordings.mkdir()
+    shutil.copy(SAMPLE, recordings / f"{TICKER}.csv")
+    (recordings / f"{TICKER}.labels.csv").write_text("start,end,kind,height\n3,9,1,12\n")
+    (recordings / "notes.csv").write_text("a,b\n1,2\n")
+    bad = recordings / "KXBAD-26JAN15AAA-BBB.csv"
+    bad.write_text(HEADER + "2026-01-15 03:25:00,x,y,1,0,0,0\n")
+
+    catalog = Catalog(str(recordings), str(tmp_path / "cache"), workers=1)
+    assert catalog.refresh() == 2
+    assert "could not parse" in capsys.readouterr().out
+    assert [catalog.entries[key]["ticker"] for key in catalog.query()] == [TICKER]
+
+    catalog = Catalog(str(recordings), str(tmp_path / "cache"), workers=1)
+    assert catalog.refresh() == 0
+    assert capsys.readouterr().out == ""
+    assert catalog.prepare(list(catalog.entries)) == catalog.query()
+
+    # fixed: parsed again
+    bad.write_text(HEADER + "2026-01-15 03:25:00,52,50,2,0,0,0\n")
+    os.utime(bad, (0, 1))
+    assert catalog.refresh() == 1
+    assert len(catalog.query()) == 2
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from history import MarketHistory
+
+def _market(yes_bid, no_bid, volume=0):
+    return {"yes_bid": yes_bid, "yes_ask": yes_bid + 2, "no_bid": no_bid, "no_ask": no_bid + 2, "volume": volume}
+
+# The running max/min match the window of the last capacity pushes, also after a clear
+def test_extremes_match_window():
+    rng = np.random.default_rng(0)
+    history = MarketHistory(7)
+    pushed = []
+    for i in range(500):
+        if i == 250:
+            history.clear()
+            pushed = []
+        market = _market(int(rng.integers(1, 99)), int(rng.integers(1, 99)))
+        history.push(market, clock=float(i))
+        pushed.append(market)
+
+        window = pushed[-7:]
+        for field in ("no_bid", "yes_bid", "no_ask"):
+            assert history.max(field) == max(m[field] for m in window), (i, field)
+            assert history.min(field) == min(m[field] for m in window), (i, field)
+
+    assert len(history) == 7 and history.full()
+    assert history.get("yes_bid") == pushed[-1]["yes_bid"]
+    assert history.oldest["yes_bid"] == pushed[-7]["yes_bid"]
+
+def test_empty_history():
+    history = MarketHistory(3)
+    assert not history.oldest
+    with pytest.raises(ValueError):
+        history.max("no_bid")
+    with pytest.raises(IndexError):
+        history.get("no_bid")
+
+# Pushes at irregular times: 0, 1, 2.5, 3, 5, 6.2
+CLOCKS = [0.0, 1.0, 2.5, 3.0, 5.0, 6.2]
+
+def _timed_history():
+    history = MarketHistory(len(CLOCKS))
+    for i, clock in enumerate(CLOCKS):
+        history.push(_market(10 * (i + 1), 50, volume=100 * i), clock=clock)
+    return history
+
+# Nearest snapshot to now - seconds, the oldest one when the age is past the history
+@pytest.mark.parametrize("seconds, yes_bid", [(0.0, 60), (1.0, 50), (3.5, 30), (3.2, 40), (5.0, 20), (100.0, 10)])
+def test_at_age_nearest(seconds, yes_bid):
+    assert _timed_history().at_age(seconds, now=6.2)["yes_bid"] == yes_bid
+
+# Linear interpolation between the snapshots around now - seconds
+def test_at_age_interpolate():
+    history = _timed_history()
+    # halfway between 3.0 (volume 300) and 5.0 (volume 400)
+    reference = history.at_age(2.2, now=6.2, interpolate=True)
+    assert reference["volume"] == 350
+    assert reference["yes_bid_dollars"] == pytest.approx(0.45)
+    # exactly on a snapshot, and outside the history
+    assert history.at_age(5.2, now=6.2, interpolate=True)["volume"] == 100
+    assert history.at_age(100.0, now=6.2, interpolate=True)["volume"] == 0
+    assert history.at_age(-1.0, now=6.2, interpolate=True)["volume"] == 500
+
+# Max over the snapshots of the last seconds, the newest one when none is that recent
+def test_recent_max():
+    history = MarketHistory(4)
+    for clock, no_bid in [(0.0, 90), (1.0, 40), (2.0, 60), (3.0, 50)]:
+        history.push(_market(10, no_bid), clock=clock)
+    assert history.recent_max("no_bid", 1.5, now=3.0) == 60
+    assert history.recent_max("no_bid", 10.0, now=3.0) == 90
+    assert history.recent_max("no_bid", 1.0, now=10.0) == 50
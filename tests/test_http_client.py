@@ -0,0 +1,31 @@
+import pytest
+
+import http_client
+import runner
+from params import DEFAULT_PARAMS
+
+@pytest.fixture(autouse=True)
+def default_tier():
+    yield
+    http_client.configure(DEFAULT_PARAMS)
+
+# configure() switches the shared limiter to the run's tier, clients created before it follow
+def test_configure_sets_the_tier():
+    client = http_client.HttpClient()
+    http_client.configure(dict(DEFAULT_PARAMS, api_tier="advanced"))
+    assert client.limiter is http_client.limiter
+    assert (client.limiter.read.rate, client.limiter.write.rate) == http_client.TIERS["advanced"]
+
+    # same tier again keeps the buckets (and their tokens)
+    read = client.limiter.read
+    http_client.configure(dict(DEFAULT_PARAMS, api_tier="advanced"))
+    assert client.limiter.read is read
+
+# Runner takes the tier from its params, not from params.py
+def test_runner_uses_its_tier():
+    r = runner.Runner(["KXTEST-26JAN15AAA-BBB"], dict(DEFAULT_PARAMS, api_tier="premier"))
+    try:
+        assert http_client.limiter.tier == "premier"
+        assert r.client.http.limiter.read.rate == http_client.TIERS["premier"][0]
+    finally:
+        r.client.close()
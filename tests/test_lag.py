@@ -0,0 +1,83 @@
+import time
+
+import numpy as np
+import pytest
+
+import detector
+from backtester import lag_deltas
+from history import MarketHistory
+from market import add_deltas
+from params import DEFAULT_PARAMS
+from scheduler import history_capacity
+
+DELTAS = ("delta_vol", "delta_spread", "delta_price")
+
+# Polls ~1 second apart (jitter adds up to that many seconds per poll), with a random walk of the book
+def _recording(n, jitter, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.round(1_768_000_000 + np.cumsum(1.0 + rng.random(n) * jitter), 3)
+    yes_bid = np.clip(50 + np.cumsum(rng.integers(-2, 3, n)), 1, 97)
+    yes_ask = yes_bid + rng.integers(1, 4, n)
+    volume = np.cumsum(rng.integers(0, 20, n))
+    return t, yes_bid, yes_ask, volume
+
+# Runs the recording through detector.next_market the way detect() does: wait for the poll, fetch, push
+# Row times are response arrivals (like data.py stamps them): the clock jumps to the send time of the next
+# row when next_market sleeps, and to its arrival when the response comes back latency seconds later
+def _live_deltas(monkeypatch, t, yes_bid, yes_ask, volume, params, latency):
+    clock = [t[0]]
+    row = [0]
+
+    def fetch_market(ticker, prev_market=None, deadline=None):
+        r = row[0]
+        clock[0] = t[r]
+        market = {"yes_bid": int(yes_bid[r]), "yes_ask": int(yes_ask[r]), "volume": int(volume[r]),
+                  "yes_bid_dollars": f"{yes_bid[r] / 100:.4f}"}
+        return add_deltas(market, prev_market)
+
+    def sleep(seconds):
+        row[0] += 1
+        clock[0] = t[row[0]] - latency[row[0]]
+
+    monkeypatch.setattr(time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(time, "sleep", sleep)
+    monkeypatch.setattr(detector, "fetch_market", fetch_market)
+
+    history = MarketHistory(history_capacity(params))
+    history.push(fetch_market("T"), clock=t[0])
+    live = {name: np.zeros(len(t), dtype=np.int64) for name in DELTAS}
+    for _ in range(1, len(t)):
+        market, arrived = detector.next_market("T", history, params)
+        for name in DELTAS:
+            live[name][row[0]] = market[name]
+        history.push(market, clock=arrived)
+    return live
+
+# Live deltas take their reference lookback seconds before the arrival of the snapshot, like the backtester,
+# whatever the response latency (none, fixed, or varying up to most of a poll)
+@pytest.mark.parametrize("latency", [0.0, 0.25, "random"])
+@pytest.mark.parametrize("jitter", [0.0, 0.4])
+@pytest.mark.parametrize("lag_mode", ["nearest", "interpolate"])
+def test_live_lag_matches_backtest(monkeypatch, latency, jitter, lag_mode):
+    params = dict(DEFAULT_PARAMS, lag_mode=lag_mode)
+    t, yes_bid, yes_ask, volume = _recording(600, jitter)
+    if latency == "random":
+        latency = np.random.default_rng(2).uniform(0.0, 0.8, len(t))
+    else:
+        latency = np.full(len(t), latency)
+    live = _live_deltas(monkeypatch, t, yes_bid, yes_ask, volume, params, latency)
+
+    ts = np.rint(t * 1000).astype(np.int64).astype("datetime64[ms]").astype(str)
+    market = {"ts": ts, "yes_bid": yes_bid, "yes_ask": yes_ask, "volume": volume, "yes_spread": yes_ask - yes_bid,
+              **{name: np.zeros(len(t), dtype=np.int64) for name in DELTAS}}
+    lagged = lag_deltas(market, params)
+
+    # rows with a full lookback of history behind them
+    start = int(np.searchsorted(t, t[0] + params["lookback"]))
+    for name in DELTAS:
+        np.testing.assert_array_equal(live[name][start:], lagged[name][start:], err_msg=name)
+
+    # on a regular 1 second grid the reference is exactly lookback polls back
+    if jitter == 0.0 and not latency.any():
+        lookback = params["lookback"]
+        np.testing.assert_array_equal(live["delta_vol"][lookback:], volume[lookback:] - volume[:-lookback])
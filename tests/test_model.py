@@ -0,0 +1,62 @@
+import os
+
+import numpy as np
+import pytest
+
+import model
+from backtester import calibrate, load_market
+from model import SpikeModel, update_evidence
+from params import DEFAULT_PARAMS
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cba_game_sample.csv")
+
+@pytest.fixture(scope="module")
+def sample():
+    market = load_market(SAMPLE)
+    return market, calibrate(market)
+
+# Shifted copies of the sample with thresholds scaled around the calibrated ones, like model.py check
+def _variants(market, thresholds, n, seed=0):
+    rng = np.random.default_rng(seed)
+    markets, scaled = [], []
+    for _ in range(n):
+        shift = int(rng.integers(len(market["delta_price"])))
+        markets.append({name: np.roll(market[name], shift) for name in ("delta_price", "delta_vol", "delta_spread")})
+        scaled.append({name: max(1, int(round(value * rng.uniform(0.5, 1.5)))) for name, value in thresholds.items()})
+    return markets, scaled
+
+# The vectorized update matches the scalar update_evidence float for float
+def test_vectorized_matches_scalar(sample):
+    markets, thresholds = _variants(*sample, n=8)
+    assert model.check(markets, thresholds) == 8 * len(markets[0]["delta_price"])
+
+# The one-market fast path matches the vectorized path, with multi-second ticks and depth features
+def test_one_market_matches_vectorized(sample):
+    market, thresholds = sample
+    rng = np.random.default_rng(1)
+    one = SpikeModel(1)
+    many = SpikeModel(2)
+    one.set_thresholds(thresholds)
+    many.set_thresholds(thresholds)
+
+    for row in range(len(market["delta_price"])):
+        ticks = int(rng.integers(1, 4))
+        deltas = [[int(market[name][row])] for name in ("delta_price", "delta_vol", "delta_spread")]
+        pulled, consumed = [float(rng.integers(0, 40))], [float(rng.integers(0, 40))]
+
+        jumped = one.update(*deltas, ticks=ticks, depth_pulled=pulled, depth_consumed=consumed)
+        expected = many.update(*[d * 2 for d in deltas], ticks=ticks, depth_pulled=pulled * 2,
+                               depth_consumed=consumed * 2)
+
+        assert jumped[0] == expected[0]
+        assert (one.alpha[0], one.beta[0], one.mu[0]) == (many.alpha[0], many.beta[0], many.mu[0])
+
+def test_uncalibrated_market_takes_no_evidence():
+    one = SpikeModel(1)
+    assert not one.update([50], [0], [5])[0]
+    assert (one.alpha[0], one.beta[0]) == (DEFAULT_PARAMS["alpha_floor"], DEFAULT_PARAMS["beta_floor"])
+
+def test_update_evidence_on_a_fake_spike():
+    thresholds = {"vol_low": 5, "vol_high": 30, "spread_thresh": 2, "price_high": 3}
+    alpha, beta, jumped = update_evidence(1.0, 2.0, {"delta_price": 5, "delta_vol": 0, "delta_spread": 3}, thresholds)
+    assert jumped and alpha > 1.0 and beta == 2.0
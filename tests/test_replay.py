@@ -0,0 +1,27 @@
+import os
+
+import numpy as np
+
+import backtester
+import feed
+import replay
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cba_game_sample.csv")
+TICKER = "KXCBAGAME-26JAN15NINSHA-NIN"
+
+# Both replays rebuild the same volume from a csv logged without it, and it never falls
+def test_replays_rebuild_the_same_volume():
+    market = backtester.load_market(SAMPLE)
+    snapshots = replay.market_snapshots(market, TICKER)
+    messages = list(feed.replay_messages(SAMPLE, TICKER))
+
+    volume = np.array([snapshot["volume"] for snapshot in snapshots])
+    assert [message["msg"]["volume"] for message in messages] == volume.tolist()
+    assert (volume[10:] >= volume[:-10]).all()
+
+# The rebuilt volume gives back the logged deltas wherever they are not negative
+def test_rebuilt_volume_matches_logged_deltas():
+    market = {"delta_vol": np.array([3, 0, 5, 2, -4, 1, 6, 0])}
+    volume = backtester.market_volume(market, lookback=2)
+    assert volume.tolist() == [3, 0, 8, 2, 8, 3, 14, 3]
+    assert (volume[2:] - volume[:-2]).tolist() == [5, 2, 0, 1, 6, 0]
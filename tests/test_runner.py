@@ -0,0 +1,109 @@
+import time
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+import pytest
+
+import runner
+from params import DEFAULT_PARAMS
+
+TICKER = "KXTEST-26JAN15AAA-BBB"
+THRESHOLDS = {"vol_low": 1, "vol_high": 5, "spread_thresh": 2, "price_high": 2}
+
+class _Response:
+    def json(self):
+        return {"order": {"status": "executed"}}
+
+# Order client that fills every order at once
+class _Client:
+    def __init__(self):
+        self.orders = []
+
+    def submit(self, ticker, action, side, price=None):
+        self.orders.append((ticker, action, price))
+        future = Future()
+        future.set_result(_Response())
+        return future
+
+    def close(self):
+        pass
+
+def _market(yes_bid, volume=0):
+    return {"ticker": TICKER, "yes_bid": yes_bid, "yes_ask": yes_bid + 2, "no_bid": 98 - yes_bid,
+            "no_ask": 100 - yes_bid, "volume": volume, "yes_bid_dollars": f"{yes_bid / 100:.4f}"}
+
+# Runner on one market, each tick() polls the given market one second after the previous one
+@pytest.fixture
+def trading(monkeypatch):
+    markets = []
+    clock = [1000.0]
+    monkeypatch.setattr(runner, "fetch_markets", lambda tickers, deadline=None: {TICKER: dict(markets[-1])})
+    monkeypatch.setattr(runner, "time", SimpleNamespace(monotonic=lambda: clock[0], time=time.time))
+
+    params = dict(DEFAULT_PARAMS, fee_buffer=-10, reconcile_every=0)
+    r = runner.Runner([TICKER], params, budget_per_second=1000)
+    r.client = _Client()
+
+    def tick(market):
+        clock[0] += 1.0
+        markets.append(market)
+        r.tick()
+
+    return r, tick
+
+# Entries and exits go through the PositionManager, evidence keeps updating while the position is open
+def test_position_round_trip(trading):
+    r, tick = trading
+    for _ in range(12):
+        tick(_market(50))
+
+    # calibrated, with enough fake spike evidence to enter
+    trader = r.traders[TICKER]
+    trader.calibrator = None
+    trader.thresholds = THRESHOLDS
+    r.model.set_thresholds(THRESHOLDS, 0)
+    r.model.alpha[0], r.model.beta[0], r.model.mu[0] = 10.0, 1.0, 10 / 11
+
+    # stalled spike: buy NO at the ask, the pre-spike NO level (48) is the target
+    tick(_market(50))
+    assert r.client.orders == [(TICKER, "buy", 50)]
+
+    # the fill resets the evidence, then a high volume jump still counts while the position is open
+    tick(_market(53, volume=100))
+    assert len(r.positions.open_positions(TICKER)) == 1
+    assert r.model.beta[0] > DEFAULT_PARAMS["beta_floor"]
+
+    # NO bid back at the target: sold, and the market cools down
+    tick(_market(50, volume=100))
+    tick(_market(50, volume=100))
+    assert r.client.orders[1:] == [(TICKER, "sell", None)]
+    assert not r.positions.open_positions(TICKER)
+    assert r.model.cooldown_until[0] > time.time()
+
+# Nothing is calibrated until the history reaches lookback seconds back (it is not pre-filled)
+def test_no_calibration_before_the_lookback(trading):
+    r, tick = trading
+    trader = r.traders[TICKER]
+    lookback = DEFAULT_PARAMS["lookback"]
+    for i in range(lookback):
+        tick(_market(50 + i % 3))
+        assert not trader.spanned
+    assert r.model.alpha[0] == DEFAULT_PARAMS["alpha_floor"]
+    if trader.calibrator is not None:
+        assert trader.calibrator.count == 0
+
+    tick(_market(50))
+    assert trader.spanned
+    assert trader.last_market["delta_price"] == 0
+
+# Positions still open at the end of the session are sold
+def test_close_sells_open_positions(trading):
+    r, tick = trading
+    tick(_market(50))
+    r.positions.open(TICKER, _market(50), 60, time.time())
+    tick(_market(50))
+    assert len(r.positions.open_positions(TICKER)) == 1
+
+    r.close()
+    assert r.client.orders[-1] == (TICKER, "sell", None)
+    assert not r.positions.open_positions(TICKER)
@@ -0,0 +1,65 @@
+import argparse
+import os
+
+import numpy as np
+import pytest
+
+import backtester
+import sweep
+import tape
+from params import DEFAULT_PARAMS
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cba_game_sample.csv")
+TICKER = "KXCBAGAME-26JAN15NINSHA-NIN"
+
+# Trades on the sample (see README, replay example)
+CONFIG = {"mu_entry": 0.4, "fee_buffer": -20}
+
+# The sample as a tape whose NO bid is a cent above the one implied by the YES book
+def _tape_with_no_side(tmp_path):
+    tape.csv_to_tape(SAMPLE, str(tmp_path / "csv"), TICKER)
+    records = np.array(tape.read_tape(str(tmp_path / "csv")))
+    records["no_bid"] = np.minimum(records["no_bid"] + 1, records["no_ask"])
+
+    writer = tape.TapeWriter(str(tmp_path / "tape"), TICKER)
+    writer.write_records(records)
+    writer.close()
+    return str(tmp_path / "tape")
+
+def _backtest_pnl(file, params):
+    market = backtester.lag_deltas(backtester.load_market(file), params)
+    thresholds = backtester.calibrate(market, params)
+    _, signals = backtester.detect(market, thresholds, params)
+    trades = backtester.simulate_trades(market, signals, params)
+    return len(trades), int(trades["pnl"].sum())
+
+# Sweep workers trade on the recorded NO side like backtester.py, not on the implied one
+def test_sweep_matches_backtester_on_recorded_no_side(tmp_path):
+    file = _tape_with_no_side(tmp_path)
+    trades, pnl = _backtest_pnl(file, dict(DEFAULT_PARAMS, **CONFIG))
+    assert trades > 0
+
+    shared = sweep.share_markets([file], str(tmp_path))
+    assert "no_bid" in shared[0] and "no_ask" in shared[0]
+    sweep._init_worker(shared)
+    row = sweep.run_config(CONFIG)
+    assert (row["trades"], row["pnl"]) == (trades, pnl)
+
+    # the implied NO side gives another result, so the recorded one is what the workers used
+    implied = {column: values for column, values in backtester.load_market(file).items()
+               if column not in ("no_bid", "no_ask")}
+    assert sweep.run_config(CONFIG, [implied])["pnl"] != pnl
+
+# Bool parameters take true/false or 1/0 (bool is an int, it must not go through int())
+def test_cast_bool():
+    for value, expected in [("True", True), ("false", False), ("1", True), ("0", False)]:
+        assert sweep._cast("depth_evidence", value) is expected
+    with pytest.raises(argparse.ArgumentTypeError):
+        sweep._cast("depth_evidence", "maybe")
+    assert sweep._cast("lookback", "7") == 7
+    assert sweep._cast("mu_entry", "0.6") == 0.6
+
+    grid = sweep._parse_grid(["depth_evidence=true,false"])
+    assert grid == {"depth_evidence": [True, False]}
+    configs = list(sweep.random_space({"depth_evidence": (False, True)}, 20, seed=1))
+    assert {c["depth_evidence"] for c in configs} == {False, True}
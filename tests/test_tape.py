@@ -0,0 +1,103 @@
+import os
+
+import numpy as np
+import pytest
+
+import backtester
+import tape
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cba_game_sample.csv")
+TICKER = "KXTEST-26JAN15AAA-BBB"
+
+def _markets(n, seed=0):
+    rng = np.random.default_rng(seed)
+    yes_bid = np.clip(50 + np.cumsum(rng.integers(-2, 3, n)), 1, 97)
+    return [{"yes_bid": int(b), "yes_ask": int(b) + 2, "no_bid": 98 - int(b), "no_ask": 100 - int(b),
+             "volume": 10 * i, "yes_spread": 2, "delta_vol": 10, "delta_price": int(d)}
+            for i, (b, d) in enumerate(zip(yes_bid, rng.integers(-3, 4, n)))]
+
+def _write(directory, markets, start=1_768_000_000.0, **kwargs):
+    writer = tape.TapeWriter(str(directory), TICKER, **kwargs)
+    for i, market in enumerate(markets):
+        writer.write(market, start + i, sent=start + i - 0.05)
+    writer.close()
+
+def _assert_records(records, markets, start=1_768_000_000.0):
+    assert len(records) == len(markets)
+    np.testing.assert_array_equal(records["ts"], start + np.arange(len(markets)))
+    np.testing.assert_allclose(records["sent"], records["ts"] - 0.05)
+    for field in ("yes_bid", "yes_ask", "no_bid", "no_ask", "volume", "delta_vol", "delta_price"):
+        assert records[field].tolist() == [market[field] for market in markets], field
+    # fields the market json did not have
+    assert (records["open_interest"] == -1).all()
+    assert (records["delta_spread"] == 0).all()
+
+# Snapshots written one by one read back field for field, memory-mapped
+def test_round_trip(tmp_path):
+    markets = _markets(50)
+    _write(tmp_path, markets)
+
+    paths = tape.segment_paths(str(tmp_path))
+    assert len(paths) == 1
+    header, records = tape.read_segment(paths[0])
+    assert header["ticker"] == TICKER
+    assert header["offset"] % tape.HEADER_ALIGN == 0
+    assert isinstance(records, np.memmap)
+    _assert_records(records, markets)
+
+# Segments rotate at max_bytes and read back as one tape in write order, compressed or not
+@pytest.mark.parametrize("compress", [None, "gzip", "lzma"])
+def test_segments_rotate(tmp_path, compress):
+    markets = _markets(100)
+    _write(tmp_path, markets, max_bytes=20 * tape.RECORD_DTYPE.itemsize, compress=compress)
+
+    paths = tape.segment_paths(str(tmp_path))
+    assert len(paths) >= 5
+    if compress:
+        assert all(path.endswith(tape.COMPRESSORS[compress][0]) for path in paths)
+    _assert_records(tape.read_tape(str(tmp_path)), markets)
+
+# A writer reopened on the same directory continues in a new segment after the existing ones
+def test_writer_continues_after_restart(tmp_path):
+    markets = _markets(30)
+    _write(tmp_path, markets[:12])
+    _write(tmp_path, markets[12:], start=1_768_000_012.0)
+
+    assert len(tape.segment_paths(str(tmp_path))) == 2
+    _assert_records(tape.read_tape(str(tmp_path)), markets)
+
+# A record cut short at the end of a segment (writer killed mid-write) is ignored
+def test_partial_last_record_is_ignored(tmp_path):
+    markets = _markets(10)
+    _write(tmp_path, markets)
+    path = tape.segment_paths(str(tmp_path))[0]
+    with open(path, "ab") as f:
+        f.write(b"\x00" * (tape.RECORD_DTYPE.itemsize // 2))
+
+    _assert_records(tape.read_tape(path), markets)
+
+def test_not_a_tape(tmp_path):
+    path = tmp_path / f"{TICKER}.00000.tape"
+    path.write_bytes(b"not a tape" * 10)
+    with pytest.raises(ValueError):
+        tape.read_segment(str(path))
+
+# Several tickers in one directory need the ticker to be named
+def test_directory_of_several_tickers(tmp_path):
+    _write(tmp_path, _markets(5))
+    tape.TapeWriter(str(tmp_path), "KXOTHER-26JAN15CCC-DDD").close()
+    with pytest.raises(ValueError):
+        tape.read_tape(str(tmp_path))
+    assert len(backtester.load_tape(str(tmp_path), TICKER)["yes_bid"]) == 5
+
+# A converted csv backtests on the same columns as the csv itself
+def test_csv_to_tape_matches_csv(tmp_path):
+    count = tape.csv_to_tape(SAMPLE, str(tmp_path), TICKER, max_bytes=1 << 16)
+    csv_market = backtester.load_market(SAMPLE)
+    tape_market = backtester.load_tape(str(tmp_path))
+
+    assert count == len(csv_market["yes_bid"]) and len(tape.segment_paths(str(tmp_path))) > 1
+    for column in backtester.COLUMNS:
+        np.testing.assert_array_equal(tape_market[column], csv_market[column], err_msg=column)
+    np.testing.assert_array_equal(tape_market["no_bid"], 100 - csv_market["yes_ask"])
+    np.testing.assert_array_equal(tape_market["ts"].astype("datetime64[ms]"), csv_market["ts"].astype("datetime64[ms]"))